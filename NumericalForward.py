@@ -1,15 +1,19 @@
 import csv
 import os
 import time
+from typing import Optional, Union
 import numpy as np    # type: ignore # this has some nice mathematics related functions
-# using so called sparse linear algebra make stuff run way faster (ignoring zeros)
-from scipy.sparse import csr_matrix, diags  # type: ignore
-# this guy can solve equation faster by taking advantage of the sparsity
-#   (it ignores zeros in the matrices)
-from scipy.sparse.linalg import spsolve  # type: ignore
-from experiment_data_handler import ExperimentalData
+from experiment_data_handler import experiment_data_cache
+from scipy.linalg.lapack import dgbtrf, dgbtrs  # type: ignore
+from NumericalOperators import operator_cache, Mesh, AssembledOperators, TemperatureDependentOperators, \
+    get_nodal_volumes, get_band_storage
 from interpolations import predefined_interp_class_factory
 
+# Stefan-Boltzmann constant [W/(m^2*K^4)]
+STEFAN_BOLTZMANN = 5.670374419e-8
+# Temperatures are in degrees, but radiation needs the absolute ones
+ZERO_CELSIUS = 273.15
+
 
 class Simulation:  # In later objects abreviated as Sim
     """
@@ -18,6 +22,47 @@ class Simulation:  # In later objects abreviated as Sim
     theta = 1.0 - fully implicit 1st order, numerically stable.
     """
 
+    # Which parts of the simulation must be prepared again when certain
+    #   parameter changes - everything else can be kept (see reconfigure())
+    # The parts are being prepared in the order they are defined in PREPARATION_ORDER
+    PARAMETER_DEPENDENCIES = {
+        "experiment_data_path": ["experiment_data", "time_grid"],
+        "dt": ["time_grid", "operators"],
+        "N": ["mesh", "operators"],
+        "length": ["mesh", "operators"],
+        # Refined meshes are depending also on the place of interest
+        "x0": ["mesh", "operators"],
+        "mesh": ["mesh", "operators"],
+        "layers": ["mesh", "operators"],
+        "theta": ["operators"],
+        "robin_alpha": ["operators"],
+        "material": ["operators"],
+        # Radiation is not changing the matrices (see _include_radiation())
+        "emissivity": [],
+    }
+    PREPARATION_ORDER = ["experiment_data", "time_grid", "mesh", "operators"]
+
+    # Temperature dependent properties: by how much (relatively) they must
+    #   change to assemble the matrices again, and how many times
+    #   at most the step is solved again with the updated properties
+    PROPERTY_TOLERANCE = 1e-3
+    MAX_NONLINEAR_ITERATIONS = 3
+
+    # Whether the simulation works only with the constant material properties
+    #   and no radiation (it is relying on the superposition or on the constant
+    #   matrices) - checked whenever the simulation is put into initial state
+    ONLY_LINEAR_MODEL = False
+
+    # Phase change: the step is finished when the temperatures are
+    #   changing less than the tolerance, or after the maximum of iterations
+    PHASE_CHANGE_TOLERANCE = 1e-6
+    MAX_PHASE_CHANGE_ITERATIONS = 20
+
+    # Radiation: the temperature of the radiating node is found when
+    #   it changes less than the tolerance, or after the maximum of iterations
+    RADIATION_TOLERANCE = 1e-9
+    MAX_RADIATION_ITERATIONS = 50
+
     def __init__(self,
                  N: int,
                  dt: float,
@@ -26,7 +71,10 @@ class Simulation:  # In later objects abreviated as Sim
                  x0: float,
                  length: float,
                  material,
-                 experiment_data_path: str = "DATA.csv") -> None:
+                 experiment_data_path: str = "DATA.csv",
+                 mesh: Optional[Mesh] = None,
+                 layers: Optional[list] = None,
+                 emissivity: float = 0.0) -> None:
         """
         Args:
             N ... number of elements in the model
@@ -36,41 +84,174 @@ class Simulation:  # In later objects abreviated as Sim
             x0 ... where is the place of our interest in the object
             length ... how long is the object
             material ... object containing material properties
+                (they can be also temperature dependent, or melting)
             experiment_data_path ... from where the data should be taken
+            mesh ... distribution of the nodes (uniform when not specified)
+            layers ... layers of the composite object, starting from
+                the heated side (homogeneous object from the material
+                when not specified) - their thicknesses must sum to the length
+            emissivity ... emissivity of the far (convective) side, which is
+                also radiating into the ambient (no radiation when zero)
         """
 
         self.N = int(N)
         self.dt = dt
         self.theta = theta
-        self.Exp_data = ExperimentalData(experiment_data_path)
+        self.experiment_data_path = experiment_data_path
+        self.material = material
         self.rho = material.rho
         self.cp = material.cp
         self.lmbd = material.lmbd
         self.length = length
         self.robin_alpha = robin_alpha
         self.x0 = x0
+        self.mesh = mesh or Mesh()
+        self.layers = list(layers) if layers else None
+        self.emissivity = emissivity
+
+        # Preparing all the parts of the simulation, each of them depending
+        #   only on some of the parameters (see PARAMETER_DEPENDENCIES)
+        for part in self.PREPARATION_ORDER:
+            getattr(self, "_prepare_{}".format(part))()
+
+        # Setting the simulation to its initial state
+        self.reset()
+
+    def _prepare_experiment_data(self) -> None:
+        """
+        Reading the experiment data from the file (or taking them from
+            the memory, when the same file was already read)
+        """
+
+        self.Exp_data = experiment_data_cache.get(self.experiment_data_path)
+
+    def _prepare_time_grid(self) -> None:
+        """
+        Determining the simulation time points and interpolating
+            the experiment data into them
+        """
 
         # Placeholder for the fixed simulation time points
         self.t = np.arange(self.Exp_data.t_data[0], self.Exp_data.t_data[-1] + self.dt, self.dt)
-        # Current time for quick lookup in the callback
-        self.current_t = 0.0
         # maximum allowed index when simulating
         self.max_step_idx = len(self.t) - 1
-        # current time step index
-        self.current_step_idx = 0
-        # checkpoint time step index
-        self.checkpoint_step_idx = 0
         # Placeholder for interpolated body temperature
         self.T_data = np.interp(self.t, self.Exp_data.t_data, self.Exp_data.T_data)
         # Placeholder for interpolated heat_flux
         self.HeatFlux = np.interp(self.t, self.Exp_data.t_data, self.Exp_data.q_data)
         # Placeholder for interpolated ambient temperature
         self.T_amb = np.interp(self.t, self.Exp_data.t_data, self.Exp_data.T_amb_data)
-        # size of one element
-        self.dx = self.length/N
-        # x-positions of the nodes (temperatures)
-        # https://docs.scipy.org/doc/numpy/reference/generated/numpy.linspace.html
-        self.x = np.linspace(0, self.length, N+1)
+
+    def _prepare_mesh(self) -> None:
+        """
+        Determining the positions of the nodes and the way of getting
+            the temperature at the place of our interest
+        """
+
+        if self.layers:
+            total_thickness = sum(layer.thickness for layer in self.layers)
+            if not np.isclose(total_thickness, self.length):
+                raise ValueError("Layers are {} thick, but the object is {} long".format(
+                    total_thickness, self.length))
+
+        # x-positions of the nodes (temperatures), uniformly distributed
+        #   by default, but the mesh can be also graded or refined
+        #   (quadratic elements are having also nodes in their middles,
+        #   contact resistances between the layers are doubling the nodes)
+        self.x = self.mesh.create_nodes(self.N, self.length, self.x0, self.layers)
+        # smallest (nonzero) distance between the nodes
+        node_distances = np.diff(self.x)
+        self.dx = float(np.min(node_distances[node_distances > 0]))
+
+        # Setup the right interpolation object (consistent with the elements)
+        self.T_x0_interpolator = predefined_interp_class_factory(self.x0, self.x, self.mesh.element_order)
+        # TODO: make it allow multiple probes at the same time
+
+    def _prepare_operators(self) -> None:
+        """
+        Getting the matrices of the finite element model
+        """
+
+        # Temperature dependent properties are making the matrices change
+        #   during the simulation, so they are not shared
+        self.is_nonlinear = getattr(self.material, "is_temperature_dependent", False)
+        operators: Union[AssembledOperators, TemperatureDependentOperators]
+        if self.is_nonlinear:
+            if self.layers:
+                raise ValueError("Temperature dependent properties are not supported for layered objects")
+            operators = TemperatureDependentOperators(N=self.N, dt=self.dt, theta=self.theta,
+                                                      robin_alpha=self.robin_alpha, length=self.length,
+                                                      material=self.material, mesh=self.mesh, x0=self.x0,
+                                                      property_tolerance=self.PROPERTY_TOLERANCE)
+        else:
+            # Finite element method: matrices are assembled using 1st order
+            #   continuous Galerkin elements, and they are shared with all the other
+            #   simulations having the same discretization and material
+            operators = operator_cache.get(**self._get_operator_parameters())
+        self.operators = operators
+
+        # Melting material is absorbing the latent heat in the nodes (lumped),
+        #   which is changing only the main diagonal of matrix A
+        self.is_phase_change = getattr(self.material, "is_phase_change", False)
+        if self.is_phase_change:
+            if self.layers:
+                raise ValueError("Phase change is not supported for layered objects")
+            self.nodal_volumes = get_nodal_volumes(self.mesh, self.N, self.length, self.x0)
+            self.A_band = get_band_storage(operators.A, self.mesh.element_order)
+        # Tridiagonal sparse mass matrix (contains information about heat capacity
+        #   of the elements and how their temperatures react to incoming heat)
+        self.M = operators.M
+        # Tridiagonal sparse stiffness matrix (contains information about heat
+        #   conductivity and how the elements affect each other)
+        self.K = operators.K
+        # Preparing variables to store the values of some properties, that are
+        #   constant during the simulation
+        # placeholder for matrix A (including implicit portion of Robin BC)
+        self.A = operators.A
+        # function solving the equation with matrix A (already factorized)
+        self.solve_A = operators.solve_A
+        # Matrix b to calculate boundary vector b
+        self.b_base = operators.b_base
+        # Response of the temperatures to the heat leaving the last node
+        #   (A^-1*e_N), computed when the radiation needs it
+        self.radiation_response = None
+        self.radiation_response_key = None
+
+    def _get_operator_parameters(self) -> dict:
+        """
+        Describing the operators of this simulation (the arguments
+            of operator_cache.get())
+        """
+
+        return {
+            "N": self.N,
+            "dt": self.dt,
+            "theta": self.theta,
+            "robin_alpha": self.robin_alpha,
+            "length": self.length,
+            "rho": self.rho,
+            "cp": self.cp,
+            "lmbd": self.lmbd,
+            "mesh": self.mesh,
+            "x0": self.x0,
+            "layers": self.layers,
+        }
+
+    def reset(self) -> None:
+        """
+        Putting the simulation into its initial state, so that it can be
+            run again from the beginning
+        """
+
+        if self.ONLY_LINEAR_MODEL:
+            self._check_linear_model()
+
+        # Current time for quick lookup in the callback
+        self.current_t = 0.0
+        # current time step index
+        self.current_step_idx = 0
+        # checkpoint time step index
+        self.checkpoint_step_idx = 0
         # error_value of the simulation
         self.error_norm = 0.0
         # Whether we have plotted the heat flux, which should be done only once
@@ -79,51 +260,141 @@ class Simulation:  # In later objects abreviated as Sim
         # temperature fields
         # https://docs.scipy.org/doc/numpy/reference/generated/numpy.empty.html
         # placeholder for actual temperatures in last evaluated step
-        self.T = np.empty(N+1)
+        self.T = np.empty(len(self.x))
         # initialize temperature field
         self.T.fill(self.Exp_data.T_data[0])
         # placeholder for temperatures saved in checkpoint
-        self.T_checkpoint = np.empty(N+1)
-        # Placeholder for temperature probes data
-        self.T_x0 = len(self.t)*[0.0]
-
-        # Setup the right interpolation object and save initial T_x0
-        self.T_x0_interpolator = predefined_interp_class_factory(self.x0, self.x)
+        self.T_checkpoint = np.empty(len(self.x))
+        # allocate memory for vector b
+        self.b = np.empty(len(self.x))
+        # Placeholder for temperature probes data and saving initial T_x0
+        self.T_x0 = self._allocate_probe_data()
         self.T_x0[0] = self.T_x0_interpolator(self.T)  # type: ignore
-        # TODO: make it allow multiple probes at the same time
+        # Properties are starting from the initial temperatures
+        self._reset_properties()
 
-        # Finite element method: matrix assembly using 1st order continuous Galerkin elements
-        # Tridiagonal sparse mass matrix (contains information about heat capacity
-        #   of the elements and how their temperatures react to incoming heat)
-        # https://docs.scipy.org/doc/scipy/reference/generated/scipy.sparse.csr_matrix.html
-        self.M = csr_matrix(self.dx*self.rho*self.cp*diags([1/6, 4/6, 1/6], [-1, 0, 1], shape=(N+1, N+1)))
+    def _check_linear_model(self) -> None:
+        """
+        Making sure the material properties are constant and there is no
+            radiation, for the simulations that are not supporting them
+        """
 
-        # Applying corrections to the edge elements (the value is halved there)
-        self.M[0, 0] /= 2
-        self.M[-1, -1] /= 2
+        if getattr(self.material, "is_temperature_dependent", False) or \
+                getattr(self.material, "is_phase_change", False):
+            raise ValueError("Temperature dependent properties and phase change are not supported by {}".format(
+                type(self).__name__))
+        if self.emissivity:
+            raise ValueError("Radiation is not supported by {}".format(type(self).__name__))
 
-        # Tridiagonal sparse stiffness matrix (contains information about heat
-        #   conductivity and how the elements affect each other)
-        self.K = csr_matrix((1/self.dx)*self.lmbd*diags([-1, 2, -1], [-1, 0, 1], shape=(N+1, N+1)))
+    def _reset_properties(self) -> None:
+        """
+        Assembling the temperature dependent properties (and matrices)
+            again from the current temperatures - when the temperatures
+            were not reached by the simulation steps
+        """
 
-        # We have to make some changes to the matrix K because we affect
-        #   the body from outside
-        # Here we will push Heat to the body - Neumann Boundary Condition
-        self.K[0, 0] /= 2
-        # Here we know the body is in contact with air so it will cool
-        #   accordingly - Robin Boundary Condition
-        self.K[N, N] /= 2
+        if isinstance(self.operators, TemperatureDependentOperators):
+            self.operators.element_properties = None
+            self.operators.update(self.T)
 
-        # Preparing variables to store the values of some properties, that are
-        #   constant during the simulation
-        # placeholder for matrix A
-        self.A = self.M + self.dt*self.theta*self.K
-        # implicit portion of T_body contribution (Robin BC Nth node)
-        self.A[-1, -1] += self.dt*self.theta*self.robin_alpha
-        # Matrix b to calculate boundary vector b
-        self.b_base = self.M - self.dt*(1-self.theta)*self.K
-        # allocate memory for vector b
-        self.b = np.empty(N+1)
+    def _allocate_probe_data(self):
+        """
+        Preparing the storage for temperatures at the place of interest
+            in all the time points
+        """
+
+        return len(self.t)*[0.0]
+
+    def reconfigure(self, **changed_params) -> None:
+        """
+        Changing some parameters of the simulation and putting it into
+            its initial state
+        Only the parts of the simulation that are depending on the changed
+            parameters are prepared again, so it is much cheaper than
+            creating a new simulation object
+        NOTE: the experiment data file is read again only when its path
+            changes, not when the file is modified
+
+        Args:
+            changed_params ... new values of the parameters, named the same
+                               as the arguments of __init__()
+        """
+
+        parts_to_prepare = set()
+        for parameter, value in changed_params.items():
+            if parameter not in self.PARAMETER_DEPENDENCIES:
+                raise TypeError("Unknown simulation parameter: {}".format(parameter))
+
+            # Material is compared (and stored) by its properties
+            if parameter == "material":
+                if self._get_material_key(value) != self._get_material_key(self.material):
+                    self.material = value
+                    self.rho = value.rho
+                    self.cp = value.cp
+                    self.lmbd = value.lmbd
+                    parts_to_prepare.update(self.PARAMETER_DEPENDENCIES[parameter])
+                continue
+
+            # Layers are compared by their properties
+            if parameter == "layers":
+                value = list(value) if value else None
+                if [layer.get_key() for layer in value or []] != \
+                        [layer.get_key() for layer in self.layers or []]:
+                    self.layers = value
+                    parts_to_prepare.update(self.PARAMETER_DEPENDENCIES[parameter])
+                continue
+
+            # Mesh is compared by the distribution of its nodes
+            if parameter == "mesh":
+                value = value or Mesh()
+                if value.get_key(self.x0) != self.mesh.get_key(self.x0):
+                    self.mesh = value
+                    parts_to_prepare.update(self.PARAMETER_DEPENDENCIES[parameter])
+                continue
+
+            if parameter == "N":
+                value = int(value)
+            if getattr(self, parameter) != value:
+                setattr(self, parameter, value)
+                parts_to_prepare.update(self.PARAMETER_DEPENDENCIES[parameter])
+
+        for part in self.PREPARATION_ORDER:
+            if part in parts_to_prepare:
+                getattr(self, "_prepare_{}".format(part))()
+
+        self.reset()
+
+    @staticmethod
+    def _get_material_key(material) -> tuple:
+        """
+        Identifying the material by its kind and properties (including
+            their temperature dependence or the phase change)
+
+        Args:
+            material ... object containing material properties
+        """
+
+        if hasattr(material, "get_key"):
+            return (type(material).__name__, material.get_key())
+        return (material.rho, material.cp, material.lmbd)
+
+    def rerun(self, **changed_params) -> dict:
+        """
+        Running the whole simulation again, possibly with some changed
+            parameters, without any communication with the outside world
+
+        Args:
+            changed_params ... new values of the parameters, named the same
+                               as the arguments of __init__()
+        """
+
+        self.reconfigure(**changed_params)
+
+        while not self.simulation_has_finished:
+            self.evaluate_one_step()
+        self.after_simulation_action()
+
+        return {"error_value": self.error_norm}
 
     def __repr__(self) -> str:
         """
@@ -142,7 +413,9 @@ class Simulation:  # In later objects abreviated as Sim
             self.lmbd: {self.lmbd},
             self.length: {self.length},
             self.robin_alpha: {self.robin_alpha},
+            self.emissivity: {self.emissivity},
             self.x0: {self.x0},
+            self.mesh: {self.mesh},
             """
 
     # Function that calculates new timestep (integration step)
@@ -152,25 +425,14 @@ class Simulation:  # In later objects abreviated as Sim
         Is using already initialised instance variables
         """
 
-        # Evaluate new boundary vector (BC means boundary condition)
-
-        # Assemble vector b (dot() is matrix multiplication)
-        self.b = self.b_base.dot(self.T)
-        # Apply explicit portion of HeatFlux (Neumann BC 1st node)
-        self.b[0] += self.dt*(1-self.theta)*self.HeatFlux[self.current_step_idx]
-        # Apply implicit portion of HeatFlux (Neumann BC 1st node)
-        self.b[0] += self.dt*self.theta*self.HeatFlux[self.current_step_idx+1]
-        # Apply explicit contribution of the body temperature (Robin BC Nth node)
-        self.b[-1] -= self.dt*(1-self.theta)*self.robin_alpha*self.T[-1]
-        # Apply explicit contribution of the ambient temperature (Robin BC Nth node)
-        self.b[-1] += self.dt*(1-self.theta)*self.robin_alpha*self.T_amb[self.current_step_idx]
-        # Apply implicit contribution of the ambient temperature (Robin BC Nth node)
-        self.b[-1] += self.dt*self.theta*self.robin_alpha*self.T_amb[self.current_step_idx+1]
+        # The phases of the step are separate methods, so that they can be
+        #   timed one by one when needed (see simulation_timing.py)
+        self.b = self._assemble_rhs()
 
-        # solve the equation self.A*self.T=b
-        self.T = spsolve(self.A, self.b)  # solve new self.T for the new step
+        # solve the equation self.A*self.T=b (using the prepared factorization)
+        self.T = self._solve_system(self.b)  # solve new self.T for the new step
         self.current_step_idx += 1  # move to new timestep
-        self.T_x0[self.current_step_idx] = self.T_x0_interpolator(self.T)  # type: ignore
+        self.T_x0[self.current_step_idx] = self._interpolate_probe(self.T)
 
         # Incrementing time information for the callback
         # We are assuming the self.dt stays the same all the time
@@ -184,6 +446,189 @@ class Simulation:  # In later objects abreviated as Sim
         #     InverseSimulation()
         self.current_t = self.dt * self.current_step_idx
 
+    def _assemble_rhs(self):
+        """
+        Assembling the right hand side of the step equation A*T=b
+            from the current temperatures and the boundary conditions
+        """
+
+        # Evaluate new boundary vector (BC means boundary condition)
+
+        # Assemble vector b (dot() is matrix multiplication)
+        b = self.b_base.dot(self.T)
+        # Apply explicit portion of HeatFlux (Neumann BC 1st node)
+        b[0] += self.dt*(1-self.theta)*self.HeatFlux[self.current_step_idx]
+        # Apply implicit portion of HeatFlux (Neumann BC 1st node)
+        b[0] += self.dt*self.theta*self.HeatFlux[self.current_step_idx+1]
+        # Apply explicit contribution of the body temperature (Robin BC Nth node)
+        b[-1] -= self.dt*(1-self.theta)*self.robin_alpha*self.T[-1]
+        # Apply explicit contribution of the ambient temperature (Robin BC Nth node)
+        b[-1] += self.dt*(1-self.theta)*self.robin_alpha*self.T_amb[self.current_step_idx]
+        # Apply implicit contribution of the ambient temperature (Robin BC Nth node)
+        b[-1] += self.dt*self.theta*self.robin_alpha*self.T_amb[self.current_step_idx+1]
+        # Apply explicit portion of the radiation (Nth node)
+        if self.emissivity:
+            b[-1] -= self.dt*(1-self.theta)*self._get_radiation(
+                self.T[-1], self.T_amb[self.current_step_idx])[0]
+
+        return b
+
+    def _get_radiation(self, T_surface: float, T_ambient: float) -> tuple:
+        """
+        Determining the heat flux radiated from the surface into the ambient,
+            and its derivative with respect to the surface temperature
+
+        Args:
+            T_surface ... temperature of the radiating surface
+            T_ambient ... temperature of the surroundings
+        """
+
+        coefficient = self.emissivity*STEFAN_BOLTZMANN
+        T_absolute = T_surface + ZERO_CELSIUS
+        heat_flux = coefficient*(T_absolute**4 - (T_ambient + ZERO_CELSIUS)**4)
+        return heat_flux, 4*coefficient*T_absolute**3
+
+    def _solve_system(self, b):
+        """
+        Solving the step equation A*T=b, returning the new temperatures
+
+        Args:
+            b ... right hand side of the equation
+        """
+
+        T = self._solve_linear(b)
+
+        # Temperature dependent properties are taken from the previous step
+        #   (lagged), and then from the temperatures during this step
+        #   (weighted by theta), solving the step again until they are
+        #   not changing anymore (Picard iteration) - most of the steps are
+        #   not changing them enough even to assemble the matrices again
+        if self.is_nonlinear:
+            for _ in range(self.MAX_NONLINEAR_ITERATIONS):
+                if not self.operators.update((1-self.theta)*self.T + self.theta*T):
+                    break
+                T = self._solve_linear(self._assemble_rhs())
+
+        if self.is_phase_change:
+            T = self._include_latent_heat(b, T)
+
+        return T
+
+    def _solve_linear(self, b):
+        """
+        Solving the step equation with the current matrix A, including
+            the radiation when there is some
+
+        Args:
+            b ... right hand side of the equation
+        """
+
+        T = self.solve_A(b)
+        if self.emissivity and self.theta:
+            T = self._include_radiation(T)
+        return T
+
+    def _include_radiation(self, T):
+        """
+        Correcting the temperatures of the step for the implicit portion
+            of the heat radiated from the last node
+        The radiation is changing only the last equation, so the step equation
+            is A*T + g(T_N)*e_N = b, and its solution is T = y - g(T_N)*z, where
+            y = A^-1*b (the step without radiation) and z = A^-1*e_N - only one
+            scalar equation T_N = y_N - g(T_N)*z_N must be solved by the Newton
+            iteration, and the factorization of A is used as it is (it is
+            the Sherman-Morrison formula for the rank-one update of A)
+        Vector z is computed only once for each matrix A
+
+        Args:
+            T ... temperatures of the step without the radiation
+        """
+
+        # Temperature dependent matrices are changing during the simulation
+        response_key = (id(self.operators), getattr(self.operators, "revision", 0))
+        if self.radiation_response_key != response_key:
+            unit_vector = np.zeros(len(T))
+            unit_vector[-1] = 1.0
+            self.radiation_response = self.solve_A(unit_vector)
+            self.radiation_response_key = response_key
+        z = self.radiation_response
+
+        # Radiated heat is increasing with the temperature, so the equation
+        #   has a single solution and the Newton iteration is converging to it
+        weight = self.dt*self.theta*float(z[-1])
+        T_ambient = float(self.T_amb[self.current_step_idx+1])
+        T_linear = T_surface = float(T[-1])
+        for _ in range(self.MAX_RADIATION_ITERATIONS):
+            heat_flux, derivative = self._get_radiation(T_surface, T_ambient)
+            residual = T_surface + weight*heat_flux - T_linear
+            correction = residual / (1 + weight*derivative)
+            # Not going under the absolute zero, where the derivative is wrong
+            T_surface = max(T_surface - correction, (T_surface - ZERO_CELSIUS) / 2)
+            if abs(correction) < self.RADIATION_TOLERANCE*(1 + abs(T_surface)):
+                break
+
+        heat_flux = self._get_radiation(T_surface, T_ambient)[0]
+        return T - self.dt*self.theta*heat_flux*z
+
+    def _include_latent_heat(self, b, T):
+        """
+        Correcting the temperatures of the step for the latent heat absorbed
+            (or released) by the melting (or solidifying) material
+        The enthalpy of the nodes must be conserved, so the equation of the step
+            is A*T + V*H(T) = b + V*H(T_previous), where V are the volumes
+            of the nodes and H the latent enthalpy (plus the radiation
+            from the last node, when there is some)
+        Is solved by the Newton iteration - the latent enthalpy is linear
+            in each part of the temperature range (solid, melting, liquid),
+            so the temperatures are not allowed to jump over the edges
+            of the melting range in one iteration (the derivative would
+            be wrong, and the iteration would be oscillating around the edge)
+
+        Args:
+            b ... right hand side of the equation without the latent heat
+            T ... temperatures of the step without the latent heat
+        """
+
+        latent_heat_before = self.nodal_volumes*self.material.get_latent_enthalpy(self.T)
+        latent_heat = self.nodal_volumes*self.material.get_latent_enthalpy(T)
+        # Nothing melted or solidified - the step is already correct
+        #   (no matter whether some nodes are staying in the melting range)
+        if np.array_equal(latent_heat, latent_heat_before):
+            return T
+
+        bandwidth = self.mesh.element_order
+        for _ in range(self.MAX_PHASE_CHANGE_ITERATIONS):
+            residual = b + latent_heat_before - self.A.dot(T) - latent_heat
+            latent_capacity = self.nodal_volumes*self.material.get_latent_capacity(T)
+
+            # Only the main diagonal is different from matrix A
+            band_storage = self.A_band.copy()
+            band_storage[2*bandwidth] += latent_capacity
+            # Radiation is also changing only the main diagonal (last node)
+            if self.emissivity and self.theta:
+                heat_flux, derivative = self._get_radiation(T[-1], self.T_amb[self.current_step_idx+1])
+                residual[-1] -= self.dt*self.theta*heat_flux
+                band_storage[2*bandwidth, -1] += self.dt*self.theta*derivative
+            lu, pivots, _ = dgbtrf(band_storage, bandwidth, bandwidth, overwrite_ab=True)
+            correction = dgbtrs(lu, bandwidth, bandwidth, residual, pivots)[0]
+
+            T = self.material.stop_at_melting_edges(T, T + correction)
+            latent_heat = self.nodal_volumes*self.material.get_latent_enthalpy(T)
+            if np.max(np.abs(correction)) < self.PHASE_CHANGE_TOLERANCE:
+                break
+
+        return T
+
+    def _interpolate_probe(self, T) -> float:
+        """
+        Determining the temperature at the place of our interest
+
+        Args:
+            T ... temperatures in all the nodes
+        """
+
+        return self.T_x0_interpolator(T)  # type: ignore
+
     def after_simulation_action(self, SimController=None):
         """
         Defines what should happen after the simulation is over
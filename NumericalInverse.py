@@ -5,9 +5,11 @@ This module is hosting class responsible for the inverse simulation
 import csv
 import time
 import math
+from typing import Optional
 import numpy as np  # type: ignore
 from scipy.signal import savgol_filter  # type: ignore
 from NumericalForward import Simulation
+from NumericalOperators import Mesh, TemperatureDependentOperators
 
 
 class InverseSimulation(Simulation):  # later abbreviated as Prob
@@ -17,6 +19,16 @@ class InverseSimulation(Simulation):  # later abbreviated as Prob
     Inherits all the internal properties from the Simulation class
     """
 
+    # Inverse parameters are not changing anything prepared in advance,
+    #   they are only being used when evaluating the steps
+    PARAMETER_DEPENDENCIES = {
+        **Simulation.PARAMETER_DEPENDENCIES,
+        "window_span": [],
+        "tolerance": [],
+        "init_q_adjustment": [],
+        "adjusting_value": [],
+    }
+
     def __init__(self,
                  N: int,
                  dt: float,
@@ -29,7 +41,10 @@ class InverseSimulation(Simulation):  # later abbreviated as Prob
                  tolerance: float,
                  init_q_adjustment: float,
                  adjusting_value: float,
-                 experiment_data_path: str = "DATA.csv"):
+                 experiment_data_path: str = "DATA.csv",
+                 mesh: Optional[Mesh] = None,
+                 layers: Optional[list] = None,
+                 emissivity: float = 0.0):
         """
         Args:
             N ... number of elements in the model
@@ -44,6 +59,9 @@ class InverseSimulation(Simulation):  # later abbreviated as Prob
             init_q_adjustment ... starting value of heat flux adjustments
             adjusting_value ... how should be the heat flux adjusted
             experiment_data_path ... from where the data should be taken
+            mesh ... distribution of the nodes (uniform when not specified)
+            layers ... layers of the composite object (homogeneous when not specified)
+            emissivity ... emissivity of the far side radiating into the ambient
         """
 
         super().__init__(length=length,
@@ -53,24 +71,15 @@ class InverseSimulation(Simulation):  # later abbreviated as Prob
                          robin_alpha=robin_alpha,
                          dt=dt,
                          x0=x0,
-                         experiment_data_path=experiment_data_path)
+                         experiment_data_path=experiment_data_path,
+                         mesh=mesh,
+                         layers=layers,
+                         emissivity=emissivity)
         self.window_span = window_span
         self.tolerance = tolerance
         self.init_q_adjustment = init_q_adjustment
         self.adjusting_value = adjusting_value
 
-        # Storing the amount of iterations we made for the simulation
-        self.number_of_iterations = 0
-
-        # fluxes to be resolved
-        self.current_q_idx = 0  # initial index
-        self.HeatFlux.fill(0)  # change initial values
-
-        # Varibles for smoothing purposes - long list for storing whole
-        #   history and stored index
-        self.smooth_history = [[] for _ in range(1000)]  # type: ignore
-        self.smooth_index = 0
-
     def __repr__(self) -> str:
         """
         Defining what should be displayed when we print the
@@ -86,6 +95,26 @@ class InverseSimulation(Simulation):  # later abbreviated as Prob
             self.adjusting_value: {self.adjusting_value},
             """
 
+    def reset(self) -> None:
+        """
+        Putting the simulation into its initial state, so that it can be
+            run again from the beginning
+        """
+
+        super().reset()
+
+        # Storing the amount of iterations we made for the simulation
+        self.number_of_iterations = 0
+
+        # fluxes to be resolved
+        self.current_q_idx = 0  # initial index
+        self.HeatFlux = np.zeros(len(self.t))  # change initial values
+
+        # Varibles for smoothing purposes - long list for storing whole
+        #   history and stored index
+        self.smooth_history = [[] for _ in range(1000)]  # type: ignore
+        self.smooth_index = 0
+
     def evaluate_one_step(self) -> None:
         """
         Running one whole step of the inverse simulation, until the point
@@ -233,7 +262,7 @@ class InverseSimulation(Simulation):  # later abbreviated as Prob
                 - containing all the references to GUI
         """
 
-        if SimController.progress_callback is not None:
+        if SimController is not None and SimController.progress_callback is not None:
             # Sending signal that we are ready for smoothing
             SimController.progress_callback.emit(2)
             # Listening for the smoothing input
@@ -282,7 +311,7 @@ class InverseSimulation(Simulation):  # later abbreviated as Prob
             print("cannot revert anymore")
 
     def _smooth_the_result(self,
-                           window_length: int = None,
+                           window_length: Optional[int] = None,
                            method: str = "moving_avg") -> None:
         """
         Making the final result smoothed - modifying the resulting HeatFlux
@@ -405,6 +434,10 @@ class InverseSimulation(Simulation):  # later abbreviated as Prob
 
         self.checkpoint_step_idx = self.current_step_idx
         self.T_checkpoint[:] = self.T[:]
+        # Temperature dependent properties must also return to the checkpoint,
+        #   not to stay from the rejected heat flux
+        if isinstance(self.operators, TemperatureDependentOperators):
+            self.operators_checkpoint = self.operators.get_state()
 
     def _revert_to_checkpoint(self) -> None:
         """
@@ -413,3 +446,5 @@ class InverseSimulation(Simulation):  # later abbreviated as Prob
 
         self.current_step_idx = self.checkpoint_step_idx
         self.T[:] = self.T_checkpoint[:]
+        if isinstance(self.operators, TemperatureDependentOperators):
+            self.operators.set_state(self.operators_checkpoint)
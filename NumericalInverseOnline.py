@@ -0,0 +1,377 @@
+"""
+This module is hosting the online (fixed-lag) inverse simulation
+
+Unlike the InverseSimulation, which is searching for each heat flux by
+    trial and error, this one is using the linearity of the problem.
+    The temperature at the place of interest is a sum of the free response
+    (what would happen with no more heat flux) and of the responses to all
+    the unknown heat fluxes, which are always the same (sensitivity).
+
+In each step one new measurement is taken, and all the heat fluxes in the
+    window of last (lag + revision_span) time points are estimated at once
+    by regularized least squares. The matrices of this problem are constant,
+    so they are prepared in advance, and every step costs the same
+    (window size + 1 linear solves and one small matrix multiplication).
+
+Each heat flux estimate is considered emitted when it is "lag" time points
+    old. It is still being revised by the newer measurements until it leaves
+    the window, after which it is final and the state of the simulation
+    is moved one step further with it.
+"""
+
+import time
+from typing import Optional
+import numpy as np  # type: ignore
+from NumericalForward import Simulation
+from NumericalInverse import InverseSimulation
+from NumericalLive import LiveSimulation, get_duration_statistics
+from NumericalOperators import Mesh
+
+
+class OnlineInverseSimulation(Simulation):
+    """
+    Class holding variables and methods of the inverse simulation
+        with constant computational cost per one measurement
+    Inherits all the internal properties from the Simulation class
+    """
+
+    # Online parameters are only used when preparing the estimation (in reset())
+    PARAMETER_DEPENDENCIES = {
+        **Simulation.PARAMETER_DEPENDENCIES,
+        "lag": [],
+        "revision_span": [],
+        "regularization": [],
+    }
+
+    # The estimation is based on the superposition, valid only for constant properties
+    ONLY_LINEAR_MODEL = True
+
+    def __init__(self,
+                 N: int,
+                 dt: float,
+                 theta: float,
+                 robin_alpha: float,
+                 x0: float,
+                 length: float,
+                 material,
+                 lag: int = 10,
+                 revision_span: Optional[int] = None,
+                 regularization: float = 0.1,
+                 experiment_data_path: str = "DATA.csv",
+                 mesh: Optional[Mesh] = None,
+                 layers: Optional[list] = None,
+                 emissivity: float = 0.0) -> None:
+        """
+        Args:
+            N ... number of elements in the model
+            dt ... fixed time step
+            theta ... defining the explicitness/implicitness of the simulation
+            robin_alpha ... coefficient of heat convection
+            x0 ... where is the place of our interest in the object
+            length ... how long is the object
+            material ... object containing material properties
+            lag ... after how many time points is the heat flux emitted
+            revision_span ... for how many time points is the emitted
+                              heat flux still being revised (same as lag
+                              when not specified)
+            regularization ... how much are the changes of heat flux
+                               penalized (relative to the sensitivity)
+            experiment_data_path ... from where the data should be taken
+            mesh ... distribution of the nodes (uniform when not specified)
+            layers ... layers of the composite object (homogeneous when not specified)
+            emissivity ... emissivity of the far side (radiation is not supported)
+        """
+
+        # Needed already in reset(), which is called from the parent
+        self.lag = int(lag)
+        self.revision_span = self.lag if revision_span is None else int(revision_span)
+        self.regularization = regularization
+
+        super().__init__(length=length,
+                         material=material,
+                         N=N,
+                         theta=theta,
+                         robin_alpha=robin_alpha,
+                         dt=dt,
+                         x0=x0,
+                         experiment_data_path=experiment_data_path,
+                         mesh=mesh,
+                         layers=layers,
+                         emissivity=emissivity)
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.Sim: {super().__repr__()},
+            self.lag: {self.lag},
+            self.revision_span: {self.revision_span},
+            self.regularization: {self.regularization},
+            """
+
+    def reset(self) -> None:
+        """
+        Putting the simulation into its initial state, so that it can be
+            run again from the beginning
+        """
+
+        super().reset()
+
+        # Heat fluxes are unknown at the beginning
+        self.HeatFlux = np.zeros(len(self.t))
+
+        # Size of the window of heat fluxes being estimated together
+        #   (it must contain at least the not yet emitted ones)
+        self.window_size = max(self.lag + self.revision_span, 1)
+        # Time index of the state stored in self.T - all the heat fluxes
+        #   up to this index are final
+        self.base_step_idx = 0
+        # First value of each emitted heat flux, to see the revisions
+        self.emitted_heat_flux: list = []
+
+        # Metrics - the computation time of each step and the time between
+        #   the arrival of measurement and emission of its heat flux
+        self.step_durations: list = []
+        self.emission_delays: list = []
+
+        self._prepare_sensitivity()
+
+    def _advance(self, T, flux_start: float, flux_end: float,
+                 T_amb_start: float, T_amb_end: float):
+        """
+        Simulating one step from the given temperatures, not changing
+            the state of the simulation
+
+        Args:
+            T ... temperatures at the start of the step
+            flux_start ... heat flux at the start of the step
+            flux_end ... heat flux at the end of the step
+            T_amb_start ... ambient temperature at the start of the step
+            T_amb_end ... ambient temperature at the end of the step
+        """
+
+        # The same as in Simulation.evaluate_one_step()
+        b = self.b_base.dot(T)
+        b[0] += self.dt*(1-self.theta)*flux_start
+        b[0] += self.dt*self.theta*flux_end
+        b[-1] -= self.dt*(1-self.theta)*self.robin_alpha*T[-1]
+        b[-1] += self.dt*(1-self.theta)*self.robin_alpha*T_amb_start
+        b[-1] += self.dt*self.theta*self.robin_alpha*T_amb_end
+
+        return self.solve_A(b)
+
+    def _prepare_sensitivity(self) -> None:
+        """
+        Determining how the temperature at the place of interest reacts
+            to a unit heat flux in one time point, which is the same for
+            all the time points
+        """
+
+        # Unit heat flux starting after the first step, from zero
+        #   temperatures and zero ambient temperature
+        T = np.zeros(len(self.x))
+        self.sensitivity = np.empty(self.window_size)
+        for i in range(self.window_size):
+            flux_start = 0.0 if i == 0 else 1.0
+            T = self._advance(T, flux_start, 1.0, 0.0, 0.0)
+            self.sensitivity[i] = self.T_x0_interpolator(T)
+
+        # Sensitivity of the response to a heat flux in just one time point
+        #   (the difference of the responses to the unit steps)
+        self.pulse_sensitivity = np.diff(self.sensitivity, prepend=0.0)
+
+        # Estimation matrices for all the window sizes (the window is
+        #   smaller at the beginning of the simulation)
+        self._estimators: dict = {}
+
+    def _get_estimator(self, window_size: int):
+        """
+        Returning the matrices estimating the heat fluxes in the window
+
+        Heat fluxes q are minimizing
+            |Y - Y_free - X*q|^2 + alpha*|D*q - q_final|^2,
+            where X is the sensitivity matrix and D is the difference matrix
+            (the first heat flux is compared to the last final one)
+        Therefore q = P*(Y - Y_free) + c*q_final
+
+        Args:
+            window_size ... how many heat fluxes are being estimated
+        """
+
+        if window_size not in self._estimators:
+            # X[i, j] ... response at time point i to heat flux in time point j
+            indexes = np.subtract.outer(np.arange(window_size), np.arange(window_size))
+            X = np.where(indexes >= 0, self.pulse_sensitivity[np.clip(indexes, 0, None)], 0.0)
+
+            D = np.eye(window_size) - np.eye(window_size, k=-1)
+            XtX = X.T.dot(X)
+            # Making the regularization independent of the units
+            alpha = self.regularization*np.trace(XtX)/window_size
+            G = np.linalg.inv(XtX + alpha*D.T.dot(D))
+
+            P = G.dot(X.T)
+            c = alpha*G[:, 0]
+            self._estimators[window_size] = (X, P, c)
+
+        return self._estimators[window_size]
+
+    def evaluate_one_step(self) -> None:
+        """
+        Taking one new measurement, estimating all the heat fluxes
+            in the window and emitting the one that is lag time points old
+        """
+
+        start_time = time.perf_counter()
+
+        newest_idx = self.current_step_idx + 1
+        base_idx = self.base_step_idx
+        window_size = newest_idx - base_idx
+        X, P, c = self._get_estimator(window_size)
+
+        # Free response - what would happen with zero heat flux in the window
+        free_response = np.empty(window_size)
+        T = self.T
+        for i in range(window_size):
+            flux_start = self.HeatFlux[base_idx] if i == 0 else 0.0
+            T = self._advance(T, flux_start, 0.0,
+                              self.T_amb[base_idx+i], self.T_amb[base_idx+i+1])
+            free_response[i] = self.T_x0_interpolator(T)
+
+        # Estimating the heat fluxes and the resulting temperatures
+        q = P.dot(self.T_data[base_idx+1:newest_idx+1] - free_response)
+        q += c*self.HeatFlux[base_idx]
+        self.HeatFlux[base_idx+1:newest_idx+1] = q
+        self.T_x0[base_idx+1:newest_idx+1] = free_response + X.dot(q)
+
+        self.current_step_idx = newest_idx
+        self.current_t = self.dt * self.current_step_idx
+
+        # Emitting the heat flux that is old enough
+        while len(self.emitted_heat_flux) <= newest_idx - self.lag:
+            self._emit_heat_flux()
+
+        # When the window is full, its oldest heat flux will not be revised
+        #   anymore, so the state can be moved with it
+        if window_size == self.window_size:
+            self.T = self._advance(self.T, self.HeatFlux[base_idx], self.HeatFlux[base_idx+1],
+                                   self.T_amb[base_idx], self.T_amb[base_idx+1])
+            self.base_step_idx += 1
+
+        self.step_durations.append(time.perf_counter() - start_time)
+
+    def _emit_heat_flux(self) -> None:
+        """
+        Emitting the oldest heat flux that was not emitted yet
+        """
+
+        step_idx = len(self.emitted_heat_flux)
+        self.emitted_heat_flux.append(self.HeatFlux[step_idx])
+
+        arrival_time = self._get_arrival_time(step_idx)
+        if arrival_time is not None:
+            self.emission_delays.append(time.perf_counter() - arrival_time)
+
+    def _get_arrival_time(self, step_idx: int):
+        """
+        Returning when the measurement for the given time point arrived,
+            or None when it is not known (data were read from a file)
+
+        Args:
+            step_idx ... index of the time point
+        """
+
+        return None
+
+    def online_statistics(self) -> dict:
+        """
+        Summarizing the metrics of the online estimation
+        """
+
+        emitted_count = len(self.emitted_heat_flux)
+        revisions = np.abs(self.HeatFlux[:emitted_count] - np.array(self.emitted_heat_flux))
+
+        return {
+            "lag_steps": self.lag,
+            "lag_time": self.lag*self.dt,
+            "step_duration_ms": get_duration_statistics(self.step_durations),
+            "emission_delay_ms": get_duration_statistics(self.emission_delays),
+            "mean_revision": round(float(np.mean(revisions)), 3) if emitted_count else 0.0,
+        }
+
+    def after_simulation_action(self, SimController=None):
+        """
+        Defines what should happen after the simulation is over
+
+        Args:
+            SimController ... whole simulation controller object
+                - containing all the references to GUI
+        """
+
+        # No more measurements will come, all the heat fluxes are emitted
+        while len(self.emitted_heat_flux) <= self.current_step_idx:
+            self._emit_heat_flux()
+
+        self.error_norm = self._calculate_final_error()
+        print("Error norm after simulation: {}".format(self.error_norm))
+        print("Online statistics: {}".format(self.online_statistics()))
+
+    def plot(self, temperature_plot, heat_flux_plot):
+        """
+        Defining the way simulation data should be plotted
+        Only the emitted heat fluxes are shown
+
+        Args:
+            temperature_plot ... reference to temperature plot
+            heat_flux_plot ... reference to heat flux plot
+        """
+
+        emitted_count = len(self.emitted_heat_flux)
+
+        temperature_plot.plot(x_values=self.t[:emitted_count],
+                              y_values=self.T_x0[:emitted_count],
+                              x_experiment_values=self.Exp_data.t_data,
+                              y_experiment_values=self.Exp_data.T_data)
+
+        heat_flux_plot.plot(x_values=self.t[:emitted_count],
+                            y_values=self.HeatFlux[:emitted_count],
+                            x_experiment_values=self.Exp_data.t_data,
+                            y_experiment_values=self.Exp_data.q_data)
+
+    # The results are the same kind as the ones of the inverse simulation
+    save_results = InverseSimulation.save_results
+    _calculate_final_error = InverseSimulation._calculate_final_error
+
+
+class LiveOnlineInverseSimulation(LiveSimulation, OnlineInverseSimulation):
+    """
+    Class holding variables and methods of the online inverse simulation
+        processing the data of a running experiment
+    Accepts the arguments of both LiveSimulation and OnlineInverseSimulation
+    """
+
+    def _get_initial_heat_flux(self, t):
+        """
+        Heat flux is unknown, it is being estimated by the simulation
+
+        Args:
+            t ... new time points
+        """
+
+        return np.zeros(len(t))
+
+    def _get_arrival_time(self, step_idx: int):
+        """
+        Returning when the first measurement not earlier than the given
+            time point arrived
+
+        Args:
+            step_idx ... index of the time point
+        """
+
+        sample_idx = np.searchsorted(self.Exp_data.t_data, self.t[step_idx])
+        sample_idx = min(sample_idx, self.Exp_data.number_of_samples - 1)
+        return self.Exp_data.arrival_times[sample_idx]
@@ -0,0 +1,432 @@
+"""
+This module is hosting the inverse simulation divided into time segments,
+    which are being solved in parallel in more processes
+
+The heat flux from a long time ago has almost no effect on the current
+    temperatures (thermal diffusion is damping it), so the experiment can
+    be split into segments that are solved independently. To start
+    in the middle of the experiment, each segment needs the temperatures
+    in the whole object at its beginning - these are taken from a quick
+    forward pass with the heat flux estimated by the (cheap) online
+    inverse simulation.
+
+The segments are overlapping - each one starts a little earlier and ends
+    a little later than its own part of the experiment. The results in the
+    overlaps are blended linearly, so that there are no jumps between
+    the segments.
+"""
+
+import os
+import math
+from typing import Callable, Optional
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np  # type: ignore
+from NumericalInverse import InverseSimulation
+from NumericalInverseOnline import OnlineInverseSimulation
+from NumericalOperators import Mesh
+from experiment_data_handler import Material
+
+
+class TimeSegmentMixin:
+    """
+    Mixin restricting any simulation to a time segment of the experiment,
+        starting from the specified temperatures
+    Must be placed before the simulation class in the list of parents
+    """
+
+    # Defined by the simulation class
+    t: np.ndarray
+    T_data: np.ndarray
+    HeatFlux: np.ndarray
+    T_amb: np.ndarray
+    T: np.ndarray
+    T_x0: list
+    T_x0_interpolator: Callable
+    max_step_idx: int
+
+    def __init__(self,
+                 segment_start_idx: int,
+                 segment_stop_idx: int,
+                 initial_temperatures,
+                 **kwargs) -> None:
+        """
+        Args:
+            segment_start_idx ... index of the first time point of the segment
+            segment_stop_idx ... index of the last time point of the segment
+            initial_temperatures ... temperatures in the whole object
+                                     at the start of the segment
+            kwargs ... arguments of the simulation class
+        """
+
+        self.segment_start_idx = segment_start_idx
+        self.segment_stop_idx = segment_stop_idx
+        self.initial_temperatures = initial_temperatures
+
+        super().__init__(**kwargs)  # type: ignore
+
+    def _prepare_time_grid(self) -> None:
+        """
+        Keeping only the time points of the segment
+        """
+
+        super()._prepare_time_grid()  # type: ignore
+
+        segment = slice(self.segment_start_idx, self.segment_stop_idx + 1)
+        self.t = self.t[segment]
+        self.T_data = self.T_data[segment]
+        self.HeatFlux = self.HeatFlux[segment]
+        self.T_amb = self.T_amb[segment]
+        self.max_step_idx = len(self.t) - 1
+
+    def reset(self) -> None:
+        """
+        Putting the simulation into its initial state, starting from
+            the specified temperatures
+        """
+
+        super().reset()  # type: ignore
+
+        self.T = np.array(self.initial_temperatures, dtype=float)
+        self.T_x0[0] = self.T_x0_interpolator(self.T)
+        self._reset_properties()  # type: ignore
+
+
+def solve_segment(task: dict) -> dict:
+    """
+    Solving one time segment, returning the heat flux and the temperatures
+        at the place of interest in all its time points
+    Is a module-level function, so that it can be run in other processes
+
+    Args:
+        task ... all the information needed for the segment simulation
+            - simulation_class ... which inverse simulation to use
+            - simulation_arguments ... its arguments
+            - segment_start_idx, segment_stop_idx, initial_temperatures
+                ... see TimeSegmentMixin
+    """
+
+    simulation_class = task["simulation_class"]
+    segment_class = type("Segment" + simulation_class.__name__,
+                         (TimeSegmentMixin, simulation_class), {})
+
+    Sim = segment_class(segment_start_idx=task["segment_start_idx"],
+                        segment_stop_idx=task["segment_stop_idx"],
+                        initial_temperatures=task["initial_temperatures"],
+                        **task["simulation_arguments"])
+    while not Sim.simulation_has_finished:
+        Sim.evaluate_one_step()
+
+    return {
+        "HeatFlux": np.asarray(Sim.HeatFlux),
+        "T_x0": np.asarray(Sim.T_x0),
+        "number_of_iterations": getattr(Sim, "number_of_iterations", 0),
+    }
+
+
+class SegmentedInverseSimulation(InverseSimulation):
+    """
+    Class holding variables and methods of the inverse simulation
+        divided into overlapping time segments solved in parallel
+    Inherits all the internal properties from the InverseSimulation class,
+        whose smoothing and saving of the results stays the same
+
+    Calls of evaluate_one_step() are waiting for the segments to finish,
+        after which the current step index is at the end of the segments
+        that are already blended together
+    """
+
+    def __init__(self,
+                 N: int,
+                 dt: float,
+                 theta: float,
+                 robin_alpha: float,
+                 x0: float,
+                 length: float,
+                 material,
+                 window_span: int,
+                 tolerance: float,
+                 init_q_adjustment: float,
+                 adjusting_value: float,
+                 experiment_data_path: str = "DATA.csv",
+                 mesh: Optional[Mesh] = None,
+                 layers: Optional[list] = None,
+                 emissivity: float = 0.0,
+                 time_segments: Optional[int] = None,
+                 overlap: Optional[int] = None,
+                 segment_simulation_class=InverseSimulation,
+                 executor=None) -> None:
+        """
+        Args:
+            N ... number of elements in the model
+            dt ... fixed time step
+            theta ... defining the explicitness/implicitness of the simulation
+            robin_alpha ... coefficient of heat convection
+            x0 ... where is the place of our interest in the object
+            length ... how long is the object
+            material ... object containing material properties
+            window_span ... how many windows evaluate into the future
+            tolerance ... tolerance for accepting the heat flux
+            init_q_adjustment ... starting value of heat flux adjustments
+            adjusting_value ... how should be the heat flux adjusted
+            experiment_data_path ... from where the data should be taken
+            mesh ... distribution of the nodes (uniform when not specified)
+            layers ... layers of the composite object (homogeneous when not specified)
+            emissivity ... emissivity of the far side radiating into the ambient
+            time_segments ... into how many segments divide the experiment
+                              (number of processor cores when not specified)
+            overlap ... by how many time points the segments are reaching
+                        into their neighbours (by default determined from
+                        the time the heat needs to go through the object)
+            segment_simulation_class ... inverse simulation solving the segments
+            executor ... where to solve the segments (concurrent.futures executor)
+                - new process pool is created when not specified
+        """
+
+        self.time_segments = time_segments or os.cpu_count() or 1
+        self.overlap = overlap
+        self.segment_simulation_class = segment_simulation_class
+        self.executor = executor
+        # Only the process pool created here is also stopped here
+        self._owns_executor = False
+
+        super().__init__(N=N,
+                         dt=dt,
+                         theta=theta,
+                         robin_alpha=robin_alpha,
+                         x0=x0,
+                         length=length,
+                         material=material,
+                         window_span=window_span,
+                         tolerance=tolerance,
+                         init_q_adjustment=init_q_adjustment,
+                         adjusting_value=adjusting_value,
+                         experiment_data_path=experiment_data_path,
+                         mesh=mesh,
+                         layers=layers,
+                         emissivity=emissivity)
+
+    def reset(self) -> None:
+        """
+        Putting the simulation into its initial state, so that it can be
+            run again from the beginning
+        """
+
+        super().reset()
+
+        # Segments are prepared and submitted in the first step, as it can
+        #   take some time (and the inverse parameters are not set yet here)
+        self.segment_futures: list = []
+        self.segment_results: list = []
+
+    def _prepare_segments(self) -> None:
+        """
+        Dividing the experiment into segments and determining their overlap
+        """
+
+        # Time indexes dividing the experiment into segments
+        number_of_segments = max(1, min(self.time_segments, self.max_step_idx))
+        self.segment_bounds = np.linspace(0, self.max_step_idx, number_of_segments+1).astype(int)
+        self.segment_results = number_of_segments*[None]
+
+        if self.overlap is None:
+            # Time for the heat to go through the object, but at least
+            #   the window the inverse simulation is looking into the future
+            diffusivity = self.lmbd/(self.rho*self.cp)
+            overlap = max(math.ceil(self.length**2/(diffusivity*self.dt)), 2*self.window_span)
+        else:
+            overlap = int(self.overlap)
+        # Overlap must not be bigger than half of the segment, so that only
+        #   neighbouring segments are overlapping
+        min_segment_length = int(np.min(np.diff(self.segment_bounds)))
+        self.segment_overlap = max(1, min(overlap, min_segment_length // 2))
+
+    def _get_segment_range(self, segment_idx: int) -> tuple:
+        """
+        Returning the first and last time index of the segment,
+            including the overlaps
+
+        Args:
+            segment_idx ... which segment
+        """
+
+        start_idx = max(0, self.segment_bounds[segment_idx] - self.segment_overlap)
+        stop_idx = min(self.max_step_idx, self.segment_bounds[segment_idx+1] + self.segment_overlap)
+        return start_idx, stop_idx
+
+    def _estimate_initial_temperatures(self) -> list:
+        """
+        Determining the temperatures at the starts of all the segments
+            by the quick forward pass with the heat flux estimated online
+        """
+
+        start_indexes = [self._get_segment_range(segment_idx)[0]
+                         for segment_idx in range(len(self.segment_results))]
+        # Uniform temperature is used when the pass does not get that far
+        # The online simulation is linear (without the radiation and with
+        #   constant properties), which is good enough for the estimate,
+        #   as the segments are overlapping
+        initial_temperatures = [np.full(len(self.x), self.T_data[start_idx])
+                                for start_idx in start_indexes]
+
+        QuickSim = OnlineInverseSimulation(N=self.N,
+                                           dt=self.dt,
+                                           theta=self.theta,
+                                           robin_alpha=self.robin_alpha,
+                                           x0=self.x0,
+                                           length=self.length,
+                                           material=Material(self.rho, self.cp, self.lmbd),
+                                           lag=self.window_span,
+                                           experiment_data_path=self.experiment_data_path,
+                                           mesh=self.mesh,
+                                           layers=self.layers)
+        # State of the online simulation (QuickSim.T) is moving with the final
+        #   heat fluxes, so it is a forward pass with them
+        while not QuickSim.simulation_has_finished:
+            for segment_idx, start_idx in enumerate(start_indexes):
+                if QuickSim.base_step_idx == start_idx:
+                    initial_temperatures[segment_idx] = QuickSim.T.copy()
+            QuickSim.evaluate_one_step()
+
+        return initial_temperatures
+
+    def _submit_segments(self) -> None:
+        """
+        Sending all the segments to be solved
+        """
+
+        self._prepare_segments()
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.time_segments)
+            self._owns_executor = True
+
+        simulation_arguments = {
+            "N": self.N,
+            "dt": self.dt,
+            "theta": self.theta,
+            "robin_alpha": self.robin_alpha,
+            "x0": self.x0,
+            "length": self.length,
+            "material": self.material,
+            "window_span": self.window_span,
+            "tolerance": self.tolerance,
+            "init_q_adjustment": self.init_q_adjustment,
+            "adjusting_value": self.adjusting_value,
+            "experiment_data_path": self.experiment_data_path,
+            "mesh": self.mesh,
+            "layers": self.layers,
+            "emissivity": self.emissivity,
+        }
+
+        initial_temperatures = self._estimate_initial_temperatures()
+        for segment_idx in range(len(self.segment_results)):
+            start_idx, stop_idx = self._get_segment_range(segment_idx)
+            task = {
+                "simulation_class": self.segment_simulation_class,
+                "simulation_arguments": simulation_arguments,
+                "segment_start_idx": start_idx,
+                "segment_stop_idx": stop_idx,
+                "initial_temperatures": initial_temperatures[segment_idx],
+            }
+            self.segment_futures.append(self.executor.submit(solve_segment, task))
+
+    def evaluate_one_step(self) -> None:
+        """
+        Waiting (but not too long, so that the controller can react on
+            commands from the GUI in the meantime) for the segments to finish,
+            and blending the results of the finished ones
+        """
+
+        if not self.segment_futures:
+            self._submit_segments()
+            return
+
+        pending = [future for future, result in zip(self.segment_futures, self.segment_results)
+                   if result is None]
+        done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+        if not done:
+            return
+
+        for segment_idx, future in enumerate(self.segment_futures):
+            if future in done:
+                self.segment_results[segment_idx] = future.result()
+
+        self._blend_finished_segments()
+
+    def _get_segment_weights(self, segment_idx: int, indexes):
+        """
+        Determining the weights of the segment results in the given time
+            points - linearly rising in the overlap with the previous segment
+            and falling in the overlap with the next one, so that the weights
+            of both segments in the overlap are together always one
+
+        Args:
+            segment_idx ... which segment
+            indexes ... time indexes of the segment
+        """
+
+        overlap_length = 2*self.segment_overlap
+        weights = np.ones(len(indexes))
+        if segment_idx > 0:
+            overlap_start = self.segment_bounds[segment_idx] - self.segment_overlap
+            weights *= np.clip((indexes - overlap_start)/overlap_length, 0, 1)
+        if segment_idx < len(self.segment_results) - 1:
+            overlap_end = self.segment_bounds[segment_idx+1] + self.segment_overlap
+            weights *= np.clip((overlap_end - indexes)/overlap_length, 0, 1)
+
+        return weights
+
+    def _blend_finished_segments(self) -> None:
+        """
+        Combining the results of all the finished segments at the beginning
+            of the experiment into the resulting heat flux and temperatures
+        """
+
+        number_of_finished = 0
+        while (number_of_finished < len(self.segment_results)
+               and self.segment_results[number_of_finished] is not None):
+            number_of_finished += 1
+
+        HeatFlux = np.zeros(len(self.t))
+        T_x0 = np.zeros(len(self.t))
+        self.number_of_iterations = 0
+        for segment_idx in range(number_of_finished):
+            result = self.segment_results[segment_idx]
+            start_idx, stop_idx = self._get_segment_range(segment_idx)
+            indexes = np.arange(start_idx, stop_idx+1)
+            weights = self._get_segment_weights(segment_idx, indexes)
+            HeatFlux[start_idx:stop_idx+1] += weights*result["HeatFlux"]
+            T_x0[start_idx:stop_idx+1] += weights*result["T_x0"]
+            self.number_of_iterations += result["number_of_iterations"]
+
+        self.HeatFlux = HeatFlux
+        self.T_x0 = list(T_x0)
+
+        # Results are complete only before the overlap with the next
+        #   segment, which is not finished yet
+        if number_of_finished == len(self.segment_results):
+            self.current_step_idx = self.max_step_idx
+        else:
+            self.current_step_idx = max(0, self.segment_bounds[number_of_finished] - self.segment_overlap)
+        self.current_q_idx = self.current_step_idx
+        self.current_t = self.dt * self.current_step_idx
+
+    def after_simulation_action(self, SimController=None):
+        """
+        Defines what should happen after the simulation is over
+
+        Args:
+            SimController ... whole simulation controller object
+                - containing all the references to GUI
+        """
+
+        # Not solving the remaining segments when the simulation was stopped
+        for future in self.segment_futures:
+            future.cancel()
+        if self._owns_executor:
+            self.executor.shutdown()
+            self.executor = None
+            self._owns_executor = False
+
+        if self.current_step_idx > 0:
+            super().after_simulation_action(SimController)
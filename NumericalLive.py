@@ -0,0 +1,289 @@
+"""
+This module is hosting the simulations following a running experiment
+
+The time grid and the interpolated experiment data are extended
+    whenever new samples arrive. When the simulation catches up with
+    the data, it is waiting for new ones instead of finishing - it is
+    finished only when the data source is closed.
+
+For each sample the end-to-end latency is measured - the time from
+    its arrival to the moment the simulation has processed it.
+"""
+
+import time
+import numpy as np  # type: ignore
+from NumericalForward import Simulation
+from NumericalInverse import InverseSimulation
+from experiment_data_handler import ExperimentDataCannotBeParsedError
+from experiment_data_live import LiveExperimentalData
+
+
+def get_duration_statistics(durations) -> dict:
+    """
+    Summarizing the measured durations (in milliseconds)
+
+    Args:
+        durations ... durations in seconds
+    """
+
+    if len(durations) == 0:
+        return {"count": 0}
+
+    durations = 1000*np.asarray(durations)
+    return {
+        "count": len(durations),
+        "mean": round(float(np.mean(durations)), 3),
+        "median": round(float(np.median(durations)), 3),
+        "p95": round(float(np.percentile(durations, 95)), 3),
+        "max": round(float(np.max(durations)), 3),
+    }
+
+
+class LiveSimulation(Simulation):
+    """
+    Class holding variables and methods of the forward simulation
+        processing the data of a running experiment
+    Inherits all the internal properties from the Simulation class
+    """
+
+    # Names of all the series defined in the simulation time points
+    TIME_SERIES = ["t", "T_data", "HeatFlux", "T_amb"]
+
+    # Experiment data are growing while the simulation is running
+    Exp_data: LiveExperimentalData
+
+    def __init__(self,
+                 N: int,
+                 dt: float,
+                 theta: float,
+                 robin_alpha: float,
+                 x0: float,
+                 length: float,
+                 material,
+                 data_source: LiveExperimentalData,
+                 wait_timeout: float = 0.05,
+                 **kwargs) -> None:
+        """
+        Args:
+            N ... number of elements in the model
+            dt ... fixed time step
+            theta ... defining the explicitness/implicitness of the simulation
+            robin_alpha ... coefficient of heat convection
+            x0 ... where is the place of our interest in the object
+            length ... how long is the object
+            material ... object containing material properties
+            data_source ... object supplying the data (LiveExperimentalData)
+            wait_timeout ... how long to wait for data in one step
+            kwargs ... arguments of other parent classes (inverse simulation)
+        """
+
+        self.data_source = data_source
+        self.wait_timeout = wait_timeout
+
+        super().__init__(N=N,
+                         dt=dt,
+                         theta=theta,
+                         robin_alpha=robin_alpha,
+                         x0=x0,
+                         length=length,
+                         material=material,
+                         # Data are coming from the source, not from the file
+                         experiment_data_path="",
+                         **kwargs)
+
+    def _prepare_experiment_data(self) -> None:
+        """
+        Waiting for the first sample, as the initial temperature
+            must be known before starting
+        """
+
+        self.Exp_data = self.data_source
+        while self.Exp_data.number_of_samples == 0 and not self.Exp_data.closed:
+            self.Exp_data.wait_for_samples(self.wait_timeout)
+
+        if self.Exp_data.number_of_samples == 0:
+            raise ExperimentDataCannotBeParsedError("No data arrived")
+
+    def _prepare_time_grid(self) -> None:
+        """
+        Preparing the storage for time points and interpolated experiment
+            data, and filling it with the data that already arrived
+        """
+
+        self.t_start = self.Exp_data.t_data[0]
+        # The storages are being enlarged when full, the series themselves
+        #   are always only the views of their filled part
+        self._series_buffers = {name: np.empty(1024) for name in self.TIME_SERIES}
+        for name, buffer in self._series_buffers.items():
+            setattr(self, name, buffer[:0])
+        self.max_step_idx = -1
+
+        self._extend_time_grid()
+
+    def _extend_time_grid(self) -> int:
+        """
+        Adding all the time points that are covered by the arrived data,
+            and interpolating the experiment data into them
+        Returns the number of new time points
+        """
+
+        old_length = len(self.t)
+        t_last = self.Exp_data.t_data[-1]
+        # Only the time points not later than the last sample can be used,
+        #   unless no more data will come - then the time points are the same
+        #   as for the finished experiment (see Simulation._prepare_time_grid)
+        if self.Exp_data.closed:
+            new_length = int(np.ceil((t_last + self.dt - self.t_start) / self.dt))
+        else:
+            new_length = int(np.floor((t_last - self.t_start) / self.dt)) + 1
+        if new_length <= old_length:
+            return 0
+
+        for name, buffer in self._series_buffers.items():
+            # Taking over the values that were replaced by a new array
+            #   (e.g. heat flux estimated by the inverse simulation)
+            current_values = getattr(self, name)
+            if not np.shares_memory(current_values, buffer):
+                buffer[:old_length] = current_values[:old_length]
+
+            if new_length > len(buffer):
+                new_buffer = np.empty(max(2*len(buffer), new_length))
+                new_buffer[:old_length] = buffer[:old_length]
+                self._series_buffers[name] = buffer = new_buffer
+
+        buffers = self._series_buffers
+        buffers["t"][old_length:new_length] = self.t_start + np.arange(old_length, new_length)*self.dt
+        new_t = buffers["t"][old_length:new_length]
+        buffers["T_data"][old_length:new_length] = np.interp(new_t, self.Exp_data.t_data, self.Exp_data.T_data)
+        buffers["HeatFlux"][old_length:new_length] = self._get_initial_heat_flux(new_t)
+        buffers["T_amb"][old_length:new_length] = np.interp(new_t, self.Exp_data.t_data, self.Exp_data.T_amb_data)
+
+        for name, buffer in buffers.items():
+            setattr(self, name, buffer[:new_length])
+        self.max_step_idx = new_length - 1
+
+        # Probe data are not existing yet when called from __init__
+        if hasattr(self, "T_x0"):
+            self.T_x0.extend((new_length - old_length)*[0.0])
+
+        return new_length - old_length
+
+    def _get_initial_heat_flux(self, t):
+        """
+        Determining the heat flux in the newly added time points
+
+        Args:
+            t ... new time points
+        """
+
+        return np.interp(t, self.Exp_data.t_data, self.Exp_data.q_data)
+
+    def reset(self) -> None:
+        """
+        Putting the simulation into its initial state, so that it can be
+            run again from the beginning
+        """
+
+        super().reset()
+
+        # Latencies of all the processed samples and the index of the first
+        #   sample that was not processed yet
+        self.latencies: list = []
+        self.latency_sample_idx = 0
+
+    @property
+    def steps_needed_ahead(self) -> int:
+        """
+        How many time points after the current one must be available
+            to evaluate one step
+        """
+
+        return 1
+
+    def evaluate_one_step(self) -> None:
+        """
+        Simulating one step of the simulation, when there are data for it,
+            otherwise waiting for them (but not too long, so that the
+            controller can react on commands from the GUI in the meantime)
+        """
+
+        enough_data = self.current_step_idx + self.steps_needed_ahead <= self.max_step_idx
+        # After the experiment end, simulating also the last steps
+        if self.Exp_data.closed:
+            enough_data = self.current_step_idx < self.max_step_idx
+
+        if not enough_data:
+            self.Exp_data.wait_for_samples(self.wait_timeout)
+            self._extend_time_grid()
+            return
+
+        super().evaluate_one_step()
+        self._record_latencies()
+
+    def _record_latencies(self) -> None:
+        """
+        Determining the latency of all the samples processed by the last step
+        """
+
+        now = time.perf_counter()
+        current_t = self.t[self.current_step_idx]
+        t_data = self.Exp_data.t_data
+        arrival_times = self.Exp_data.arrival_times
+
+        while self.latency_sample_idx < len(t_data) and t_data[self.latency_sample_idx] <= current_t:
+            self.latencies.append(now - arrival_times[self.latency_sample_idx])
+            self.latency_sample_idx += 1
+
+    def latency_statistics(self) -> dict:
+        """
+        Summarizing the per-sample latencies (in milliseconds)
+        """
+
+        return get_duration_statistics(self.latencies)
+
+    def after_simulation_action(self, SimController=None):
+        """
+        Defines what should happen after the simulation is over
+
+        Args:
+            SimController ... whole simulation controller object
+                - containing all the references to GUI
+        """
+
+        super().after_simulation_action(SimController)
+        print("Latency of samples [ms]: {}".format(self.latency_statistics()))
+
+    @property
+    def simulation_has_finished(self) -> bool:
+        """
+        Simulation is finished only when no more data will come
+            and all the data were processed
+        """
+
+        return self.Exp_data.closed and self.current_step_idx >= self.max_step_idx
+
+
+class LiveInverseSimulation(LiveSimulation, InverseSimulation):
+    """
+    Class holding variables and methods of the inverse simulation
+        processing the data of a running experiment
+    Accepts the arguments of both LiveSimulation and InverseSimulation
+    """
+
+    @property
+    def steps_needed_ahead(self) -> int:
+        """
+        Inverse simulation is looking into the future by the window span
+        """
+
+        return self.window_span
+
+    def _get_initial_heat_flux(self, t):
+        """
+        Heat flux is unknown, it is being estimated by the simulation
+
+        Args:
+            t ... new time points
+        """
+
+        return np.zeros(len(t))
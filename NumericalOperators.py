@@ -0,0 +1,737 @@
+"""
+This module is hosting the assembly of the finite element operators
+    (matrices) and a cache, that is sharing them between all the
+    simulation objects in the current process.
+
+When more simulations are having the same discretization and material
+    (which is typical for the parameter sweeps), only the first of them
+    is paying for the assembly and the factorization of the matrices.
+
+The nodes do not have to be distributed uniformly - the Mesh is grading
+    the elements towards the heated side and refining them around
+    the place of interest, where the temperature gradients are the steepest.
+The elements can be linear (P1, tridiagonal matrices) or quadratic
+    (P2, with a node also in the middle of each element, pentadiagonal
+    matrices), which are more accurate for the same number of nodes.
+The object can be also composed of more layers of different materials,
+    each element then having the properties of its layer, with the contact
+    resistances between the layers.
+
+Material with temperature dependent properties is having its own operators
+    (not shared), which are assembled again whenever the properties
+    of the elements change noticeably - the structure of the band matrices
+    is prepared only once, and each assembly is just refilling the values.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+import numpy as np  # type: ignore
+# using so called sparse linear algebra make stuff run way faster (ignoring zeros)
+from scipy.sparse import diags  # type: ignore
+# factorizing the matrix once makes each later solve very cheap
+from scipy.sparse.linalg import factorized  # type: ignore
+# LU decomposition of banded matrices (for the often changing matrices)
+from scipy.linalg.lapack import dgbtrf, dgbtrs  # type: ignore
+
+
+class Mesh:
+    """
+    Class describing how the nodes are distributed along the object
+
+    The size of the elements is inversely proportional to the density
+        of the nodes, which is the product of:
+        - exponential grading - the elements are growing from the heated
+          side (x = 0) towards the other one, the last being "grading"
+          times bigger than the first one
+        - refinement around the place(s) of interest - gaussian bump making
+          the elements there up to "x0_refinement" times smaller
+    When refining, the nearest node is moved exactly to the place of interest.
+
+    Quadratic elements are having one more node in the middle of each element.
+    """
+
+    def __init__(self,
+                 grading: float = 1.0,
+                 x0_refinement: float = 1.0,
+                 refinement_width: float = 0.1,
+                 element_order: int = 1) -> None:
+        """
+        Args:
+            grading ... how many times is the last element bigger than the first one
+            x0_refinement ... how many times smaller are the elements around x0
+            refinement_width ... size of the refined region (relative to the length)
+            element_order ... 1 for linear elements, 2 for quadratic ones
+        """
+
+        if int(element_order) not in ELEMENT_MATRICES:
+            raise ValueError("Unsupported element order: {}".format(element_order))
+
+        self.grading = float(grading)
+        self.x0_refinement = float(x0_refinement)
+        self.refinement_width = float(refinement_width)
+        self.element_order = int(element_order)
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.grading: {self.grading},
+            self.x0_refinement: {self.x0_refinement},
+            self.refinement_width: {self.refinement_width},
+            self.element_order: {self.element_order},
+            """
+
+    @property
+    def is_uniform(self) -> bool:
+        """
+        Whether all the elements are of the same size
+        """
+
+        return self.grading == 1 and self.x0_refinement == 1
+
+    def get_key(self, x0: float) -> tuple:
+        """
+        Identifying the distribution of the nodes (for comparing the meshes
+            and for caching the operators)
+        The place of interest is affecting only the refined meshes
+
+        Args:
+            x0 ... where is the place (or list of places) of our interest
+        """
+
+        if self.x0_refinement == 1:
+            return (self.grading, self.element_order)
+        return (self.grading, self.element_order, self.x0_refinement, self.refinement_width,
+                tuple(np.atleast_1d(x0).astype(float)))
+
+    def create_nodes(self, N: int, length: float, x0: float, layers: Optional[list] = None):
+        """
+        Determining the positions of all the nodes - the edges of the elements,
+            and for the quadratic elements also their middles
+        Where there is a contact resistance between the layers, the node
+            on their interface is doubled (one for each layer), as
+            the temperature is not continuous there
+
+        Args:
+            N ... number of elements in the model
+            length ... how long is the object
+            x0 ... where is the place (or list of places) of our interest
+            layers ... layers of the composite object (homogeneous when not specified)
+        """
+
+        vertices = self.create_vertices(N, length, x0, layers)
+
+        x = np.empty(self.element_order*N + 1)
+        for i in range(self.element_order):
+            x[i:-1:self.element_order] = vertices[:-1] + (vertices[1:] - vertices[:-1])*i/self.element_order
+        x[-1] = vertices[-1]
+
+        if layers:
+            interface_idxs = self.element_order*np.cumsum(self.get_elements_per_layer(N, length, x0, layers))[:-1]
+            resistive = np.array([layer.contact_resistance > 0 for layer in layers[:-1]], dtype=bool)
+            x = np.insert(x, interface_idxs[resistive], x[interface_idxs[resistive]])
+
+        return x
+
+    def get_density(self, s, length: float, x0: float):
+        """
+        Relative density of the nodes in the points s
+
+        Args:
+            s ... where to determine the density
+            length ... how long is the object
+            x0 ... where is the place (or list of places) of our interest
+        """
+
+        density = np.exp(-np.log(self.grading)*s/length)
+        for x0_point in np.atleast_1d(x0):
+            density *= 1 + (self.x0_refinement - 1)*np.exp(-((s - x0_point)/(self.refinement_width*length))**2)
+
+        return density
+
+    def get_elements_per_layer(self, N: int, length: float, x0: float, layers: list):
+        """
+        Dividing the elements between the layers according to the portion
+            of the density of the nodes in them (each having at least one)
+
+        Args:
+            N ... number of elements in the model
+            length ... how long is the object
+            x0 ... where is the place (or list of places) of our interest
+            layers ... layers of the composite object
+        """
+
+        if N < len(layers):
+            raise ValueError("Each of {} layers needs at least one element, got N={}".format(len(layers), N))
+
+        bounds = np.concatenate([[0], np.cumsum([layer.thickness for layer in layers])])
+        s = np.linspace(0, length, max(1000, 50*N))
+        density = self.get_density(s, length, x0)
+        cumulative_density = np.concatenate([[0], np.cumsum((density[1:] + density[:-1])/2*np.diff(s))])
+        wanted = N*np.diff(np.interp(bounds, s, cumulative_density))/cumulative_density[-1]
+
+        # Largest remainder method, keeping at least one element in each layer
+        counts = np.maximum(np.floor(wanted).astype(int), 1)
+        while counts.sum() < N:
+            counts[np.argmax(wanted - counts)] += 1
+        while counts.sum() > N:
+            counts[np.argmin(np.where(counts > 1, wanted - counts, np.inf))] -= 1
+
+        return counts
+
+    def create_vertices(self, N: int, length: float, x0: float, layers: Optional[list] = None):
+        """
+        Determining the positions of the edges of all the elements
+            (there is always an edge on the interface of two layers)
+
+        Args:
+            N ... number of elements in the model
+            length ... how long is the object
+            x0 ... where is the place (or list of places) of our interest
+            layers ... layers of the composite object (homogeneous when not specified)
+        """
+
+        if layers:
+            # Each layer is meshed separately, with its share of the elements
+            bounds = np.concatenate([[0], np.cumsum([layer.thickness for layer in layers])])
+            counts = self.get_elements_per_layer(N, length, x0, layers)
+            x = np.concatenate([self._create_vertices_between(start, end, count, length, x0)[:-1]
+                                for start, end, count in zip(bounds[:-1], bounds[1:], counts)] + [[length]])
+            fixed_idxs = set(np.cumsum(counts)[:-1])
+        else:
+            x = self._create_vertices_between(0.0, length, N, length, x0)
+            fixed_idxs = set()
+
+        # Probe being exactly in the node is not affected by the interpolation
+        #   (the nearest node is moved by at most half of the element,
+        #   so that the nodes stay ordered, the interfaces are not moved)
+        if self.x0_refinement != 1:
+            for x0_point in np.atleast_1d(x0):
+                nearest_idx = int(np.argmin(np.abs(x - x0_point)))
+                if 0 < nearest_idx < N and nearest_idx not in fixed_idxs:
+                    x[nearest_idx] = x0_point
+
+        return x
+
+    def _create_vertices_between(self, start: float, end: float, N: int, length: float, x0: float):
+        """
+        Distributing N elements between the start and the end
+
+        Args:
+            start ... where the first element starts
+            end ... where the last element ends
+            N ... number of elements
+            length ... how long is the whole object
+            x0 ... where is the place (or list of places) of our interest
+        """
+
+        if self.is_uniform:
+            return np.linspace(start, end, N+1)
+
+        # Sampling the density finely and placing the nodes so that
+        #   there is the same portion of its integral in each element
+        s = np.linspace(start, end, max(1000, 50*N))
+        density = self.get_density(s, length, x0)
+        cumulative_density = np.concatenate([[0], np.cumsum((density[1:] + density[:-1])/2*np.diff(s))])
+        x = np.interp(np.linspace(0, 1, N+1), cumulative_density/cumulative_density[-1], s)
+        x[0], x[-1] = start, end
+
+        return x
+
+
+# Matrices of one element of size 1 in its local nodes (from left to right)
+#   - mass matrix is multiplied by the size of the element, stiffness
+#   matrix divided by it
+# https://en.wikipedia.org/wiki/Finite_element_method
+ELEMENT_MATRICES = {
+    1: {
+        "mass": np.array([[2, 1],
+                          [1, 2]]) / 6,
+        "stiffness": np.array([[1, -1],
+                               [-1, 1]]),
+    },
+    2: {
+        "mass": np.array([[4, 2, -1],
+                          [2, 16, 2],
+                          [-1, 2, 4]]) / 30,
+        "stiffness": np.array([[7, -8, 1],
+                               [-8, 16, -8],
+                               [1, -8, 7]]) / 3,
+    },
+}
+
+
+def assemble_band(element_matrix, element_coefficients, element_order: int, first_nodes=None) -> dict:
+    """
+    Adding the matrices of all the elements into the diagonals
+        of the global (banded) matrix, returning them by their offsets
+        (as expected by scipy.sparse.diags)
+
+    Args:
+        element_matrix ... matrix of one element of size 1
+        element_coefficients ... by what to multiply the matrix of each element
+        element_order ... 1 for linear elements, 2 for quadratic ones
+        first_nodes ... global index of the first node of each element
+            (the elements are following each other when not specified)
+    """
+
+    if first_nodes is None:
+        first_nodes = element_order*np.arange(len(element_coefficients))
+    number_of_nodes = first_nodes[-1] + element_order + 1
+    diagonals = {offset: np.zeros(number_of_nodes - abs(offset))
+                 for offset in range(-element_order, element_order+1)}
+
+    for i in range(element_order+1):
+        for j in range(element_order+1):
+            # Value of the row i and the column j lies on the diagonal j-i,
+            #   at the position of the smaller of them
+            diagonals[j-i][first_nodes + min(i, j)] += element_coefficients*element_matrix[i, j]
+
+    return diagonals
+
+
+def get_nodal_volumes(mesh: Mesh, N: int, length: float, x0: float):
+    """
+    Determining the part of the object belonging to each node (row sums
+        of the mass matrix of unit heat capacity - lumped mass matrix)
+
+    Args:
+        mesh ... distribution of the nodes
+        N ... number of elements in the model
+        length ... how long is the object
+        x0 ... where is the place (or list of places) of our interest
+    """
+
+    h = np.diff(mesh.create_vertices(N, length, x0))
+    diagonals = assemble_band(ELEMENT_MATRICES[mesh.element_order]["mass"], h, mesh.element_order)
+
+    volumes = diagonals[0].copy()
+    for offset in range(1, mesh.element_order+1):
+        # Value of the row i and the column i+offset, and symmetric one
+        volumes[:-offset] += diagonals[offset]
+        volumes[offset:] += diagonals[-offset]
+
+    return volumes
+
+
+def get_band_storage(matrix, bandwidth: int):
+    """
+    Converting the banded matrix into the storage of the banded LU decomposition
+        (matrix[i, j] is in the row 2*bandwidth+i-j of the column j, the first
+        bandwidth rows are the space for the decomposition)
+
+    Args:
+        matrix ... sparse banded matrix
+        bandwidth ... how many diagonals are on each side of the main one
+    """
+
+    band_storage = np.zeros((3*bandwidth + 1, matrix.shape[0]))
+    for offset in range(-bandwidth, bandwidth+1):
+        row = 2*bandwidth - offset
+        if offset >= 0:
+            band_storage[row, offset:] = matrix.diagonal(offset)
+        else:
+            band_storage[row, :offset] = matrix.diagonal(offset)
+
+    return band_storage
+
+
+class AssembledOperators:
+    """
+    Class holding all the matrices that are constant during the simulation,
+        together with the factorization of the system matrix A
+    """
+
+    def __init__(self,
+                 N: int,
+                 dt: float,
+                 theta: float,
+                 robin_alpha: float,
+                 length: float,
+                 rho: float,
+                 cp: float,
+                 lmbd: float,
+                 mesh: Optional[Mesh] = None,
+                 x0: float = 0.0,
+                 layers: Optional[list] = None) -> None:
+        """
+        Args:
+            N ... number of elements in the model
+            dt ... fixed time step
+            theta ... defining the explicitness/implicitness of the simulation
+            robin_alpha ... coefficient of heat convection
+            length ... how long is the object
+            rho ... mass density
+            cp ... specific heat capacity
+            lmbd ... heat conductivity
+            mesh ... distribution of the nodes (uniform when not specified)
+            x0 ... where is the place of our interest in the object
+            layers ... layers of the composite object, when it is not
+                homogeneous (rho, cp and lmbd are then not used)
+        """
+
+        mesh = mesh or Mesh()
+        element_order = mesh.element_order
+        # x-positions of all the nodes and sizes of all the elements
+        self.x = mesh.create_nodes(N, length, x0, layers)
+        h = np.diff(mesh.create_vertices(N, length, x0, layers))
+
+        # Material properties of all the elements - for the composite
+        #   object they are taken from the layer each element belongs to
+        # Each contact resistance is doubling the node on the interface,
+        #   so that all the following elements are shifted by one node
+        first_nodes = None
+        heat_capacity = np.full(N, float(rho*cp))
+        conductivity = np.full(N, float(lmbd))
+        if layers:
+            layer_idxs = np.repeat(np.arange(len(layers)), mesh.get_elements_per_layer(N, length, x0, layers))
+            heat_capacity = np.array([layer.rho*layer.cp for layer in layers])[layer_idxs]
+            conductivity = np.array([layer.lmbd for layer in layers])[layer_idxs]
+            resistances = np.array([layer.contact_resistance for layer in layers[:-1]], dtype=float)
+            shifts = np.concatenate([[0], np.cumsum(resistances > 0)])
+            first_nodes = element_order*np.arange(N) + shifts[layer_idxs]
+            last_elements = np.cumsum(np.bincount(layer_idxs, minlength=len(layers)))[:-1] - 1
+            interface_nodes = (first_nodes[last_elements] + element_order)[resistances > 0]
+
+        # Finite element method: matrix assembly using continuous Galerkin
+        #   elements of the 1st (tridiagonal) or 2nd (pentadiagonal) order
+        # The matrices of the individual elements are added into the whole
+        #   arrays of the diagonals, so that no element-wise changes
+        #   of the sparse matrices are needed later (they are very slow,
+        #   as they are changing the sparsity structure)
+        # The edge nodes are belonging only to one element, which also
+        #   takes care of the boundary conditions - Neumann (heat flux)
+        #   on the left and Robin (convection) on the right
+        # Sparse mass matrix (contains information about heat capacity
+        #   of the elements and how their temperatures react to incoming heat)
+        M = assemble_band(ELEMENT_MATRICES[element_order]["mass"], heat_capacity*h,
+                          element_order, first_nodes)
+
+        # Sparse stiffness matrix (contains information about heat
+        #   conductivity and how the elements affect each other)
+        K = assemble_band(ELEMENT_MATRICES[element_order]["stiffness"], conductivity/h,
+                          element_order, first_nodes)
+        if layers:
+            # The two nodes of each resistive interface are exchanging heat
+            #   proportionally to their difference in temperatures
+            #   - element matrix 1/R*[[1, -1], [-1, 1]]
+            conductances = 1/resistances[resistances > 0]
+            K[0][interface_nodes] += conductances
+            K[0][interface_nodes + 1] += conductances
+            K[1][interface_nodes] -= conductances
+            K[-1][interface_nodes] -= conductances
+
+        # Matrix A contains the implicit portion of T_body contribution
+        #   (Robin BC Nth node)
+        A = {offset: M[offset] + dt*theta*K[offset] for offset in M}
+        A[0][-1] += dt*theta*robin_alpha
+
+        # Matrix b to calculate boundary vector b
+        b_base = {offset: M[offset] - dt*(1-theta)*K[offset] for offset in M}
+
+        # https://docs.scipy.org/doc/scipy/reference/generated/scipy.sparse.diags.html
+        offsets = list(M)
+        self.M = diags([M[offset] for offset in offsets], offsets, format="csr")
+        self.K = diags([K[offset] for offset in offsets], offsets, format="csr")
+        self.A = diags([A[offset] for offset in offsets], offsets, format="csr")
+        self.b_base = diags([b_base[offset] for offset in offsets], offsets, format="csr")
+
+        # Function solving the equation A*x=b using the prepared LU decomposition
+        self.solve_A = factorized(self.A.tocsc())
+
+
+class TemperatureDependentOperators:
+    """
+    Class holding the matrices of the material with temperature dependent
+        properties - they are having the same band structure all the time,
+        only their values are changing
+
+    The positions of the band values in the sparse matrices are determined
+        once, so the assembly is only refilling the data of the matrices.
+    Matrix A is decomposed by the banded LU decomposition, which is
+        cheap enough to be repeated whenever the properties change.
+    """
+
+    def __init__(self,
+                 N: int,
+                 dt: float,
+                 theta: float,
+                 robin_alpha: float,
+                 length: float,
+                 material,
+                 mesh: Optional[Mesh] = None,
+                 x0: float = 0.0,
+                 property_tolerance: float = 1e-3) -> None:
+        """
+        Args:
+            N ... number of elements in the model
+            dt ... fixed time step
+            theta ... defining the explicitness/implicitness of the simulation
+            robin_alpha ... coefficient of heat convection
+            length ... how long is the object
+            material ... material with temperature dependent properties
+            mesh ... distribution of the nodes (uniform when not specified)
+            x0 ... where is the place of our interest in the object
+            property_tolerance ... by how much (relatively) the properties
+                of some element must change to assemble the matrices again
+        """
+
+        mesh = mesh or Mesh()
+        self.element_order = mesh.element_order
+        self.dt = dt
+        self.theta = theta
+        self.robin_alpha = robin_alpha
+        self.material = material
+        self.property_tolerance = property_tolerance
+        # x-positions of all the nodes and sizes of all the elements
+        self.x = mesh.create_nodes(N, length, x0)
+        self.h = np.diff(mesh.create_vertices(N, length, x0))
+        # Global index of the first node of each element
+        self.first_nodes = self.element_order*np.arange(N)
+
+        # Sparse matrices whose data are the indexes into all the band
+        #   diagonals (put one after another) - telling from where
+        #   each of their values should be taken
+        number_of_nodes = len(self.x)
+        self.offsets = list(range(-self.element_order, self.element_order+1))
+        sizes = [number_of_nodes - abs(offset) for offset in self.offsets]
+        starts = np.concatenate([[0], np.cumsum(sizes)])
+        # (shifted by one, not to have any zeros, which would be left out)
+        positions = diags([np.arange(start, start + size) + 1.0 for start, size in zip(starts, sizes)],
+                          self.offsets, format="csr")
+        self._data_order = positions.data.astype(int) - 1
+        self.M = positions.copy()
+        self.K = positions.copy()
+        self.A = positions.copy()
+        self.b_base = positions.copy()
+
+        # Storage of matrix A for the banded LU decomposition (A[i, j]
+        #   is in the row 2*order+i-j of the column j)
+        self._band_storage = np.zeros((3*self.element_order + 1, number_of_nodes))
+        self._lu = None
+        self._pivots = None
+
+        # Properties ([cp, lmbd]) of all the elements the matrices are assembled with,
+        #   and the temperatures they were determined from
+        self.element_properties = None
+        self._assembly_T = None
+        # How many times were the matrices assembled
+        self.assembly_count = 0
+        # Changing whenever the matrices change (assembled or restored),
+        #   to know when the things derived from them are outdated
+        self.revision = 0
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.element_order: {self.element_order},
+            self.property_tolerance: {self.property_tolerance},
+            self.assembly_count: {self.assembly_count},
+            """
+
+    def update(self, T) -> bool:
+        """
+        Assembling the matrices with the properties of the elements
+            in the given temperatures, but only when they differ from
+            the current ones by more than the tolerance
+        Returns whether the matrices were assembled
+
+        Args:
+            T ... temperatures in all the nodes
+        """
+
+        # Temperatures close to the ones of the last assembly cannot change
+        #   the properties noticeably, so not even looking them up
+        if self.element_properties is not None and \
+                np.max(np.abs(T - self._assembly_T))*self.material.max_relative_slope <= self.property_tolerance:
+            return False
+
+        # Average temperature of each element
+        element_T = T[self.first_nodes]
+        for i in range(1, self.element_order+1):
+            element_T = element_T + T[self.first_nodes + i]
+        properties = self.material.get_properties(element_T / (self.element_order + 1))
+
+        if self.element_properties is not None:
+            relative_change = np.max(np.abs(properties - self.element_properties) / self.element_properties)
+            if relative_change <= self.property_tolerance:
+                return False
+
+        self.element_properties = properties
+        self._assembly_T = T.copy()
+        self.assembly_count += 1
+        self.revision += 1
+
+        M = assemble_band(ELEMENT_MATRICES[self.element_order]["mass"],
+                          self.material.rho*properties[:, 0]*self.h, self.element_order)
+        K = assemble_band(ELEMENT_MATRICES[self.element_order]["stiffness"],
+                          properties[:, 1]/self.h, self.element_order)
+        A = {offset: M[offset] + self.dt*self.theta*K[offset] for offset in M}
+        A[0][-1] += self.dt*self.theta*self.robin_alpha
+        b_base = {offset: M[offset] - self.dt*(1-self.theta)*K[offset] for offset in M}
+
+        # New data arrays (not refilling the old ones), so that the saved
+        #   states are not changed (see get_state())
+        for matrix, diagonals in [(self.M, M), (self.K, K), (self.A, A), (self.b_base, b_base)]:
+            matrix.data = np.concatenate([diagonals[offset] for offset in self.offsets])[self._data_order]
+
+        for offset in self.offsets:
+            row = 2*self.element_order - offset
+            if offset >= 0:
+                self._band_storage[row, offset:] = A[offset]
+            else:
+                self._band_storage[row, :offset] = A[offset]
+        self._lu, self._pivots, _ = dgbtrf(self._band_storage, self.element_order, self.element_order)
+
+        return True
+
+    def get_state(self) -> tuple:
+        """
+        Saving the current properties, matrices and decomposition, to be able
+            to return to them (when the simulation returns to its checkpoint)
+        Nothing is copied, as all of them are replaced (not changed) by update()
+        """
+
+        return (self.element_properties, self._assembly_T, self._lu, self._pivots,
+                [matrix.data for matrix in [self.M, self.K, self.A, self.b_base]])
+
+    def set_state(self, state: tuple) -> None:
+        """
+        Returning to the previously saved properties, matrices and decomposition
+
+        Args:
+            state ... what get_state() returned
+        """
+
+        self.element_properties, self._assembly_T, self._lu, self._pivots, data = state
+        for matrix, matrix_data in zip([self.M, self.K, self.A, self.b_base], data):
+            matrix.data = matrix_data
+        self.revision += 1
+
+    def solve_A(self, b):
+        """
+        Solving the equation A*x=b using the current LU decomposition
+
+        Args:
+            b ... right hand side of the equation
+        """
+
+        return dgbtrs(self._lu, self.element_order, self.element_order, b, self._pivots)[0]
+
+
+class OperatorCache:
+    """
+    Class storing the recently used operators, with the least recently
+        used ones being forgotten when the cache is full
+    Is counting the hits and misses, to see how effective it is
+    """
+
+    def __init__(self, max_size: int = 32) -> None:
+        """
+        Args:
+            max_size ... how many different operators to remember
+        """
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._operators: OrderedDict = OrderedDict()
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.max_size: {self.max_size},
+            self.hits: {self.hits},
+            self.misses: {self.misses},
+            current size: {len(self._operators)},
+            """
+
+    def get(self,
+            N: int,
+            dt: float,
+            theta: float,
+            robin_alpha: float,
+            length: float,
+            rho: float,
+            cp: float,
+            lmbd: float,
+            mesh: Optional[Mesh] = None,
+            x0: float = 0.0,
+            layers: Optional[list] = None) -> AssembledOperators:
+        """
+        Returning the operators for the specified parameters, assembling
+            them only when they are not already in the cache
+
+        Args:
+            N ... number of elements in the model
+            dt ... fixed time step
+            theta ... defining the explicitness/implicitness of the simulation
+            robin_alpha ... coefficient of heat convection
+            length ... how long is the object
+            rho ... mass density
+            cp ... specific heat capacity
+            lmbd ... heat conductivity
+            mesh ... distribution of the nodes (uniform when not specified)
+            x0 ... where is the place of our interest in the object
+            layers ... layers of the composite object (homogeneous when not specified)
+        """
+
+        mesh = mesh or Mesh()
+        key = (int(N), float(dt), float(theta), float(robin_alpha),
+               float(length), float(rho), float(cp), float(lmbd), mesh.get_key(x0),
+               tuple(layer.get_key() for layer in layers or []))
+
+        if key in self._operators:
+            self.hits += 1
+            self._operators.move_to_end(key)
+            return self._operators[key]
+
+        self.misses += 1
+        operators = AssembledOperators(N=N, dt=dt, theta=theta,
+                                       robin_alpha=robin_alpha, length=length,
+                                       rho=rho, cp=cp, lmbd=lmbd, mesh=mesh, x0=x0,
+                                       layers=layers)
+        self._operators[key] = operators
+        if len(self._operators) > self.max_size:
+            self._operators.popitem(last=False)
+
+        return operators
+
+    def info(self) -> dict:
+        """
+        Returning the statistics of the cache usage
+        """
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._operators),
+            "max_size": self.max_size,
+        }
+
+    def clear(self) -> None:
+        """
+        Forgetting all the stored operators and resetting the statistics
+        """
+
+        self._operators.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# Process-wide cache shared by all the simulations
+operator_cache = OperatorCache()
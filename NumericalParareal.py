@@ -0,0 +1,271 @@
+"""
+This module is hosting the time-parallel (Parareal) forward simulation
+
+The time is divided into slices, one for each processor core. The states
+    at the starts of the slices are first predicted by a cheap coarse
+    propagator (fully implicit scheme with large time step), after which
+    all the slices are simulated in parallel with the accurate (fine)
+    propagator - the same one as in Simulation.evaluate_one_step().
+The predictions are corrected by the difference between the fine and
+    coarse propagators, and the parallel simulation is repeated until the
+    states at the starts of the slices are not changing anymore.
+
+After k iterations the first k slices are always exact, however usually
+    only a few iterations are needed, as the heat conduction is forgetting
+    the errors of the initial state very quickly.
+https://en.wikipedia.org/wiki/Parareal
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import numpy as np  # type: ignore
+from NumericalForward import Simulation
+from NumericalOperators import operator_cache, Mesh
+
+
+def propagate_fine(task: dict) -> tuple:
+    """
+    Simulating one time slice with the fine time step, returning
+        the final temperatures and the temperatures at the place of interest
+    Is a module-level function, so that it can be run in other processes
+
+    Args:
+        task ... all the information needed for the slice simulation
+            - operator_parameters ... arguments of operator_cache.get()
+            - T_x0_interpolator ... how to get the temperature at x0
+            - T ... temperatures at the start of the slice
+            - HeatFlux ... heat flux in all the time points of the slice
+            - T_amb ... ambient temperature in all the time points of the slice
+    """
+
+    # Operators are cached in each worker process, so they are assembled
+    #   only at the first slice simulated by this process
+    parameters = task["operator_parameters"]
+    operators = operator_cache.get(**parameters)
+    dt = parameters["dt"]
+    theta = parameters["theta"]
+    robin_alpha = parameters["robin_alpha"]
+    HeatFlux = task["HeatFlux"]
+    T_amb = task["T_amb"]
+
+    T = task["T"]
+    T_x0 = np.empty(len(HeatFlux) - 1)
+    for i in range(len(HeatFlux) - 1):
+        # The same as in Simulation.evaluate_one_step()
+        b = operators.b_base.dot(T)
+        b[0] += dt*(1-theta)*HeatFlux[i]
+        b[0] += dt*theta*HeatFlux[i+1]
+        b[-1] -= dt*(1-theta)*robin_alpha*T[-1]
+        b[-1] += dt*(1-theta)*robin_alpha*T_amb[i]
+        b[-1] += dt*theta*robin_alpha*T_amb[i+1]
+        T = operators.solve_A(b)
+        T_x0[i] = task["T_x0_interpolator"](T)
+
+    return T, T_x0
+
+
+class PararealSimulation(Simulation):
+    """
+    Class holding variables and methods of the forward simulation
+        that is being run in parallel in more processes
+    Inherits all the internal properties from the Simulation class
+
+    One call of evaluate_one_step() is one whole Parareal iteration,
+        after which the current step index is at the end of the slices
+        that are already known to be exact
+    """
+
+    # The coarse and fine propagators are sharing the constant matrices
+    ONLY_LINEAR_MODEL = True
+
+    def __init__(self,
+                 N: int,
+                 dt: float,
+                 theta: float,
+                 robin_alpha: float,
+                 x0: float,
+                 length: float,
+                 material,
+                 experiment_data_path: str = "DATA.csv",
+                 mesh: Optional[Mesh] = None,
+                 layers: Optional[list] = None,
+                 emissivity: float = 0.0,
+                 time_slices: Optional[int] = None,
+                 coarse_steps_per_slice: int = 10,
+                 tolerance: float = 1e-6,
+                 executor=None) -> None:
+        """
+        Args:
+            N ... number of elements in the model
+            dt ... fixed time step
+            theta ... defining the explicitness/implicitness of the simulation
+            robin_alpha ... coefficient of heat convection
+            x0 ... where is the place of our interest in the object
+            length ... how long is the object
+            material ... object containing material properties
+            experiment_data_path ... from where the data should be taken
+            mesh ... distribution of the nodes (uniform when not specified)
+            layers ... layers of the composite object (homogeneous when not specified)
+            emissivity ... emissivity of the far side (radiation is not supported)
+            time_slices ... into how many slices divide the time
+                            (number of processor cores when not specified)
+            coarse_steps_per_slice ... how many steps makes the coarse
+                                       propagator in one slice
+            tolerance ... maximal change of temperatures at the starts
+                          of the slices, when the iterations can stop
+            executor ... where to run the slices (concurrent.futures executor)
+                - new process pool is created when not specified
+        """
+
+        self.time_slices = time_slices or os.cpu_count() or 1
+        self.coarse_steps_per_slice = coarse_steps_per_slice
+        self.tolerance = tolerance
+        self.executor = executor
+        # Only the process pool created here is also stopped here
+        self._owns_executor = False
+
+        super().__init__(N=N,
+                         dt=dt,
+                         theta=theta,
+                         robin_alpha=robin_alpha,
+                         x0=x0,
+                         length=length,
+                         material=material,
+                         experiment_data_path=experiment_data_path,
+                         mesh=mesh,
+                         layers=layers,
+                         emissivity=emissivity)
+
+    def reset(self) -> None:
+        """
+        Putting the simulation into its initial state, so that it can be
+            run again from the beginning
+        """
+
+        super().reset()
+
+        # Time indexes of the starts of the slices (and the end of the last one)
+        number_of_slices = max(1, min(self.time_slices, self.max_step_idx))
+        self.slice_bounds = np.linspace(0, self.max_step_idx, number_of_slices+1).astype(int)
+        self.number_of_iterations = 0
+
+        # Predicting the states at the starts of the slices by the coarse
+        #   propagator, remembering its results for the later corrections
+        self.slice_states = [self.T.copy()]
+        self.coarse_results = []
+        for slice_idx in range(number_of_slices):
+            self.coarse_results.append(self._propagate_coarse(slice_idx, self.slice_states[-1]))
+            self.slice_states.append(self.coarse_results[-1])
+        # Number of slices at the beginning whose start states are exact
+        self.exact_slices = 1
+
+    def _propagate_coarse(self, slice_idx: int, T):
+        """
+        Simulating one time slice with the coarse (fully implicit) scheme,
+            returning the temperatures at its end
+
+        Args:
+            slice_idx ... which slice to simulate
+            T ... temperatures at the start of the slice
+        """
+
+        start_idx = self.slice_bounds[slice_idx]
+        end_idx = self.slice_bounds[slice_idx+1]
+        steps = max(1, min(self.coarse_steps_per_slice, end_idx - start_idx))
+        coarse_dt = (end_idx - start_idx)*self.dt/steps
+        # Experiment data in the coarse time points
+        coarse_idx = np.linspace(start_idx, end_idx, steps+1)
+        fine_idx = np.arange(start_idx, end_idx+1)
+        HeatFlux = np.interp(coarse_idx, fine_idx, self.HeatFlux[start_idx:end_idx+1])
+        T_amb = np.interp(coarse_idx, fine_idx, self.T_amb[start_idx:end_idx+1])
+
+        operators = operator_cache.get(**{**self._get_operator_parameters(),
+                                          "dt": coarse_dt, "theta": 1.0})
+        for i in range(steps):
+            b = operators.b_base.dot(T)
+            b[0] += coarse_dt*HeatFlux[i+1]
+            b[-1] += coarse_dt*self.robin_alpha*T_amb[i+1]
+            T = operators.solve_A(b)
+
+        return T
+
+    def _get_fine_task(self, slice_idx: int) -> dict:
+        """
+        Preparing everything needed for the fine simulation of the slice
+
+        Args:
+            slice_idx ... which slice to simulate
+        """
+
+        start_idx = self.slice_bounds[slice_idx]
+        end_idx = self.slice_bounds[slice_idx+1]
+
+        return {
+            "operator_parameters": self._get_operator_parameters(),
+            "T_x0_interpolator": self.T_x0_interpolator,
+            "T": self.slice_states[slice_idx],
+            "HeatFlux": np.asarray(self.HeatFlux[start_idx:end_idx+1]),
+            "T_amb": np.asarray(self.T_amb[start_idx:end_idx+1]),
+        }
+
+    def evaluate_one_step(self) -> None:
+        """
+        Making one Parareal iteration - simulating all the slices that
+            are not exact yet in parallel, and correcting their start states
+        """
+
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.time_slices)
+            self._owns_executor = True
+
+        number_of_slices = len(self.slice_bounds) - 1
+        first_slice = self.exact_slices - 1
+        tasks = [self._get_fine_task(slice_idx)
+                 for slice_idx in range(first_slice, number_of_slices)]
+        fine_results = list(self.executor.map(propagate_fine, tasks))
+        self.number_of_iterations += 1
+
+        # Storing the fine results, which are correct at least for the first slice
+        for slice_idx, (_, T_x0) in enumerate(fine_results, start=first_slice):
+            start_idx = self.slice_bounds[slice_idx]
+            end_idx = self.slice_bounds[slice_idx+1]
+            self.T_x0[start_idx+1:end_idx+1] = T_x0
+
+        # Correcting the start states: new coarse + (old fine - old coarse)
+        max_change = 0.0
+        for slice_idx, (T_fine, _) in enumerate(fine_results, start=first_slice):
+            new_coarse = self._propagate_coarse(slice_idx, self.slice_states[slice_idx])
+            new_state = new_coarse + T_fine - self.coarse_results[slice_idx]
+            max_change = max(max_change, np.max(np.abs(new_state - self.slice_states[slice_idx+1])))
+            self.coarse_results[slice_idx] = new_coarse
+            self.slice_states[slice_idx+1] = new_state
+
+        # First slice of this iteration was simulated from the exact state
+        self.exact_slices += 1
+        if max_change < self.tolerance:
+            self.exact_slices = number_of_slices + 1
+        self.exact_slices = min(self.exact_slices, number_of_slices + 1)
+
+        self.current_step_idx = self.slice_bounds[self.exact_slices - 1]
+        self.current_t = self.dt * self.current_step_idx
+        self.T = self.slice_states[self.exact_slices - 1]
+
+    def after_simulation_action(self, SimController=None):
+        """
+        Defines what should happen after the simulation is over
+
+        Args:
+            SimController ... whole simulation controller object
+                - containing all the references to GUI
+        """
+
+        super().after_simulation_action(SimController)
+        print("Parareal iterations: {} (time slices: {})".format(
+            self.number_of_iterations, len(self.slice_bounds) - 1))
+
+        # Not keeping the worker processes alive after the simulation
+        if self._owns_executor:
+            self.executor.shutdown()
+            self.executor = None
+            self._owns_executor = False
@@ -0,0 +1,318 @@
+"""
+This module is hosting the forward simulation for very long experiments
+
+Instead of having all the time points, interpolated experiment data
+    and results in memory, the time grid is computed on demand,
+    experiment data are memory-mapped and interpolated chunk by chunk,
+    and the probe temperatures are written into a memory-mapped file.
+Therefore the memory used does not depend on the experiment duration.
+"""
+
+import os
+import tempfile
+from typing import Optional
+import numpy as np  # type: ignore
+from NumericalForward import Simulation
+from NumericalOperators import Mesh
+from experiment_data_handler import ExperimentalData
+
+
+class LazyTimeGrid:
+    """
+    Class behaving like the array of simulation time points, without
+        storing them - each one is computed when it is needed
+    """
+
+    def __init__(self, start: float, dt: float, length: int) -> None:
+        """
+        Args:
+            start ... first time point
+            dt ... fixed time step
+            length ... number of time points
+        """
+
+        self.start = start
+        self.dt = dt
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        """
+        Returning one time point, or an array of them when sliced
+
+        Args:
+            index ... integer index or slice
+        """
+
+        if isinstance(index, slice):
+            return self.start + np.arange(*index.indices(self.length))*self.dt
+
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("time grid index out of range")
+
+        return self.start + index*self.dt
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[:], dtype=dtype)
+
+
+class LazyInterpolatedSeries:
+    """
+    Class behaving like the array of experiment data interpolated into
+        the simulation time points, interpolating only one chunk at a time
+    """
+
+    def __init__(self,
+                 time_grid: LazyTimeGrid,
+                 t_data,
+                 y_data,
+                 chunk_size: int) -> None:
+        """
+        Args:
+            time_grid ... simulation time points
+            t_data ... experiment time points (can be memory-mapped)
+            y_data ... experiment values (can be memory-mapped)
+            chunk_size ... how many time points to interpolate at once
+        """
+
+        self.time_grid = time_grid
+        self.t_data = t_data
+        self.y_data = y_data
+        self.chunk_size = chunk_size
+
+        # Range of indexes whose values are currently interpolated
+        self.chunk_start = 0
+        self.chunk_stop = 0
+        self.chunk_values = np.empty(0)
+
+    def __len__(self) -> int:
+        return len(self.time_grid)
+
+    def __getitem__(self, index):
+        """
+        Returning one interpolated value, or an array of them when sliced
+
+        Args:
+            index ... integer index or slice
+        """
+
+        if isinstance(index, slice):
+            return self._interpolate(self.time_grid[index])
+
+        if index < 0:
+            index += len(self)
+        if not self.chunk_start <= index < self.chunk_stop:
+            self._load_chunk(index)
+
+        return self.chunk_values[index - self.chunk_start]
+
+    def _load_chunk(self, start: int) -> None:
+        """
+        Interpolating the values of the chunk starting at given index
+        The chunk is one value longer, so that the simulation step
+            can access both its start and end in the same chunk
+
+        Args:
+            start ... first index of the chunk
+        """
+
+        self.chunk_start = start
+        self.chunk_stop = min(start + self.chunk_size + 1, len(self))
+        self.chunk_values = self._interpolate(self.time_grid[self.chunk_start:self.chunk_stop])
+
+    def _interpolate(self, t):
+        """
+        Interpolating the experiment data into given time points, while
+            touching only the part of experiment data around them
+
+        Args:
+            t ... sorted time points
+        """
+
+        if len(t) == 0:
+            return np.empty(0)
+
+        # Taking one more experiment point on both sides, so that the result
+        #   is the same as when interpolating from all the data
+        low = max(np.searchsorted(self.t_data, t[0], side="right") - 1, 0)
+        high = min(np.searchsorted(self.t_data, t[-1], side="left") + 1, len(self.t_data))
+
+        return np.interp(t, self.t_data[low:high], self.y_data[low:high])
+
+
+class StreamingSimulation(Simulation):
+    """
+    Class holding variables and methods of the forward simulation with
+        memory usage independent of the experiment duration
+    Inherits all the internal properties from the Simulation class
+
+    NOTE: only the forward (classic) simulation is supported, the inverse
+        one is going back and forth in time, which is not suitable
+        for processing in chunks
+    """
+
+    def __init__(self,
+                 N: int,
+                 dt: float,
+                 theta: float,
+                 robin_alpha: float,
+                 x0: float,
+                 length: float,
+                 material,
+                 experiment_data_path: str = "DATA.csv",
+                 mesh: Optional[Mesh] = None,
+                 layers: Optional[list] = None,
+                 emissivity: float = 0.0,
+                 chunk_size: int = 100000,
+                 result_file_path: Optional[str] = None,
+                 keep_result_file: Optional[bool] = None) -> None:
+        """
+        Args:
+            N ... number of elements in the model
+            dt ... fixed time step
+            theta ... defining the explicitness/implicitness of the simulation
+            robin_alpha ... coefficient of heat convection
+            x0 ... where is the place of our interest in the object
+            length ... how long is the object
+            material ... object containing material properties
+            experiment_data_path ... from where the data should be taken
+            mesh ... distribution of the nodes (uniform when not specified)
+            layers ... layers of the composite object (homogeneous when not specified)
+            emissivity ... emissivity of the far side radiating into the ambient
+            chunk_size ... how many time points to process at once
+            result_file_path ... where to store the probe temperatures
+                - unique file in the temporary directory is used when not specified
+            keep_result_file ... whether the file should stay after close()
+                (by default only the specified file stays, the temporary one not)
+        """
+
+        self.chunk_size = int(chunk_size)
+        if result_file_path is None:
+            file_descriptor, result_file_path = tempfile.mkstemp(prefix="Streaming-", suffix=".npy")
+            os.close(file_descriptor)
+            if keep_result_file is None:
+                keep_result_file = False
+        self.result_file_path = result_file_path
+        self.keep_result_file = True if keep_result_file is None else keep_result_file
+
+        super().__init__(N=N,
+                         dt=dt,
+                         theta=theta,
+                         robin_alpha=robin_alpha,
+                         x0=x0,
+                         length=length,
+                         material=material,
+                         experiment_data_path=experiment_data_path,
+                         mesh=mesh,
+                         layers=layers,
+                         emissivity=emissivity)
+
+    def _prepare_experiment_data(self) -> None:
+        """
+        Reading the experiment data from the file, memory-mapping them
+            (when the binary sidecar cannot be created, they are in memory)
+        """
+
+        self.Exp_data = ExperimentalData(self.experiment_data_path)
+
+    def _prepare_time_grid(self) -> None:
+        """
+        Determining the simulation time points and interpolating
+            the experiment data into them - both lazily, only when needed
+        """
+
+        t_start = self.Exp_data.t_data[0]
+        t_stop = self.Exp_data.t_data[-1] + self.dt
+        # Having the same number of time points as np.arange would have
+        number_of_time_points = int(np.ceil((t_stop - t_start) / self.dt))
+
+        t = LazyTimeGrid(start=t_start, dt=self.dt, length=number_of_time_points)
+        # Lazy grid and series are standing in for the arrays of the parent
+        self.t = t  # type: ignore
+        self.max_step_idx = len(t) - 1
+        self.T_data = LazyInterpolatedSeries(t, self.Exp_data.t_data,  # type: ignore
+                                             self.Exp_data.T_data, self.chunk_size)
+        self.HeatFlux = LazyInterpolatedSeries(t, self.Exp_data.t_data,  # type: ignore
+                                               self.Exp_data.q_data, self.chunk_size)
+        self.T_amb = LazyInterpolatedSeries(t, self.Exp_data.t_data,  # type: ignore
+                                            self.Exp_data.T_amb_data, self.chunk_size)
+
+    def _allocate_probe_data(self):
+        """
+        Preparing the storage for temperatures at the place of interest
+            in all the time points - in a memory-mapped file
+        https://numpy.org/doc/stable/reference/generated/numpy.lib.format.open_memmap.html
+        """
+
+        return np.lib.format.open_memmap(self.result_file_path, mode="w+",
+                                         dtype=np.float64, shape=(len(self.t),))
+
+    def evaluate_one_step(self) -> None:
+        """
+        Simulating one step of the simulation, and writing the finished
+            chunk of results to the disk
+        """
+
+        super().evaluate_one_step()
+
+        if self.current_step_idx % self.chunk_size == 0 or self.simulation_has_finished:
+            self.T_x0.flush()
+
+    def close(self) -> None:
+        """
+        Releasing the file with the probe temperatures, and deleting it
+            unless it should be kept - the results are not available
+            in the simulation anymore
+        """
+
+        if self.T_x0 is not None:
+            self.T_x0.flush()
+            # The memory map is closed when there is no reference to it
+            self.T_x0 = None
+        if not self.keep_result_file and os.path.exists(self.result_file_path):
+            os.remove(self.result_file_path)
+
+    def plot(self, temperature_plot, heat_flux_plot):
+        """
+        Defining the way simulation data should be plotted
+        Only limited number of points is shown, not to load everything
+            into the memory
+
+        Args:
+            temperature_plot ... reference to temperature plot
+            heat_flux_plot ... reference to heat flux plot
+        """
+
+        max_points = 10000
+        step = max(1, self.current_step_idx // max_points)
+        experiment_step = max(1, len(self.Exp_data.t_data) // max_points)
+
+        temperature_plot.plot(x_values=self.t[:self.current_step_idx:step],
+                              y_values=self.T_x0[:self.current_step_idx:step],
+                              x_experiment_values=self.Exp_data.t_data[::experiment_step],
+                              y_experiment_values=self.Exp_data.T_data[::experiment_step])
+
+        if not self.heat_flux_already_plotted:
+            heat_flux_plot.plot(x_values=None,
+                                y_values=None,
+                                x_experiment_values=self.Exp_data.t_data[::experiment_step],
+                                y_experiment_values=self.Exp_data.q_data[::experiment_step])
+            self.heat_flux_already_plotted = True
+
+    def _calculate_final_error(self) -> float:
+        """
+        Determining error value for this simulation at its end,
+            going through the results chunk by chunk
+        """
+
+        error_sum = 0.0
+        for start in range(0, len(self.t), self.chunk_size):
+            stop = min(start + self.chunk_size, len(self.t))
+            error_sum += np.sum(abs(self.T_x0[start:stop] - self.T_data[start:stop]))
+
+        error = error_sum/(len(self.t) - 1)
+        return round(error, 3)
@@ -1,4 +1,10 @@
 import csv
+import os
+import json
+import hashlib
+import itertools
+from collections import OrderedDict
+import numpy as np  # type: ignore
 
 
 class ExperimentDataCannotBeParsedError(Exception):
@@ -31,54 +37,525 @@ class Material:
     Class responsible for initializing and storing material data
     """
 
+    # The properties are constant, and the material is not melting
+    is_temperature_dependent = False
+    is_phase_change = False
+
     def __init__(self, rho, cp, lmbd):
         self.rho = rho  # Mass density
         self.cp = cp  # Specific heat capacity
         self.lmbd = lmbd  # Heat conductivity
 
 
+class TemperatureDependentMaterial(Material):
+    """
+    Class storing material whose heat capacity and conductivity are
+        changing with the temperature, given by the table of their values
+        (linearly interpolated, and constant outside of the table)
+
+    The table is resampled with the uniform temperature step, so that
+        the lookup is only computing the index, not searching for it,
+        and can be done for all the elements at once
+    The cp and lmbd attributes are holding the values at the reference
+        temperature (for everything that needs constant properties)
+    """
+
+    is_temperature_dependent = True
+
+    # How many points the resampled table has
+    TABLE_SIZE = 4096
+
+    def __init__(self, rho, temperatures, cp_values, lmbd_values, reference_temperature=20.0):
+        """
+        Args:
+            rho ... mass density (not changing)
+            temperatures ... temperatures of the table (increasing)
+            cp_values ... specific heat capacity in these temperatures
+            lmbd_values ... heat conductivity in these temperatures
+            reference_temperature ... where to take the constant properties
+        """
+
+        self.temperatures = np.asarray(temperatures, dtype=float)
+        self.cp_values = np.asarray(cp_values, dtype=float)
+        self.lmbd_values = np.asarray(lmbd_values, dtype=float)
+        if len(self.temperatures) < 2 or np.any(np.diff(self.temperatures) <= 0):
+            raise ValueError("Temperatures of the table must be increasing (at least two of them)")
+
+        # Uniform table with both properties in one array (one lookup for both)
+        self.table_start = self.temperatures[0]
+        self.table_step = (self.temperatures[-1] - self.temperatures[0]) / (self.TABLE_SIZE - 1)
+        table_temperatures = np.linspace(self.temperatures[0], self.temperatures[-1], self.TABLE_SIZE)
+        self.table = np.column_stack([np.interp(table_temperatures, self.temperatures, self.cp_values),
+                                      np.interp(table_temperatures, self.temperatures, self.lmbd_values)])
+        # Differences to the next point, for the linear interpolation
+        self.table_slopes = np.diff(self.table, axis=0)
+        # Largest relative change of the properties per one degree
+        #   (how much the temperature can change without noticeably
+        #   changing the properties)
+        self.max_relative_slope = max(
+            np.max(np.abs(np.diff(values)/np.diff(self.temperatures))) / np.min(values)
+            for values in [self.cp_values, self.lmbd_values])
+
+        cp, lmbd = self.get_properties(np.array([reference_temperature]))[0]
+        super().__init__(rho, cp, lmbd)
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.rho: {self.rho},
+            self.temperatures: {self.temperatures},
+            self.cp_values: {self.cp_values},
+            self.lmbd_values: {self.lmbd_values},
+            """
+
+    def get_properties(self, T):
+        """
+        Returning the array of [cp, lmbd] for all the temperatures
+
+        Args:
+            T ... array of temperatures
+        """
+
+        position = np.clip((T - self.table_start) / self.table_step, 0, self.TABLE_SIZE - 1)
+        idx = np.minimum(position.astype(int), self.TABLE_SIZE - 2)
+        fraction = (position - idx)[:, np.newaxis]
+
+        return self.table[idx] + self.table_slopes[idx]*fraction
+
+    def get_key(self) -> tuple:
+        """
+        Identifying the material by all its properties (for comparing
+            the materials)
+        """
+
+        return (float(self.rho), tuple(self.temperatures), tuple(self.cp_values), tuple(self.lmbd_values))
+
+
+class PhaseChangeMaterial(Material):
+    """
+    Class storing material that is melting (and solidifying), absorbing
+        (and releasing) the latent heat
+    The latent heat is spread uniformly over the small range of temperatures
+        around the melting temperature (mushy zone), as the enthalpy
+        must be a function of the temperature
+    """
+
+    is_phase_change = True
+
+    def __init__(self, rho, cp, lmbd, melting_temperature, latent_heat, melting_range=1.0):
+        """
+        Args:
+            rho ... mass density
+            cp ... specific heat capacity
+            lmbd ... heat conductivity
+            melting_temperature ... temperature of melting (in the middle of the range)
+            latent_heat ... latent heat of fusion (in J/kg)
+            melting_range ... width of the range of temperatures where it is melting
+        """
+
+        super().__init__(rho, cp, lmbd)
+        self.melting_temperature = melting_temperature
+        self.latent_heat = latent_heat
+        self.melting_range = melting_range
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.rho: {self.rho},
+            self.cp: {self.cp},
+            self.lmbd: {self.lmbd},
+            self.melting_temperature: {self.melting_temperature},
+            self.latent_heat: {self.latent_heat},
+            self.melting_range: {self.melting_range},
+            """
+
+    def get_liquid_fraction(self, T):
+        """
+        Returning how big part of the material is melted in the temperatures
+
+        Args:
+            T ... array of temperatures
+        """
+
+        solidus = self.melting_temperature - self.melting_range/2
+        return np.clip((T - solidus) / self.melting_range, 0.0, 1.0)
+
+    def get_latent_enthalpy(self, T):
+        """
+        Returning the latent heat absorbed by the unit volume
+            in the temperatures (in J/m^3)
+
+        Args:
+            T ... array of temperatures
+        """
+
+        return self.rho*self.latent_heat*self.get_liquid_fraction(T)
+
+    def get_latent_capacity(self, T):
+        """
+        Returning the derivative of the latent enthalpy by the temperature
+            (nonzero only in the melting range)
+
+        Args:
+            T ... array of temperatures
+        """
+
+        is_melting = np.abs(T - self.melting_temperature) < self.melting_range/2
+        return is_melting*self.rho*self.latent_heat/self.melting_range
+
+    def stop_at_melting_edges(self, T, T_new):
+        """
+        Limiting the change of the temperatures, so that they are not jumping
+            over the edges of the melting range (where the latent capacity
+            changes) - they are stopped just behind the first edge on the way
+
+        Args:
+            T ... array of current temperatures
+            T_new ... array of wanted temperatures
+        """
+
+        solidus = self.melting_temperature - self.melting_range/2
+        liquidus = self.melting_temperature + self.melting_range/2
+        # Being slightly behind the edge, to have the capacity of the next part
+        overshoot = 1e-6*self.melting_range
+
+        next_edge_up = np.where(T < solidus, solidus, np.where(T < liquidus, liquidus, np.inf))
+        next_edge_down = np.where(T > liquidus, liquidus, np.where(T > solidus, solidus, -np.inf))
+        T_new = np.where(T_new > next_edge_up, next_edge_up + overshoot, T_new)
+        return np.where(T_new < next_edge_down, next_edge_down - overshoot, T_new)
+
+    def get_key(self) -> tuple:
+        """
+        Identifying the material by all its properties (for comparing
+            the materials)
+        """
+
+        return (float(self.rho), float(self.cp), float(self.lmbd), float(self.melting_temperature),
+                float(self.latent_heat), float(self.melting_range))
+
+
+def create_material(parameters: dict) -> Material:
+    """
+    Creating the material from the parameters of simulation - with constant
+        properties, unless their table in temperatures is specified (with
+        temperatures, cp_values and lmbd_values), or the phase change
+        (with melting_temperature and latent_heat) - not both of them
+
+    Args:
+        parameters ... all defined parameters of simulation
+    """
+
+    if parameters.get("phase_change") and parameters.get("temperature_table"):
+        raise ValueError("Temperature dependent properties cannot be used together with the phase change")
+    if parameters.get("phase_change"):
+        return PhaseChangeMaterial(parameters["rho"], parameters["cp"], parameters["lmbd"],
+                                   **parameters["phase_change"])
+    if parameters.get("temperature_table"):
+        return TemperatureDependentMaterial(parameters["rho"], **parameters["temperature_table"])
+    return Material(parameters["rho"], parameters["cp"], parameters["lmbd"])
+
+
+class Layer(Material):
+    """
+    Class storing one layer of the composite (coated or layered) object
+        - its thickness and material, and the thermal contact resistance
+        between it and the next layer (further from the heated side)
+    """
+
+    def __init__(self, thickness, rho, cp, lmbd, contact_resistance=0.0):
+        super().__init__(rho, cp, lmbd)
+        self.thickness = thickness  # How thick is the layer
+        # Contact resistance with the next layer (in m^2*K/W),
+        #   zero means perfect contact
+        self.contact_resistance = contact_resistance
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.thickness: {self.thickness},
+            self.rho: {self.rho},
+            self.cp: {self.cp},
+            self.lmbd: {self.lmbd},
+            self.contact_resistance: {self.contact_resistance},
+            """
+
+    def get_key(self) -> tuple:
+        """
+        Identifying the layer by all its properties (for comparing
+            the layers and for caching the operators)
+        """
+
+        return (float(self.thickness), float(self.rho), float(self.cp),
+                float(self.lmbd), float(self.contact_resistance))
+
+
 class ExperimentalData:
     """
     Class responsible for initializing and storing experimental data
 
+    The data are parsed in chunks directly into the binary form saved next
+        to the original file (sidecar), which is memory-mapped - so the memory
+        used does not depend on the size of the file. The next time the same
+        file is being loaded, the sidecar is only memory-mapped again.
+    When the sidecar cannot be created, the data are read into memory
+
     TODO: really agree on the parsing logic (indexes vs named columns)
     """
 
-    def __init__(self, csv_file_path="DATA.csv"):
-        # Preparing lists for storing all the data
-        self.t_data = []  # experimental data of time points
-        self.T_data = []  # experimental data of temperature
-        self.q_data = []  # experimental data of Measured HeatFluxes (might be missing)
-        self.T_amb_data = []  # experimental data of ambient temperature
+    # Defining the column names we are expecting
+    t_column_name = "Time"
+    T_column_name = "Temperature"
+    q_column_name = "HeatFlux"
+    T_amb_column_name = "T_amb"
 
-        # Defining the column names we are expecting
-        self.t_column_name = "Time"
-        self.T_column_name = "Temperature"
-        self.q_column_name = "HeatFlux"
-        self.T_amb_column_name = "T_amb"
+    # How many rows of CSV file are parsed at once into the binary sidecar
+    PARSING_CHUNK_SIZE = 65536
+
+    def __init__(self, csv_file_path="DATA.csv", use_binary_cache=True):
+        """
+        Args:
+            csv_file_path ... from where the data should be taken
+            use_binary_cache ... whether to use (and create) the binary sidecar
+        """
 
         # Trying to parse the file with experimental data, in case of any error
         #   relay it with our custom name
         try:
+            # Reading only the header, to validate the correctness of CSV file
+            #   (it is done every time, even when the binary data are available)
             with open(csv_file_path) as csv_file:
-                # NOTE: when using DictReader, skipping first row is not necessary,
-                #   on the contrary, we would be losing one row of data by it
-                csv_reader = csv.DictReader(csv_file)
-
-                # Validating the correctness of CSV file
-                self.check_CSV_file_correctness(csv_reader.fieldnames)
-
-                # Filling the data row by row
-                for row in csv_reader:
-                    self.t_data.append(float(row.get(self.t_column_name, 0)))
-                    self.T_data.append(float(row.get(self.T_column_name, 0)))
-                    self.q_data.append(float(row.get(self.q_column_name, 0)))
-                    self.T_amb_data.append(float(row.get(self.T_amb_column_name, 0)))
+                column_names = next(csv.reader(csv_file), [])
+            self.check_CSV_file_correctness(column_names)
+
+            data = None
+            if use_binary_cache:
+                data = self._load_binary_cache(csv_file_path)
+                if data is None:
+                    data = self._parse_csv_file_into_binary_cache(csv_file_path, column_names)
+            if data is None:
+                data = self._parse_csv_file(csv_file_path, column_names)
         except ExperimentDataCannotBeParsedError:
             raise
         except Exception as e:
             raise ExperimentDataCannotBeParsedError(e)
 
+        # Each column is stored in one row of the data, so that all the
+        #   values of one quantity are next to each other in memory
+        self.t_data = data[0]  # experimental data of time points
+        self.T_data = data[1]  # experimental data of temperature
+        self.q_data = data[2]  # experimental data of Measured HeatFluxes (might be missing)
+        self.T_amb_data = data[3]  # experimental data of ambient temperature
+
+    def _parse_csv_file(self, csv_file_path: str, column_names: list):
+        """
+        Reading all the needed columns of the CSV file at once into numpy
+            array - one row for each of time, temperature, heat flux
+            and ambient temperature
+        Missing columns (temperature or heat flux) are filled with zeros
+
+        Args:
+            csv_file_path ... from where the data should be taken
+            column_names ... list of columns from the CSV file
+        """
+
+        wanted_columns = [self.t_column_name, self.T_column_name,
+                          self.q_column_name, self.T_amb_column_name]
+        present_columns = [name for name in wanted_columns if name in column_names]
+
+        # NOTE: the other columns do not need to have the values in all rows
+        # https://numpy.org/doc/stable/reference/generated/numpy.loadtxt.html
+        values = np.loadtxt(csv_file_path, delimiter=",", skiprows=1, ndmin=2,
+                            usecols=[column_names.index(name) for name in present_columns])
+
+        data = np.zeros((len(wanted_columns), values.shape[0]))
+        for index, name in enumerate(present_columns):
+            data[wanted_columns.index(name)] = values[:, index]
+
+        return data
+
+    @staticmethod
+    def _get_binary_cache_paths(csv_file_path: str) -> tuple:
+        """
+        Determining where the binary data and their description are stored
+
+        Args:
+            csv_file_path ... path of the original CSV file
+        """
+
+        return "{}.cache.npy".format(csv_file_path), "{}.cache.json".format(csv_file_path)
+
+    def _load_binary_cache(self, csv_file_path: str):
+        """
+        Memory-mapping the binary data saved from previous loading, or
+            returning None when they are not available or are out of date
+        Data are considered the same when the file has the same size and
+            modification time, or at least the same size and content hash
+
+        Args:
+            csv_file_path ... path of the original CSV file
+        """
+
+        data_path, description_path = self._get_binary_cache_paths(csv_file_path)
+
+        try:
+            with open(description_path) as description_file:
+                description = json.load(description_file)
+            file_stats = os.stat(csv_file_path)
+
+            if file_stats.st_size != description["size"]:
+                return None
+            if file_stats.st_mtime_ns != description["mtime"]:
+                if file_hash_cache.get(csv_file_path) != description["hash"]:
+                    return None
+                # The file was only touched, so remembering its new time
+                #   (when possible, it is not necessary)
+                description["mtime"] = file_stats.st_mtime_ns
+                try:
+                    self._save_description(description_path, description)
+                except OSError:
+                    pass
+
+            data = np.load(data_path, mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return None
+
+        if data.ndim != 2 or data.shape[0] != 4:
+            return None
+
+        return data
+
+    def _parse_csv_file_into_binary_cache(self, csv_file_path: str, column_names: list):
+        """
+        Parsing the CSV file chunk by chunk straight into the memory-mapped
+            binary sidecar, returning the memory-mapped data, or None when
+            the sidecar cannot be created (read-only location)
+
+        Args:
+            csv_file_path ... path of the original CSV file
+            column_names ... list of columns from the CSV file
+        """
+
+        data_path, description_path = self._get_binary_cache_paths(csv_file_path)
+
+        wanted_columns = [self.t_column_name, self.T_column_name,
+                          self.q_column_name, self.T_amb_column_name]
+        present_columns = [name for name in wanted_columns if name in column_names]
+        data_rows = [wanted_columns.index(name) for name in present_columns]
+
+        try:
+            # Description is taken before parsing - when the file changes
+            #   in the meantime, the data will not be trusted next time
+            file_stats = os.stat(csv_file_path)
+            description = {
+                "size": file_stats.st_size,
+                "mtime": file_stats.st_mtime_ns,
+                "hash": file_hash_cache.get(csv_file_path),
+            }
+
+            # The size of the data must be known in advance - taking the number
+            #   of lines, which can be higher (empty lines, comments)
+            max_rows = self._count_lines(csv_file_path) - 1
+
+            # Saving into a temporary file first and renaming it afterwards,
+            #   so that no other process can read incomplete data
+            # (Missing columns stay filled with zeros)
+            temporary_data_path = "{}.{}.tmp".format(data_path, os.getpid())
+            try:
+                data = np.lib.format.open_memmap(temporary_data_path, mode="w+", dtype=float,
+                                                 shape=(len(wanted_columns), max_rows))
+                filled_rows = 0
+                with open(csv_file_path) as csv_file:
+                    next(csv_file, None)
+                    while True:
+                        lines = list(itertools.islice(csv_file, self.PARSING_CHUNK_SIZE))
+                        if not lines:
+                            break
+                        values = np.loadtxt(lines, delimiter=",", ndmin=2,
+                                            usecols=[column_names.index(name) for name in present_columns])
+                        if filled_rows + values.shape[0] > max_rows:
+                            raise ValueError("CSV file has changed while being parsed")
+                        data[data_rows, filled_rows:filled_rows + values.shape[0]] = values.T
+                        filled_rows += values.shape[0]
+                data.flush()
+
+                # Some lines were not data, so the data must be moved into the smaller array
+                if filled_rows < max_rows:
+                    all_data = data
+                    data = np.lib.format.open_memmap(temporary_data_path + ".part", mode="w+",
+                                                     dtype=float, shape=(len(wanted_columns), filled_rows))
+                    for start in range(0, filled_rows, self.PARSING_CHUNK_SIZE):
+                        stop = min(start + self.PARSING_CHUNK_SIZE, filled_rows)
+                        data[:, start:stop] = all_data[:, start:stop]
+                    data.flush()
+                    del all_data
+                    os.replace(temporary_data_path + ".part", temporary_data_path)
+                del data
+            except BaseException:
+                for path in [temporary_data_path, temporary_data_path + ".part"]:
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+            os.replace(temporary_data_path, data_path)
+
+            # Description is written as the last one, as it is validating the data
+            self._save_description(description_path, description)
+        except OSError:
+            return None
+
+        return np.load(data_path, mmap_mode="r")
+
+    @staticmethod
+    def _count_lines(file_path: str, chunk_size: int = 1024*1024) -> int:
+        """
+        Counting the lines of the file, without reading it whole into memory
+
+        Args:
+            file_path ... path to the file
+            chunk_size ... how many bytes to read at once
+        """
+
+        number_of_lines = 0
+        last_chunk = b""
+        with open(file_path, "rb") as data_file:
+            for chunk in iter(lambda: data_file.read(chunk_size), b""):
+                number_of_lines += chunk.count(b"\n")
+                last_chunk = chunk
+        # The last line does not need to be ended
+        if last_chunk and not last_chunk.endswith(b"\n"):
+            number_of_lines += 1
+
+        return number_of_lines
+
+    @staticmethod
+    def _save_description(description_path: str, description: dict) -> None:
+        """
+        Saving the description of the binary data
+
+        Args:
+            description_path ... where to save the description
+            description ... size, modification time and hash of original file
+        """
+
+        temporary_description_path = "{}.{}.tmp".format(description_path, os.getpid())
+        with open(temporary_description_path, "w") as description_file:
+            json.dump(description, description_file)
+        os.replace(temporary_description_path, description_path)
+
     def check_CSV_file_correctness(self, column_names: list) -> None:
         """
         Making sure the CSV file contains the right columns.
@@ -99,3 +576,130 @@ class ExperimentalData:
         if self.T_column_name not in column_names and self.q_column_name not in column_names:
             msg = "Temperature and flux data are empty, please use 'Temperature' and 'HeatFlux' columns for this data"
             raise ExperimentDataCannotBeParsedError(msg)
+
+
+def get_file_hash(file_path: str, chunk_size: int = 1024*1024) -> str:
+    """
+    Computing the SHA-1 hash of the file content, so that the same data
+        can be recognized regardless of the file name or modification time
+
+    Args:
+        file_path ... path to the file
+        chunk_size ... how many bytes to read at once (to save memory)
+    """
+
+    file_hash = hashlib.sha1()
+    with open(file_path, "rb") as data_file:
+        for chunk in iter(lambda: data_file.read(chunk_size), b""):
+            file_hash.update(chunk)
+
+    return file_hash.hexdigest()
+
+
+class FileHashCache:
+    """
+    Class remembering the content hashes of the experiment data files, so
+        that the (possibly big) files are hashed again only when their size
+        or modification time changes
+    The hash is also taken from the description of the binary sidecar,
+        so the file hashed by other process is not hashed again
+    """
+
+    def __init__(self, max_size: int = 64) -> None:
+        """
+        Args:
+            max_size ... how many different files to remember
+        """
+
+        self.max_size = max_size
+        self._hashes: OrderedDict = OrderedDict()
+
+    def get(self, file_path: str) -> str:
+        """
+        Returning the hash of the file content, computing it only when
+            it is not known for the current state of the file
+
+        Args:
+            file_path ... path to the file
+        """
+
+        file_stats = os.stat(file_path)
+        key = (os.path.realpath(file_path), file_stats.st_size, file_stats.st_mtime_ns)
+
+        if key in self._hashes:
+            self._hashes.move_to_end(key)
+            return self._hashes[key]
+
+        file_hash = None
+        _, description_path = ExperimentalData._get_binary_cache_paths(file_path)
+        try:
+            with open(description_path) as description_file:
+                description = json.load(description_file)
+            if (description["size"], description["mtime"]) == key[1:]:
+                file_hash = description["hash"]
+        except (OSError, ValueError, KeyError):
+            pass
+        if file_hash is None:
+            file_hash = get_file_hash(file_path)
+
+        self._hashes[key] = file_hash
+        if len(self._hashes) > self.max_size:
+            self._hashes.popitem(last=False)
+
+        return file_hash
+
+
+class ExperimentDataCache:
+    """
+    Class keeping the recently used experiment data in memory, so that
+        the repeated simulations with the same file do not read it again
+    The file is read again when it was modified in the meantime
+    The data are shared by all the simulations, which are only reading them
+    """
+
+    def __init__(self, max_size: int = 8) -> None:
+        """
+        Args:
+            max_size ... how many different files to remember
+        """
+
+        self.max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, csv_file_path: str) -> ExperimentalData:
+        """
+        Returning the experiment data from the file, reading it only when
+            it is not already in the memory
+
+        Args:
+            csv_file_path ... file with the data
+        """
+
+        try:
+            file_stats = os.stat(csv_file_path)
+        except OSError as e:
+            raise ExperimentDataCannotBeParsedError(str(e))
+        key = (os.path.realpath(csv_file_path), file_stats.st_size, file_stats.st_mtime_ns)
+
+        if key in self._data:
+            self._data.move_to_end(key)
+            return self._data[key]
+
+        experiment_data = ExperimentalData(csv_file_path)
+        self._data[key] = experiment_data
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+        return experiment_data
+
+    def clear(self) -> None:
+        """
+        Forgetting all the stored data
+        """
+
+        self._data.clear()
+
+
+# Process-wide caches shared by all the simulations
+file_hash_cache = FileHashCache()
+experiment_data_cache = ExperimentDataCache()
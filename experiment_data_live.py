@@ -0,0 +1,299 @@
+"""
+This module is responsible for getting experiment data while the
+    experiment is still running
+
+The data are coming either from a CSV file that is still being written
+    (and is therefore followed like with "tail -f"), or from a local socket,
+    through which the data-acquisition system is sending the CSV lines.
+In both cases the first line is a header with the column names,
+    the same as in the finished CSV files.
+"""
+
+import time
+import socket
+import codecs
+from abc import ABC, abstractmethod
+from typing import Optional
+import numpy as np  # type: ignore
+
+from experiment_data_handler import ExperimentalData, ExperimentDataCannotBeParsedError
+
+
+class LiveExperimentalData(ExperimentalData, ABC):
+    """
+    Base class for experiment data arriving incrementally
+    Offers the same attributes as ExperimentalData (t_data, T_data, q_data
+        and T_amb_data), which are growing as the new samples arrive
+
+    Subclasses must define the _read_available_text() method
+    """
+
+    def __init__(self, idle_timeout: Optional[float] = None) -> None:
+        """
+        Args:
+            idle_timeout ... after how many seconds without new data
+                             the experiment is considered finished
+                             (None means waiting forever)
+        """
+
+        self.idle_timeout = idle_timeout
+
+        # Whether no more data will come
+        self.closed = False
+
+        # Storage for the samples, that is being enlarged when full
+        #   (rows are time, temperature, heat flux and ambient temperature)
+        self.number_of_samples = 0
+        self._data = np.empty((4, 1024))
+        # Time (time.perf_counter()) at which each of the samples arrived,
+        #   to be able to determine the latency of processing
+        self._arrival_times = np.empty(1024)
+
+        # Indexes of the columns we are interested in (known from the header)
+        self._column_indexes: Optional[list] = None
+        # Incomplete line that was not fully received yet
+        self._pending_text = ""
+        self._last_data_time = time.perf_counter()
+
+    @property
+    def t_data(self):
+        return self._data[0, :self.number_of_samples]
+
+    @property
+    def T_data(self):
+        return self._data[1, :self.number_of_samples]
+
+    @property
+    def q_data(self):
+        return self._data[2, :self.number_of_samples]
+
+    @property
+    def T_amb_data(self):
+        return self._data[3, :self.number_of_samples]
+
+    @property
+    def arrival_times(self):
+        return self._arrival_times[:self.number_of_samples]
+
+    @abstractmethod
+    def _read_available_text(self) -> Optional[str]:
+        """
+        Returning all the text that is available right now without waiting,
+            or None when the source has ended
+        """
+
+    def close(self) -> None:
+        """
+        Marking the experiment as finished - no more data will be read
+        """
+
+        self.closed = True
+
+    def poll(self) -> int:
+        """
+        Reading all the samples that are available right now
+        Returns the number of new samples
+        """
+
+        if self.closed:
+            return 0
+
+        text = self._read_available_text()
+        now = time.perf_counter()
+
+        # When the source has ended, processing also the last line,
+        #   even when it is not terminated by a newline
+        if text is None:
+            self.closed = True
+            lines = (self._pending_text + "\n").split("\n")
+        else:
+            lines = (self._pending_text + text).split("\n")
+        self._pending_text = lines.pop()
+
+        number_of_new_samples = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if self._column_indexes is None:
+                self._process_header(line)
+            else:
+                self._add_sample(line, arrival_time=now)
+                number_of_new_samples += 1
+
+        if number_of_new_samples > 0:
+            self._last_data_time = now
+        elif self.idle_timeout is not None and now - self._last_data_time > self.idle_timeout:
+            self.closed = True
+
+        return number_of_new_samples
+
+    def wait_for_samples(self, timeout: float = 0.1) -> int:
+        """
+        Waiting for new samples, but at most the specified time
+        Returns the number of new samples
+
+        Args:
+            timeout ... maximum waiting time in seconds
+        """
+
+        end_time = time.perf_counter() + timeout
+        while True:
+            number_of_new_samples = self.poll()
+            if number_of_new_samples > 0 or self.closed or time.perf_counter() >= end_time:
+                return number_of_new_samples
+            time.sleep(0.001)
+
+    def _process_header(self, line: str) -> None:
+        """
+        Validating the column names and remembering where the data are
+
+        Args:
+            line ... header line with column names
+        """
+
+        column_names = [name.strip() for name in line.split(",")]
+        self.check_CSV_file_correctness(column_names)
+
+        # Missing columns (temperature or heat flux) are having None index
+        #   and are being filled with zeros
+        self._column_indexes = [
+            column_names.index(name) if name in column_names else None
+            for name in [self.t_column_name, self.T_column_name,
+                         self.q_column_name, self.T_amb_column_name]
+        ]
+
+    def _add_sample(self, line: str, arrival_time: float) -> None:
+        """
+        Parsing one line of data and storing it
+
+        Args:
+            line ... line with the comma-separated values
+            arrival_time ... when the line was received
+        """
+
+        values = line.split(",")
+        try:
+            sample = [float(values[index]) if index is not None else 0.0
+                      for index in self._column_indexes]  # type: ignore
+        except (ValueError, IndexError) as e:
+            raise ExperimentDataCannotBeParsedError(str(e))
+
+        # Time must be increasing, otherwise the interpolation would fail
+        if self.number_of_samples > 0 and sample[0] <= self._data[0, self.number_of_samples-1]:
+            msg = "Time is not increasing: {}".format(line)
+            raise ExperimentDataCannotBeParsedError(msg)
+
+        # Doubling the storage when it is full
+        if self.number_of_samples == self._data.shape[1]:
+            self._data = np.concatenate((self._data, np.empty_like(self._data)), axis=1)
+            self._arrival_times = np.concatenate((self._arrival_times,
+                                                  np.empty_like(self._arrival_times)))
+
+        self._data[:, self.number_of_samples] = sample
+        self._arrival_times[self.number_of_samples] = arrival_time
+        self.number_of_samples += 1
+
+
+class CSVTailSource(LiveExperimentalData):
+    """
+    Class following a CSV file that is still being written to
+    """
+
+    def __init__(self,
+                 csv_file_path: str,
+                 idle_timeout: Optional[float] = None) -> None:
+        """
+        Args:
+            csv_file_path ... file with the data being written
+            idle_timeout ... after how many seconds without new data
+                             the experiment is considered finished
+        """
+
+        super().__init__(idle_timeout=idle_timeout)
+
+        try:
+            self._file = open(csv_file_path)
+        except OSError as e:
+            raise ExperimentDataCannotBeParsedError(str(e))
+
+    def _read_available_text(self) -> Optional[str]:
+        """
+        Reading everything that was written to the file since the last time
+        """
+
+        return self._file.read()
+
+    def close(self) -> None:
+        """
+        Marking the experiment as finished and closing the file
+        """
+
+        super().close()
+        self._file.close()
+
+
+class SocketSource(LiveExperimentalData):
+    """
+    Class receiving the CSV lines through the local socket, which is
+        standing in for the data-acquisition system
+    The experiment is finished when the other side closes the connection
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 50007,
+                 idle_timeout: Optional[float] = None) -> None:
+        """
+        Args:
+            host ... where the data-acquisition system is listening
+            port ... on which port it is listening
+            idle_timeout ... after how many seconds without new data
+                             the experiment is considered finished
+        """
+
+        super().__init__(idle_timeout=idle_timeout)
+
+        try:
+            self._socket = socket.create_connection((host, port))
+        except OSError as e:
+            raise ExperimentDataCannotBeParsedError(str(e))
+        self._socket.setblocking(False)
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def _read_available_text(self) -> Optional[str]:
+        """
+        Receiving everything that has arrived since the last time
+        """
+
+        received = []
+        connection_ended = False
+        while True:
+            try:
+                chunk = self._socket.recv(65536)
+            except BlockingIOError:
+                break
+            except OSError:
+                # Connection is broken, but what was received before is valid
+                connection_ended = True
+                break
+            # Empty chunk means the connection was closed by the other side
+            if not chunk:
+                connection_ended = True
+                break
+            received.append(chunk)
+
+        text = self._decoder.decode(b"".join(received))
+        if connection_ended:
+            # The last text is processed together with the end of the source
+            self._pending_text += text
+            return None
+        return text
+
+    def close(self) -> None:
+        """
+        Marking the experiment as finished and closing the connection
+        """
+
+        super().close()
+        self._socket.close()
@@ -140,7 +140,7 @@ def main():
         file_name = custom_file_name if custom_file_name != "" else "elements"
         with open(file_name + ".csv", "w") as csv_file:
             csv_writer = writer(csv_file)
-            headers = ["NAME", "T_MELT [°C]", "RHO [kg/m3]", "C_P [J/(kg*K)]", "LAMBDA [W/(m*K)]"]
+            headers = ["NAME", "T_MELT [K]", "RHO [kg/m3]", "C_P [J/(kg*K)]", "LAMBDA [W/(m*K)]"]
             csv_writer.writerow(headers)
 
             for element in element_list:
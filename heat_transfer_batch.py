@@ -0,0 +1,255 @@
+"""
+This module is serving for running many simulations without the GUI,
+    for example for the nightly processing of all the test-rig data.
+
+Each simulation is defined by a job file (JSON):
+    {
+        "name": "rig-3-monday",          (optional, file name by default)
+        "algorithm": "inverse",          (classic or inverse)
+        "parameters": {...}              (the same as in the GUI, including
+                                          "experiment_data_path")
+    }
+    Relative experiment data paths are relative to the job file.
+
+The jobs are given as job files, directories with job files, or manifests
+    - JSON files with the list of jobs ({"jobs": [...]}), each of them being
+    either the job itself or the path to the job file.
+
+The jobs are run in the pool of worker processes, and for each of them
+    the results (CSV) and the summary with timing (JSON) are written
+    into the output directory, together with the summary of all the jobs.
+    When any of the jobs fails, the exit code is not zero.
+
+Usage:
+    python heat_transfer_batch.py jobs_directory --output-dir results --workers 8
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from typing import Optional
+from concurrent.futures import as_completed
+
+from heat_transfer_worker_pool import WarmWorkerPool, SIMULATION_MODULES
+
+
+class JobFileError(Exception):
+    """
+    Used when the job definition is not valid
+    """
+
+
+def load_job(job: dict, base_directory: str, default_name: str) -> dict:
+    """
+    Validating the job definition and completing it
+
+    Args:
+        job ... job definition
+        base_directory ... to which the relative paths are relative
+        default_name ... name of the job when not specified
+    """
+
+    if not isinstance(job, dict) or not isinstance(job.get("parameters"), dict):
+        raise JobFileError("Job {} has no parameters".format(default_name))
+
+    algorithm = job.get("algorithm", "classic")
+    if algorithm not in SIMULATION_MODULES:
+        raise JobFileError("Job {} has unknown algorithm: {}".format(default_name, algorithm))
+
+    # Name is becoming the name of the result files, so it must not
+    #   lead outside the output directory
+    name = str(job.get("name", default_name))
+    if not name or name in [".", ".."] or os.path.basename(name) != name or \
+            any(separator and separator in name for separator in ["/", "\\", os.sep, os.altsep]):
+        raise JobFileError("Job {} has invalid name: {}".format(default_name, name))
+
+    parameters = dict(job["parameters"])
+    if "experiment_data_path" not in parameters:
+        raise JobFileError("Job {} has no experiment_data_path".format(default_name))
+    parameters["experiment_data_path"] = os.path.join(base_directory,
+                                                      parameters["experiment_data_path"])
+
+    return {
+        "name": name,
+        "algorithm": algorithm,
+        "parameters": parameters,
+    }
+
+
+def collect_jobs(paths: list) -> list:
+    """
+    Finding all the jobs in the given job files, directories and manifests
+
+    Args:
+        paths ... job files, directories with job files or manifests
+    """
+
+    jobs = []
+    for path in paths:
+        if os.path.isdir(path):
+            file_paths = sorted(os.path.join(path, file_name) for file_name in os.listdir(path)
+                                if file_name.endswith(".json"))
+            jobs.extend(collect_jobs(file_paths))
+            continue
+
+        try:
+            with open(path) as job_file:
+                content = json.load(job_file)
+        except (OSError, ValueError) as e:
+            raise JobFileError("Job file {} cannot be read: {}".format(path, e))
+
+        base_directory = os.path.dirname(os.path.abspath(path))
+        default_name = os.path.splitext(os.path.basename(path))[0]
+
+        # Manifest is listing either the jobs or the paths to job files
+        if isinstance(content, dict) and "jobs" in content:
+            for job_idx, job in enumerate(content["jobs"]):
+                if isinstance(job, str):
+                    jobs.extend(collect_jobs([os.path.join(base_directory, job)]))
+                else:
+                    jobs.append(load_job(job, base_directory,
+                                         "{}-{}".format(default_name, job_idx)))
+        else:
+            jobs.append(load_job(content, base_directory, default_name))
+
+    # Each job is writing its own files, so the names must be unique
+    names = [job["name"] for job in jobs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise JobFileError("Jobs must have unique names: {}".format(", ".join(duplicates)))
+
+    return jobs
+
+
+def run_jobs(jobs: list,
+             output_directory: str,
+             workers: Optional[int] = None,
+             use_cache: bool = False,
+             collect_timing: bool = False,
+             profile: bool = False) -> list:
+    """
+    Running all the jobs in the pool of worker processes, writing
+        the results of each of them as soon as it finishes
+    Returns the summaries of all the jobs
+
+    Args:
+        jobs ... definitions of the jobs
+        output_directory ... where to write the results
+        workers ... how many jobs to run at once
+        use_cache ... whether to reuse results of identical finished simulations
+        collect_timing ... whether to measure the phases of the simulations
+        profile ... whether to profile the simulations (into the Profilings directory)
+    """
+
+    os.makedirs(output_directory, exist_ok=True)
+
+    pool = WarmWorkerPool(max_workers=workers)
+    summaries = []
+    try:
+        futures = {}
+        for job in jobs:
+            results_path = os.path.join(output_directory, "{}.csv".format(job["name"]))
+            future = pool.submit(job["algorithm"], job["parameters"],
+                                 results_path=results_path, use_cache=use_cache,
+                                 collect_timing=collect_timing, profile=profile)
+            futures[future] = (job, time.time())
+
+        for future in as_completed(futures):
+            job, submit_time = futures[future]
+            summary = {
+                "name": job["name"],
+                "algorithm": job["algorithm"],
+                "parameters": job["parameters"],
+            }
+            try:
+                result = future.result()
+            except Exception as e:
+                summary.update({"status": "failed", "error": "{}: {}".format(type(e).__name__, e)})
+            else:
+                # Time of waiting for the free worker is reported separately,
+                #   the wall time starts when the worker takes the job
+                summary.update({"status": "finished",
+                                "error_value": float(result["error_value"]),
+                                "computation_time": result["computation_time"],
+                                "wall_time": time.time() - result["start_time"],
+                                "queue_wait": max(0.0, result["start_time"] - submit_time)})
+                # Simulations taken from the cache were not measured
+                for optional_part in ["timing", "profile"]:
+                    if optional_part in result:
+                        summary[optional_part] = result[optional_part]
+            print("{} - {} {}".format(job["name"], summary["status"], summary.get("error", "")))
+
+            with open(os.path.join(output_directory, "{}.json".format(job["name"])), "w") as job_file:
+                json.dump(summary, job_file, indent=4)
+            summaries.append(summary)
+    finally:
+        pool.shutdown()
+
+    write_summary(summaries, output_directory)
+    return summaries
+
+
+def write_summary(summaries: list, output_directory: str) -> None:
+    """
+    Writing the overview of all the jobs into a CSV file
+
+    Args:
+        summaries ... summaries of all the jobs
+        output_directory ... where to write the overview
+    """
+
+    columns = ["name", "algorithm", "status", "error_value", "computation_time", "wall_time",
+               "queue_wait", "error"]
+    with open(os.path.join(output_directory, "summary.csv"), "w", newline="") as csv_file:
+        csv_writer = csv.DictWriter(csv_file, fieldnames=columns, extrasaction="ignore")
+        csv_writer.writeheader()
+        for summary in sorted(summaries, key=lambda summary: summary["name"]):
+            csv_writer.writerow(summary)
+
+
+def main(arguments: Optional[list] = None) -> int:
+    """
+    Command line interface of the batch processing
+    Returns the exit code - 0 when all the jobs finished, 1 otherwise
+
+    Args:
+        arguments ... command line arguments (sys.argv when not specified)
+    """
+
+    parser = argparse.ArgumentParser(description="Run simulation job files in parallel")
+    parser.add_argument("jobs", nargs="+",
+                        help="job files, directories with job files or manifests")
+    parser.add_argument("--output-dir", default="Batch-{}".format(int(time.time())),
+                        help="where to write the results")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="how many jobs to run at once (number of cores by default)")
+    parser.add_argument("--use-cache", action="store_true",
+                        help="reuse results of identical finished simulations")
+    parser.add_argument("--timing", action="store_true",
+                        help="measure the phases of the simulations (slightly slower)")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the simulations (cProfile and flame-graph stacks)")
+    args = parser.parse_args(arguments)
+
+    try:
+        jobs = collect_jobs(args.jobs)
+    except JobFileError as e:
+        print(e)
+        return 1
+
+    summaries = run_jobs(jobs, output_directory=args.output_dir,
+                         workers=args.workers, use_cache=args.use_cache,
+                         collect_timing=args.timing, profile=args.profile)
+
+    number_of_failed = sum(summary["status"] != "finished" for summary in summaries)
+    print("Finished {} jobs, {} failed, results in {}".format(
+        len(summaries), number_of_failed, args.output_dir))
+
+    return 1 if number_of_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
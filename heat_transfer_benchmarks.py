@@ -0,0 +1,683 @@
+"""
+This module is the benchmark suite guarding the performance of the
+    simulations (replacing the "dirty" Older stuff/performance.py)
+
+Measured are:
+    - forward simulation steps (across the number of elements and theta)
+    - forward simulation with linear (P1) and quadratic (P2) elements,
+      each on the coarsest mesh reaching the same accuracy against
+      the analytical solution
+    - inverse simulation time per one accepted heat flux
+    - loading of the experiment data (CSV parsing and binary sidecar)
+    - smoothing of the inverse result
+    - refreshing of the plots (only when matplotlib is available)
+All of them on DATA.csv and on the generated synthetic data of increasing
+    length.
+
+Every benchmark is first run a few times without measuring (warm-up)
+    and then measured in more repetitions, from which the confidence
+    interval of the mean is determined. The samples are stored in the
+    history file together with the description of the machine, and each
+    new run is compared with the last one from the same machine - the
+    slowdown is reported only when it is statistically significant
+    (one-sided Mann-Whitney U test) and bigger than the allowed noise.
+
+Usage:
+    python heat_transfer_benchmarks.py
+    python heat_transfer_benchmarks.py --quick --filter forward
+Exit code is 1 when some benchmark got significantly slower.
+"""
+
+import os
+import io
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import importlib.util
+import tempfile
+import contextlib
+from typing import Callable, Optional
+
+import numpy as np  # type: ignore
+from scipy import stats  # type: ignore
+
+from NumericalForward import Simulation
+from NumericalOperators import Mesh
+from NumericalInverse import InverseSimulation
+from experiment_data_handler import ExperimentalData, Material
+from heat_transfer_results_cache import get_code_version
+from simulation_timing import get_machine_description, get_system_load
+
+WORKING_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_HISTORY_PATH = os.path.join(WORKING_DIRECTORY, "Benchmarks", "history.json")
+
+# Parameters shared by all the simulations in the benchmarks
+DEFAULT_PARAMETERS: dict = {
+    "material": Material(7850, 520, 50),
+    "length": 0.01,
+    "x0": 0.0045,
+    "robin_alpha": 13.5,
+}
+
+# Lengths of the synthetic data (number of samples, one per second)
+DEFAULT_SYNTHETIC_SIZES = [1000, 10000, 100000]
+
+# Accuracy at the place of interest (against the analytical solution),
+#   at which the linear and quadratic elements are compared, and the time
+#   step small enough not to spoil it
+EQUAL_ACCURACY_ERROR = 1e-4
+EQUAL_ACCURACY_DT = 0.01
+
+
+class BenchmarkCase:
+    """
+    Class defining one benchmark - what to prepare and what to measure
+    """
+
+    def __init__(self,
+                 name: str,
+                 prepare: Callable,
+                 unit: str = "run") -> None:
+        """
+        Args:
+            name ... unique name of the benchmark
+            prepare ... function preparing everything (not measured),
+                        returning the measured function and how many
+                        operations (units) it is doing in one call
+            unit ... what is one operation (step, flux, file ...)
+        """
+
+        self.name = name
+        self.prepare = prepare
+        self.unit = unit
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.name: {self.name},
+            self.unit: {self.unit},
+            """
+
+
+def create_synthetic_data(file_path: str,
+                          number_of_samples: int,
+                          seed: int = 0) -> None:
+    """
+    Generating the experiment data file of the given length - heat flux
+        pulses, slowly changing ambient temperature and smooth heating
+    The data are always the same for the same length and seed
+
+    Args:
+        file_path ... where to write the data
+        number_of_samples ... how many rows the file should have
+        seed ... seed of the random generator
+    """
+
+    random_generator = np.random.RandomState(seed)
+    t = np.arange(number_of_samples, dtype=float)
+    # Pulses of random height, each lasting 300 seconds
+    pulse_heights = random_generator.uniform(0, 2000, number_of_samples // 300 + 1)
+    heat_flux = pulse_heights[(t // 300).astype(int)] * (t % 300 < 150)
+    T_amb = 20 + np.cumsum(random_generator.choice([-0.001, 0.001], number_of_samples))
+    temperature = T_amb + 50 * (1 - np.exp(-t / 2000))
+
+    data = np.column_stack([t, temperature, heat_flux, T_amb])
+    np.savetxt(file_path, data, delimiter=",", fmt="%.6g", comments="",
+               header="Time,Temperature,HeatFlux,T_amb")
+
+
+def _get_forward_simulation(data_path: str, N: int, theta: float) -> Simulation:
+    """
+    Creating the forward simulation with the parameters of the benchmarks
+
+    Args:
+        data_path ... experiment data
+        N ... number of elements
+        theta ... explicitness/implicitness of the simulation
+    """
+
+    return Simulation(N=N, dt=1.0, theta=theta, experiment_data_path=data_path,
+                      **DEFAULT_PARAMETERS)
+
+
+def _prepare_forward(data_path: str, N: int, theta: float):
+    """
+    Measuring the whole forward simulation, per one step
+
+    Args:
+        data_path ... experiment data
+        N ... number of elements
+        theta ... explicitness/implicitness of the simulation
+    """
+
+    Sim = _get_forward_simulation(data_path, N, theta)
+
+    def run_forward():
+        Sim.reset()
+        while not Sim.simulation_has_finished:
+            Sim.evaluate_one_step()
+
+    return run_forward, Sim.max_step_idx
+
+
+def _prepare_equal_accuracy(data_path: str, element_order: int, target_error: float):
+    """
+    Measuring the forward simulation on the coarsest mesh (the number
+        of elements is being doubled) whose error at the place of interest
+        is below the target, per one step
+
+    Args:
+        data_path ... where to write the data of the analytical solution
+        element_order ... 1 for linear elements, 2 for quadratic ones
+        target_error ... wanted accuracy at the place of interest (in degrees)
+    """
+
+    # Imported here, as the verification is using the measurements from this module
+    from heat_transfer_verification import ConvectiveSlabSolution, get_errors
+
+    solution = ConvectiveSlabSolution(material=DEFAULT_PARAMETERS["material"])
+    solution.write_data_file(data_path)
+
+    Sim = Simulation(N=1, dt=EQUAL_ACCURACY_DT, theta=0.5,
+                     robin_alpha=solution.robin_alpha, x0=solution.x0,
+                     length=solution.length, material=solution.material,
+                     experiment_data_path=data_path, mesh=Mesh(element_order=element_order))
+
+    def run_forward():
+        Sim.reset()
+        while not Sim.simulation_has_finished:
+            Sim.evaluate_one_step()
+
+    for N in [2**i for i in range(11)]:
+        Sim.reconfigure(N=N)
+        run_forward()
+        error = get_errors(Sim, solution)["probe_error"]
+        if error <= target_error:
+            break
+    print("P{} elements: number_of_elements={} (nodes={}), error={:.3g}".format(
+        element_order, N, len(Sim.x), error))
+
+    return run_forward, Sim.max_step_idx
+
+
+def _get_inverse_simulation(data_path: str) -> InverseSimulation:
+    """
+    Creating the inverse simulation with the parameters of the benchmarks
+
+    Args:
+        data_path ... experiment data
+    """
+
+    return InverseSimulation(N=20, dt=10, theta=0.5, window_span=3, tolerance=1e-5,
+                             init_q_adjustment=20, adjusting_value=-0.7,
+                             experiment_data_path=data_path, **DEFAULT_PARAMETERS)
+
+
+def _prepare_inverse(data_path: str):
+    """
+    Measuring the whole inverse simulation, per one accepted heat flux
+
+    Args:
+        data_path ... experiment data
+    """
+
+    Prob = _get_inverse_simulation(data_path)
+
+    def run_inverse():
+        Prob.reset()
+        while not Prob.simulation_has_finished:
+            Prob.evaluate_one_step()
+
+    return run_inverse, Prob.max_step_idx
+
+
+def _prepare_data_loading(data_path: str, use_binary_cache: bool):
+    """
+    Measuring the loading of the experiment data file (without the
+        cache of the already loaded files)
+
+    Args:
+        data_path ... experiment data
+        use_binary_cache ... whether to load the binary sidecar
+    """
+
+    # Creating the binary sidecar in advance
+    ExperimentalData(data_path, use_binary_cache=use_binary_cache)
+
+    def load_data():
+        ExperimentalData(data_path, use_binary_cache=use_binary_cache)
+
+    return load_data, 1
+
+
+def _prepare_smoothing(data_path: str, method: str):
+    """
+    Measuring the smoothing of the inverse result
+
+    Args:
+        data_path ... experiment data
+        method ... which smoothing method to use
+    """
+
+    Prob = _get_inverse_simulation(data_path)
+    while not Prob.simulation_has_finished:
+        Prob.evaluate_one_step()
+    original_heat_flux = Prob.HeatFlux.copy()
+
+    def smooth():
+        # Always smoothing the same result, not the already smoothed one
+        Prob.HeatFlux = original_heat_flux
+        Prob.smooth_index = 0
+        Prob._smooth_the_result(window_length=21, method=method)
+
+    return smooth, 1
+
+
+class OffscreenPlot:
+    """
+    Class drawing the same plot as the GUI canvases, only into the memory
+    """
+
+    def __init__(self) -> None:
+        from matplotlib.figure import Figure  # type: ignore
+        from matplotlib.backends.backend_agg import FigureCanvasAgg  # type: ignore
+
+        self.figure = Figure(dpi=100)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.subplot = self.figure.add_subplot(111)
+
+    def plot(self, x_values=None, y_values=None,
+             x_experiment_values=None, y_experiment_values=None) -> None:
+        self.subplot.cla()
+        if x_values is not None and y_values is not None:
+            min_length = min(len(x_values), len(y_values))
+            self.subplot.plot(x_values[:min_length], y_values[:min_length],
+                              label='Calculated Data', color="blue")
+        if x_experiment_values is not None and y_experiment_values is not None:
+            min_length = min(len(x_experiment_values), len(y_experiment_values))
+            self.subplot.plot(x_experiment_values[:min_length], y_experiment_values[:min_length],
+                              label='Experiment Data', color="orange")
+        self.subplot.legend()
+        self.canvas.draw()
+
+
+def _prepare_plot_refresh(data_path: str):
+    """
+    Measuring the refreshing of both the plots with the complete results
+
+    Args:
+        data_path ... experiment data
+    """
+
+    Sim = _get_forward_simulation(data_path, N=100, theta=0.5)
+    while not Sim.simulation_has_finished:
+        Sim.evaluate_one_step()
+    temperature_plot = OffscreenPlot()
+    heat_flux_plot = OffscreenPlot()
+
+    def refresh_plots():
+        Sim.heat_flux_already_plotted = False
+        Sim.plot(temperature_plot=temperature_plot, heat_flux_plot=heat_flux_plot)
+
+    return refresh_plots, 1
+
+
+def get_benchmark_cases(data_paths: dict,
+                        N_values: Optional[list] = None,
+                        theta_values: Optional[list] = None,
+                        data_directory: Optional[str] = None) -> list:
+    """
+    Defining all the benchmarks
+
+    Args:
+        data_paths ... experiment data files, by their labels
+            - the first of them is the reference one (DATA.csv),
+              on which everything is measured
+        N_values ... numbers of elements for the forward simulation
+        theta_values ... thetas for the forward simulation
+        data_directory ... where to write the data of the analytical
+            solution (the accuracy of the elements is not compared
+            when not specified)
+    """
+
+    N_values = N_values or [20, 100, 500]
+    theta_values = theta_values or [0.5, 1.0]
+    reference_label, reference_path = next(iter(data_paths.items()))
+
+    cases = []
+    for N in N_values:
+        for theta in theta_values:
+            cases.append(BenchmarkCase(
+                "forward[N={},theta={},data={}]".format(N, theta, reference_label),
+                lambda N=N, theta=theta: _prepare_forward(reference_path, N, theta),
+                unit="step"))
+    # Longer data are showing how the simulation scales with the duration
+    for label, path in data_paths.items():
+        if label != reference_label:
+            cases.append(BenchmarkCase(
+                "forward[N=100,theta=0.5,data={}]".format(label),
+                lambda path=path: _prepare_forward(path, 100, 0.5),
+                unit="step"))
+
+    # The same accuracy should be reached with fewer quadratic elements
+    if data_directory is not None:
+        for element_order in [1, 2]:
+            cases.append(BenchmarkCase(
+                "equal_accuracy[elements=P{},error={:g}]".format(element_order, EQUAL_ACCURACY_ERROR),
+                lambda element_order=element_order: _prepare_equal_accuracy(
+                    os.path.join(data_directory, "slab-P{}.csv".format(element_order)),
+                    element_order, EQUAL_ACCURACY_ERROR),
+                unit="step"))
+
+    cases.append(BenchmarkCase(
+        "inverse[data={}]".format(reference_label),
+        lambda: _prepare_inverse(reference_path),
+        unit="flux"))
+
+    for label, path in data_paths.items():
+        cases.append(BenchmarkCase(
+            "csv_parse[data={}]".format(label),
+            lambda path=path: _prepare_data_loading(path, use_binary_cache=False),
+            unit="file"))
+        cases.append(BenchmarkCase(
+            "csv_binary[data={}]".format(label),
+            lambda path=path: _prepare_data_loading(path, use_binary_cache=True),
+            unit="file"))
+
+    for method in ["moving_avg", "savgol"]:
+        cases.append(BenchmarkCase(
+            "smoothing[method={},data={}]".format(method, reference_label),
+            lambda method=method: _prepare_smoothing(reference_path, method),
+            unit="call"))
+
+    if importlib.util.find_spec("matplotlib") is None:
+        print("matplotlib is not available, plots are not benchmarked")
+    else:
+        cases.append(BenchmarkCase(
+            "plot_refresh[data={}]".format(reference_label),
+            lambda: _prepare_plot_refresh(reference_path),
+            unit="refresh"))
+
+    return cases
+
+
+def measure(function: Callable,
+            operations: int = 1,
+            warmup: int = 1,
+            repetitions: int = 10) -> list:
+    """
+    Measuring the function repeatedly, returning the durations
+        of one operation (in seconds) in all the repetitions
+
+    Args:
+        function ... what to measure
+        operations ... how many operations is one call of the function
+        warmup ... how many times to call the function before measuring
+        repetitions ... how many times to measure the function
+    """
+
+    # The simulations are printing their results, which is not wanted here
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(warmup):
+            function()
+
+        samples = []
+        for _ in range(repetitions):
+            # Not letting the garbage from the previous call to be collected
+            #   inside the measurement
+            gc.collect()
+            start = time.perf_counter()
+            function()
+            samples.append((time.perf_counter() - start) / max(operations, 1))
+
+    return samples
+
+
+def get_statistics(samples: list, confidence: float = 0.95) -> dict:
+    """
+    Describing the measured durations, including the confidence
+        interval of their mean (Student's t-distribution)
+
+    Args:
+        samples ... measured durations of one operation
+        confidence ... confidence level of the interval
+    """
+
+    values = np.asarray(samples, dtype=float)
+    mean = float(np.mean(values))
+    if len(values) > 1:
+        standard_error = float(np.std(values, ddof=1)) / np.sqrt(len(values))
+        half_width = float(stats.t.ppf((1 + confidence) / 2, len(values) - 1)) * standard_error
+    else:
+        half_width = float("nan")
+
+    return {
+        "count": len(values),
+        "mean": mean,
+        "median": float(np.median(values)),
+        "min": float(np.min(values)),
+        "ci_low": mean - half_width,
+        "ci_high": mean + half_width,
+        "operations_per_second": 1 / mean if mean > 0 else float("inf"),
+    }
+
+
+def compare_with_baseline(baseline_samples: list,
+                          samples: list,
+                          alpha: float = 0.01,
+                          tolerance: float = 0.05) -> dict:
+    """
+    Deciding if the new samples are significantly slower than the baseline
+    The slowdown must be both statistically significant (not caused
+        by the noise) and bigger than the tolerance (not negligible)
+
+    Args:
+        baseline_samples ... durations measured in the baseline run
+        samples ... durations measured now
+        alpha ... significance level of the test
+        tolerance ... smallest relative slowdown worth reporting
+    """
+
+    ratio = float(np.median(samples) / np.median(baseline_samples))
+    try:
+        # Timing is not normally distributed (it has a long tail),
+        #   so the test is not assuming anything about the distribution
+        p_value = float(stats.mannwhitneyu(samples, baseline_samples,
+                                           alternative="greater").pvalue)
+    except ValueError:
+        # All the values are the same
+        p_value = 1.0
+
+    return {
+        "ratio": ratio,
+        "p_value": p_value,
+        "slower": p_value < alpha and ratio > 1 + tolerance,
+    }
+
+
+def load_history(history_path: str) -> list:
+    """
+    Reading all the previous runs
+
+    Args:
+        history_path ... where the history is stored
+    """
+
+    try:
+        with open(history_path) as history_file:
+            return json.load(history_file)
+    except (OSError, ValueError):
+        return []
+
+
+def find_baseline(history: list, name: str, machine: dict) -> Optional[dict]:
+    """
+    Finding the last run of the benchmark on the same machine
+
+    Args:
+        history ... all the previous runs
+        name ... name of the benchmark
+        machine ... description of the current machine
+    """
+
+    for run in reversed(history):
+        if run["machine"] == machine and name in run["results"]:
+            return run
+
+    return None
+
+
+def run_benchmarks(cases: list,
+                   history_path: str = DEFAULT_HISTORY_PATH,
+                   warmup: int = 1,
+                   repetitions: int = 10,
+                   save: bool = True,
+                   alpha: float = 0.01,
+                   tolerance: float = 0.05) -> dict:
+    """
+    Running all the benchmarks, comparing them with the baseline
+        and storing them in the history
+    Returns the whole run, including the comparisons
+
+    Args:
+        cases ... which benchmarks to run
+        history_path ... where the history is stored
+        warmup ... how many times to run each benchmark before measuring
+        repetitions ... how many times to measure each benchmark
+        save ... whether to add this run to the history
+        alpha ... significance level of the slowdown
+        tolerance ... smallest relative slowdown worth reporting
+    """
+
+    history = load_history(history_path)
+    machine = get_machine_description()
+    run: dict = {
+        "timestamp": int(time.time()),
+        "code_version": get_code_version(),
+        "machine": machine,
+        "load": get_system_load(),
+        "results": {},
+    }
+
+    for case in cases:
+        function, operations = case.prepare()
+        samples = measure(function, operations=operations,
+                          warmup=warmup, repetitions=repetitions)
+        result = {
+            "unit": case.unit,
+            "operations": operations,
+            "samples": samples,
+            "statistics": get_statistics(samples),
+        }
+
+        baseline = find_baseline(history, case.name, machine)
+        if baseline is not None:
+            result["comparison"] = {
+                "baseline_timestamp": baseline["timestamp"],
+                **compare_with_baseline(baseline["results"][case.name]["samples"], samples,
+                                        alpha=alpha, tolerance=tolerance),
+            }
+
+        run["results"][case.name] = result
+        print(format_result(case.name, result))
+
+    if save:
+        os.makedirs(os.path.dirname(history_path) or ".", exist_ok=True)
+        with open(history_path, "w") as history_file:
+            json.dump(history + [run], history_file, indent=1)
+
+    return run
+
+
+def format_result(name: str, result: dict) -> str:
+    """
+    Describing the result of one benchmark in one line
+
+    Args:
+        name ... name of the benchmark
+        result ... what was measured
+    """
+
+    statistics = result["statistics"]
+    line = "{:<50} {:>12.3f} us/{:<7} [{:.3f}, {:.3f}]  {:>12.1f} {}/s".format(
+        name, 1e6 * statistics["mean"], result["unit"], 1e6 * statistics["ci_low"],
+        1e6 * statistics["ci_high"], statistics["operations_per_second"], result["unit"])
+
+    comparison = result.get("comparison")
+    if comparison is not None:
+        line += "  {:+.1f}% (p={:.3g}){}".format(
+            100 * (comparison["ratio"] - 1), comparison["p_value"],
+            "  SLOWER" if comparison["slower"] else "")
+
+    return line
+
+
+def main(arguments: Optional[list] = None) -> int:
+    """
+    Command line interface of the benchmark suite
+    Returns the exit code - 1 when some benchmark got significantly slower
+
+    Args:
+        arguments ... command line arguments (sys.argv when not specified)
+    """
+
+    parser = argparse.ArgumentParser(description="Benchmarks of the simulations")
+    parser.add_argument("--filter", default="",
+                        help="run only the benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true",
+                        help="shorter synthetic data and fewer repetitions")
+    parser.add_argument("--repetitions", type=int, default=None,
+                        help="how many times to measure each benchmark")
+    parser.add_argument("--warmup", type=int, default=1,
+                        help="how many times to run each benchmark before measuring")
+    parser.add_argument("--sizes", type=int, nargs="*", default=None,
+                        help="lengths of the synthetic data")
+    parser.add_argument("--history", default=DEFAULT_HISTORY_PATH,
+                        help="where the history of the runs is stored")
+    parser.add_argument("--no-save", action="store_true",
+                        help="do not add this run to the history")
+    parser.add_argument("--alpha", type=float, default=0.01,
+                        help="significance level of the slowdown")
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="smallest relative slowdown worth reporting")
+    args = parser.parse_args(arguments)
+
+    sizes = args.sizes if args.sizes is not None else \
+        ([1000, 10000] if args.quick else DEFAULT_SYNTHETIC_SIZES)
+    repetitions = args.repetitions or (5 if args.quick else 10)
+
+    data_directory = tempfile.mkdtemp()
+    try:
+        data_paths = {"DATA": os.path.join(WORKING_DIRECTORY, "DATA.csv")}
+        for size in sizes:
+            path = os.path.join(data_directory, "synthetic-{}.csv".format(size))
+            create_synthetic_data(path, size)
+            data_paths["synthetic-{}".format(size)] = path
+
+        cases = [case for case in get_benchmark_cases(data_paths, data_directory=data_directory)
+                 if args.filter in case.name]
+        run = run_benchmarks(cases, history_path=args.history, warmup=args.warmup,
+                             repetitions=repetitions, save=not args.no_save,
+                             alpha=args.alpha, tolerance=args.tolerance)
+    finally:
+        shutil.rmtree(data_directory, ignore_errors=True)
+
+    slower = [name for name, result in run["results"].items()
+              if result.get("comparison", {}).get("slower")]
+    if slower:
+        print("Significantly slower: {}".format(", ".join(slower)))
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,391 @@
+"""
+This module is proposing the discretization of the simulation (number
+    of elements and time step) from the wanted accuracy of the temperature
+    at the place of interest, instead of choosing them by feel
+
+The errors are estimated by Richardson extrapolation from pilot runs
+    over the whole experiment (the errors are accumulating over time,
+    so a shorter part of the data would underestimate them):
+    - three runs with the number of elements N, 2N and 4N (the same small
+      time step) - the differences between them are only caused
+      by the mesh, and their ratio is giving the observed order
+      of convergence in space
+    - three runs with the time step dt, dt/2 and dt/4 (the same fine mesh)
+      - the same in time
+    The error of the coarsest run is then error = difference/(1 - 2^-order),
+    and it decreases as size^order - from which the coarsest mesh and
+    the largest time step achieving the wanted accuracy are determined
+    (each of them getting one half of the allowed error).
+The time step is never longer than the sampling period of the data, as the
+    heat flux is taken only in the time points of the simulation.
+The proposal is finally confirmed by one check run compared with
+    the finest pilot, and refined further when it is not accurate enough.
+
+Usage:
+    python heat_transfer_discretization.py --target-error 0.01
+"""
+
+import sys
+import math
+import argparse
+from typing import Optional
+
+import numpy as np  # type: ignore
+
+from NumericalForward import Simulation
+from NumericalOperators import Mesh
+from experiment_data_handler import Material, experiment_data_cache
+
+# How far the proposal can be coarser than the coarsest pilot run, where
+#   the extrapolation is no longer trustworthy
+MAX_COARSENING = 4
+
+# Observed orders below this mean the pilot runs are not in the asymptotic
+#   range, and the theoretical order is used instead
+MIN_TRUSTED_ORDER = 0.5
+
+# How many times the proposal can be refined, when the check run
+#   is not within the target error
+MAX_CHECK_REFINEMENTS = 4
+
+
+class DiscretizationPlan:
+    """
+    Class holding the proposed discretization together with the estimates
+        it was derived from
+    """
+
+    def __init__(self,
+                 N: int,
+                 dt: float,
+                 target_error: float,
+                 spatial_error: float,
+                 temporal_error: float,
+                 spatial_order: float,
+                 temporal_order: float,
+                 pilot_duration: float,
+                 checked_error: Optional[float] = None) -> None:
+        """
+        Args:
+            N ... proposed number of elements
+            dt ... proposed time step
+            target_error ... wanted accuracy at the place of interest
+            spatial_error ... estimated error caused by the mesh
+            temporal_error ... estimated error caused by the time step
+            spatial_order ... order of convergence used for the mesh
+            temporal_order ... order of convergence used for the time step
+            pilot_duration ... how long part of the data the pilots simulated
+            checked_error ... difference of the check run from the finest pilot
+                (plus the estimated error of the pilot)
+        """
+
+        self.N = N
+        self.dt = dt
+        self.target_error = target_error
+        self.spatial_error = spatial_error
+        self.temporal_error = temporal_error
+        self.spatial_order = spatial_order
+        self.temporal_order = temporal_order
+        self.pilot_duration = pilot_duration
+        self.checked_error = checked_error
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.N: {self.N},
+            self.dt: {self.dt},
+            self.target_error: {self.target_error},
+            self.spatial_error: {self.spatial_error},
+            self.temporal_error: {self.temporal_error},
+            self.spatial_order: {self.spatial_order},
+            self.temporal_order: {self.temporal_order},
+            self.pilot_duration: {self.pilot_duration},
+            self.checked_error: {self.checked_error},
+            """
+
+    @property
+    def estimated_error(self) -> float:
+        """
+        Estimated total error of the proposed discretization
+        """
+
+        return self.spatial_error + self.temporal_error
+
+    def to_dict(self) -> dict:
+        """
+        Describing the plan by plain values (for JSON)
+        """
+
+        return {
+            "number_of_elements": self.N,
+            "dt": self.dt,
+            "target_error": self.target_error,
+            "estimated_error": self.estimated_error,
+            "spatial_error": self.spatial_error,
+            "temporal_error": self.temporal_error,
+            "spatial_order": self.spatial_order,
+            "temporal_order": self.temporal_order,
+            "pilot_duration": self.pilot_duration,
+            "checked_error": self.checked_error,
+        }
+
+
+def _run_pilot(Sim: Simulation, pilot_end: float, **changed_params):
+    """
+    Running the simulation only until the end of the pilot, returning
+        the time points and the temperatures at the place of interest
+
+    Args:
+        Sim ... simulation to run
+        pilot_end ... time of the data (not from the start of the simulation),
+                      at which the pilot is finished
+        changed_params ... discretization of this pilot (N, dt)
+    """
+
+    Sim.reconfigure(**changed_params)
+    # Current time is counted from the start, data can start later
+    while not Sim.simulation_has_finished and Sim.t[Sim.current_step_idx] < pilot_end:
+        Sim.evaluate_one_step()
+
+    last_idx = Sim.current_step_idx + 1
+    return Sim.t[:last_idx], np.asarray(Sim.T_x0[:last_idx])
+
+
+def estimate_error(coarse, medium, fine, *, theoretical_order: float):
+    """
+    Estimating the order of convergence and the error of the coarsest
+        solution from three solutions, each refined twice from the previous
+        Returns (order, error of the coarse solution)
+
+    Args:
+        coarse ... solution with the biggest element/time step
+        medium ... solution with the half of it
+        fine ... solution with the quarter of it
+        theoretical_order ... order to use when the observed one is not reliable
+    """
+
+    coarse_difference = float(np.max(np.abs(coarse - medium)))
+    fine_difference = float(np.max(np.abs(medium - fine)))
+
+    # Never assuming faster convergence than the theory allows, as that
+    #   would lead to too coarse discretization
+    order = theoretical_order
+    if coarse_difference > 0 and fine_difference > 0:
+        observed_order = math.log2(coarse_difference / fine_difference)
+        if observed_order >= MIN_TRUSTED_ORDER:
+            order = min(observed_order, theoretical_order)
+
+    return order, coarse_difference / (1 - 2**-order)
+
+
+def plan_discretization(material: Material,
+                        length: float,
+                        x0: float,
+                        robin_alpha: float,
+                        theta: float = 0.5,
+                        experiment_data_path: str = "DATA.csv",
+                        target_error: float = 0.01,
+                        pilot_duration: Optional[float] = None,
+                        pilot_N: int = 10,
+                        pilot_dt: Optional[float] = None,
+                        mesh: Optional[Mesh] = None,
+                        layers: Optional[list] = None,
+                        emissivity: float = 0.0) -> DiscretizationPlan:
+    """
+    Proposing the coarsest mesh and the largest time step, with which
+        the temperature at the place of interest should be within
+        the target error
+
+    Args:
+        material ... object containing material properties
+        length ... how long is the object
+        x0 ... where is the place of our interest in the object
+        robin_alpha ... coefficient of heat convection
+        theta ... defining the explicitness/implicitness of the simulation
+        experiment_data_path ... from where the data should be taken
+        target_error ... wanted accuracy at the place of interest (in degrees)
+        pilot_duration ... how long part of the data to simulate in the pilots
+            (the whole experiment when not specified)
+        pilot_N ... number of elements of the coarsest spatial pilot
+        pilot_dt ... time step of the coarsest temporal pilot
+            (sampling period of the data when not specified)
+        mesh ... distribution of the nodes and the elements (uniform linear
+            when not specified)
+        layers ... layers of the composite object (homogeneous when not specified)
+        emissivity ... emissivity of the far side radiating into the ambient
+    """
+
+    Exp_data = experiment_data_cache.get(experiment_data_path)
+    data_duration = Exp_data.t_data[-1] - Exp_data.t_data[0]
+    if pilot_duration is None:
+        pilot_duration = float(data_duration)
+    # Heat flux is taken only in the time points of the simulation, so the longer
+    #   time step would be skipping the changes of the data
+    sample_period = float(np.median(np.diff(Exp_data.t_data))) if len(Exp_data.t_data) > 1 else data_duration
+    if pilot_dt is None:
+        pilot_dt = min(sample_period, pilot_duration / 32)
+    pilot_end = Exp_data.t_data[0] + pilot_duration
+
+    Sim = Simulation(N=pilot_N, dt=pilot_dt, theta=theta, robin_alpha=robin_alpha,
+                     x0=x0, length=length, material=material,
+                     experiment_data_path=experiment_data_path,
+                     mesh=mesh, layers=layers, emissivity=emissivity)
+
+    # Refining the mesh with the finest time step - the differences
+    #   between the runs are caused only by the mesh
+    spatial_runs = [_run_pilot(Sim, pilot_end, N=pilot_N * refinement, dt=pilot_dt / 4)
+                    for refinement in [1, 2, 4]]
+    # Probe temperature is converging one order faster than the element order
+    theoretical_spatial_order = Sim.mesh.element_order + 1
+    spatial_order, coarse_spatial_error = estimate_error(*[T_x0 for _, T_x0 in spatial_runs],
+                                                         theoretical_order=theoretical_spatial_order)
+
+    # Refining the time step on the finest mesh, comparing the runs
+    #   at the time points of the coarsest one
+    temporal_runs = [_run_pilot(Sim, pilot_end, N=pilot_N * 4, dt=pilot_dt / refinement)
+                     for refinement in [1, 2, 4]]
+    coarse_times = temporal_runs[0][0]
+    temporal_runs = [np.interp(coarse_times, t, T_x0) for t, T_x0 in temporal_runs]
+    theoretical_temporal_order = 2 if theta == 0.5 else 1
+    temporal_order, coarse_temporal_error = estimate_error(*temporal_runs,
+                                                           theoretical_order=theoretical_temporal_order)
+
+    # Each of the errors can take one half of the target
+    allowed_error = target_error / 2
+    if coarse_spatial_error > 0:
+        N = math.ceil(pilot_N * (coarse_spatial_error / allowed_error)**(1 / spatial_order))
+    else:
+        N = 0
+    N = max(N, math.ceil(pilot_N / MAX_COARSENING), 2, len(layers or []))
+    if coarse_temporal_error > 0:
+        dt = pilot_dt * (allowed_error / coarse_temporal_error)**(1 / temporal_order)
+    else:
+        dt = math.inf
+    dt = min(dt, pilot_dt * MAX_COARSENING, sample_period)
+    dt = _round_time_step(dt)
+
+    def get_spatial_error(N):
+        return coarse_spatial_error * (pilot_N / N)**spatial_order
+
+    def get_temporal_error(dt):
+        return coarse_temporal_error * (dt / pilot_dt)**temporal_order
+
+    # Confirming the proposal by comparing it with the finest pilot (or with
+    #   even finer run, when the proposal is finer than the pilots)
+    reference_times, reference_T_x0 = spatial_runs[-1]
+    if N > pilot_N * 4 or dt < pilot_dt / 4:
+        reference_N, reference_dt = max(pilot_N * 4, 2 * N), min(pilot_dt / 4, dt / 2)
+        reference_times, reference_T_x0 = _run_pilot(Sim, pilot_end, N=reference_N, dt=reference_dt)
+    else:
+        reference_N, reference_dt = pilot_N * 4, pilot_dt / 4
+    reference_error = get_spatial_error(reference_N) + get_temporal_error(reference_dt)
+
+    for _ in range(MAX_CHECK_REFINEMENTS + 1):
+        times, T_x0 = _run_pilot(Sim, pilot_end, N=N, dt=dt)
+        checked_error = reference_error + float(np.max(np.abs(
+            T_x0 - np.interp(times, reference_times, reference_T_x0))))
+        # Not refining beyond the reference, which would not be able to tell
+        if checked_error <= target_error or N * 2 > reference_N or dt / 2 < reference_dt:
+            break
+        N *= 2
+        dt = _round_time_step(dt / 2)
+
+    return DiscretizationPlan(
+        N=N,
+        dt=dt,
+        target_error=target_error,
+        spatial_error=get_spatial_error(N),
+        temporal_error=get_temporal_error(dt),
+        spatial_order=spatial_order,
+        temporal_order=temporal_order,
+        pilot_duration=pilot_duration,
+        checked_error=checked_error)
+
+
+def _round_time_step(dt: float) -> float:
+    """
+    Rounding the time step down to three significant digits
+
+    Args:
+        dt ... time step to round
+    """
+
+    rounding_step = 10**(math.floor(math.log10(dt)) - 2)
+    return float("{:.3g}".format(math.floor(dt / rounding_step) * rounding_step))
+
+
+def plan_from_parameters(parameters: dict, target_error: float) -> DiscretizationPlan:
+    """
+    Proposing the discretization for the parameters of simulation
+        (as used by the GUI and the simulation drivers) - with the same
+        material, mesh, layers and boundary as the simulation would have
+
+    Args:
+        parameters ... all defined parameters of simulation
+        target_error ... wanted accuracy at the place of interest (in degrees)
+    """
+
+    # Imported here, as the simulation driver is not needed otherwise
+    from heat_transfer_simulation import get_simulation_arguments
+
+    simulation_arguments = get_simulation_arguments({"number_of_elements": 10, "dt": 1.0,
+                                                     "theta": 0.5, **parameters})
+    return plan_discretization(material=simulation_arguments["material"],
+                               length=simulation_arguments["length"],
+                               x0=simulation_arguments["x0"],
+                               robin_alpha=simulation_arguments["robin_alpha"],
+                               theta=simulation_arguments["theta"],
+                               experiment_data_path=simulation_arguments["experiment_data_path"],
+                               target_error=target_error,
+                               mesh=simulation_arguments["mesh"],
+                               layers=simulation_arguments["layers"],
+                               emissivity=simulation_arguments["emissivity"])
+
+
+def main(arguments: Optional[list] = None) -> int:
+    """
+    Command line interface of the planner
+
+    Args:
+        arguments ... command line arguments (sys.argv when not specified)
+    """
+
+    parser = argparse.ArgumentParser(description="Proposing the discretization from the wanted accuracy")
+    parser.add_argument("--target-error", type=float, default=0.01,
+                        help="wanted accuracy at the place of interest (in degrees)")
+    parser.add_argument("--data", default="DATA.csv",
+                        help="experiment data file")
+    parser.add_argument("--rho", type=float, default=7850, help="mass density")
+    parser.add_argument("--cp", type=float, default=520, help="specific heat capacity")
+    parser.add_argument("--lmbd", type=float, default=50, help="heat conductivity")
+    parser.add_argument("--length", type=float, default=0.01, help="length of the object")
+    parser.add_argument("--x0", type=float, default=0.0045, help="place of interest")
+    parser.add_argument("--robin-alpha", type=float, default=13.5, help="coefficient of heat convection")
+    parser.add_argument("--theta", type=float, default=0.5, help="explicitness/implicitness")
+    parser.add_argument("--pilot-duration", type=float, default=None,
+                        help="how long part of the data to simulate in the pilots")
+    args = parser.parse_args(arguments)
+
+    plan = plan_discretization(material=Material(args.rho, args.cp, args.lmbd),
+                               length=args.length, x0=args.x0, robin_alpha=args.robin_alpha,
+                               theta=args.theta, experiment_data_path=args.data,
+                               target_error=args.target_error, pilot_duration=args.pilot_duration)
+
+    print("Proposed discretization: number_of_elements={}, dt={}".format(plan.N, plan.dt))
+    print("Estimated error: {:.3g} (mesh {:.3g}, time step {:.3g}), target {}".format(
+        plan.estimated_error, plan.spatial_error, plan.temporal_error, plan.target_error))
+    print("Orders of convergence: space {:.2f}, time {:.2f} (pilots on the first {:g} s)".format(
+        plan.spatial_order, plan.temporal_order, plan.pilot_duration))
+    if plan.checked_error is not None:
+        print("Difference of the check run from the finest pilot: {:.3g}".format(plan.checked_error))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -10,20 +10,21 @@ import sys
 import time
 import threading
 import queue
+import multiprocessing
+from typing import Optional
 
 from PyQt5.QtGui import QFont, QDoubleValidator  # type: ignore
 from PyQt5.QtCore import QThreadPool, Qt  # type: ignore
 from PyQt5.QtWidgets import (QFileDialog, QHBoxLayout, QVBoxLayout, QCheckBox,  # type: ignore
     QLabel, QLineEdit, QPushButton, QGroupBox, QRadioButton, QComboBox, QMessageBox,
-    QFormLayout, QDialogButtonBox, QApplication, QDialog, QMainWindow)
+    QFormLayout, QDialogButtonBox, QApplication, QDialog, QMainWindow, QInputDialog)
 
 # Importing the basic layout of the main window
 from heat_transfer_gui_window import Ui_MainWindow
 
-import heat_transfer_simulation
-import heat_transfer_simulation_inverse
-
 from heat_transfer_workers import Worker
+from heat_transfer_worker_pool import get_worker_pool
+from heat_transfer_discretization import plan_from_parameters
 
 from heat_transfer_plot_temperature import TemperaturePlotCanvas
 from heat_transfer_plot_heatflux import HeatFluxPlotCanvas
@@ -43,6 +44,10 @@ class HeatTransferWindow(QMainWindow, Ui_MainWindow):  # type: ignore
         super().__init__()
         self.setupUi(self)
         self.setWindowTitle("Heat transfer")
+        self.add_profiling_menu()
+        self.add_discretization_menu()
+        self.add_temperature_dependence_menu()
+        self.add_phase_change_menu()
 
         # Instantiating the user input services
         self.user_input_service_classic = UserInputServiceClassic()
@@ -118,6 +123,13 @@ class HeatTransferWindow(QMainWindow, Ui_MainWindow):  # type: ignore
 
         self.queue = queue.Queue()
 
+        # Starting the worker processes in the background already now,
+        #   so that even the first simulation does not wait for them
+        #   (and the data file is loaded in them in advance)
+        self.worker_pool = get_worker_pool()
+        self.worker_pool.preload_paths.append(self.current_data_file)
+        threading.Thread(target=self.worker_pool.warm_up, daemon=True).start()
+
         self.button_run_3.pressed.connect(lambda: self.run_simulation())
         self.button_pause_3.pressed.connect(lambda: self.pause_simulation())
         self.button_stop_3.pressed.connect(lambda: self.stop_simulation())
@@ -273,6 +285,139 @@ class HeatTransferWindow(QMainWindow, Ui_MainWindow):  # type: ignore
 
         parent_layout.addLayout(self.saving_choice_layout)
 
+    def add_profiling_menu(self) -> None:
+        """
+        Including the menu with the switch for profiling the simulation
+        """
+
+        self.tools_menu = self.menubar.addMenu("Tools")
+        self.profile_action = self.tools_menu.addAction("Profile simulation")
+        self.profile_action.setCheckable(True)
+
+    def add_discretization_menu(self) -> None:
+        """
+        Including the menu item proposing the discretization
+            from the wanted accuracy
+        """
+
+        planner_action = self.tools_menu.addAction("Propose discretization...")
+        planner_action.triggered.connect(self.propose_discretization)
+
+    def add_temperature_dependence_menu(self) -> None:
+        """
+        Including the switch for using the temperature dependent material
+            properties (for the materials that are having them)
+        """
+
+        self.temperature_dependence_action = self.tools_menu.addAction("Temperature dependent properties")
+        self.temperature_dependence_action.setCheckable(True)
+
+    def add_phase_change_menu(self) -> None:
+        """
+        Including the switch for modelling the melting and solidification
+            (for the materials that are having the latent heat)
+        The material cannot be both temperature dependent and melting,
+            so switching on one of them is switching off the other
+        """
+
+        self.phase_change_action = self.tools_menu.addAction("Phase change (melting)")
+        self.phase_change_action.setCheckable(True)
+
+        self.phase_change_action.toggled.connect(
+            lambda checked: self.switch_off_other_material_model(
+                checked, self.phase_change_action, self.temperature_dependence_action))
+        self.temperature_dependence_action.toggled.connect(
+            lambda checked: self.switch_off_other_material_model(
+                checked, self.temperature_dependence_action, self.phase_change_action))
+
+    def switch_off_other_material_model(self, checked: bool, action, other_action) -> None:
+        """
+        Unchecking the other material model (temperature dependence
+            or phase change), when one of them was switched on
+
+        Args:
+            checked ... whether the model was switched on
+            action ... switch of the model
+            other_action ... switch of the other model
+        """
+
+        if checked and other_action.isChecked():
+            other_action.setChecked(False)
+            self.show_message_to_user("{} cannot be used together with {}, it was switched off".format(
+                other_action.text(), action.text()))
+
+    def get_material_parameters(self, material_name: str) -> dict:
+        """
+        Describing the material for the simulation - its properties, and
+            their temperature dependence or phase change when they are
+            switched on (and the material is having them)
+
+        Args:
+            material_name ... which material was chosen
+        """
+
+        material_properties = self.material_service.materials_properties_dict[material_name]
+        parameters = {
+            "rho": material_properties["rho"],
+            "cp": material_properties["cp"],
+            "lmbd": material_properties["lmbd"],
+        }
+        if self.temperature_dependence_action.isChecked():
+            temperature_table = self.material_service.materials_temperature_tables.get(material_name)
+            if temperature_table is None:
+                print("{} does not have temperature dependent properties".format(material_name))
+            else:
+                parameters["temperature_table"] = temperature_table
+        if self.phase_change_action.isChecked():
+            if material_properties.get("T_melt") is None or not material_properties.get("latent_heat"):
+                print("{} does not have the melting temperature and latent heat".format(material_name))
+            else:
+                parameters["phase_change"] = {
+                    "melting_temperature": material_properties["T_melt"],
+                    "latent_heat": material_properties["latent_heat"],
+                }
+
+        return parameters
+
+    def propose_discretization(self) -> None:
+        """
+        Asking the user for the wanted accuracy and filling the number
+            of elements and the simulation step, which should achieve it
+            with the lowest cost
+        """
+
+        if self.simulation_state in ["running", "paused"]:
+            self.show_message_to_user("Discretization cannot be changed during the simulation")
+            return
+
+        target_error, ok = QInputDialog.getDouble(
+            self, "Propose discretization",
+            "Wanted accuracy of the temperature at the place of interest [C]:",
+            0.01, 1e-6, 100, 6)
+        if not ok:
+            return
+
+        # Getting the same parameters as the simulation would get
+        parameters = self.get_numbers_from_the_user_input()
+        parameters.update(self.get_material_parameters(self.material_combo_box.currentText()))
+        parameters["experiment_data_path"] = self.current_data_file
+
+        try:
+            plan = plan_from_parameters(parameters, target_error)
+        except Exception as e:
+            self.show_error_dialog_to_user("ERROR: Discretization could not be proposed: {}".format(e))
+            return
+
+        proposed_values = {"number_of_elements": plan.N, "dt": plan.dt}
+        for element in self.get_current_input_service().number_parameters_to_get_from_user:
+            if element["variable_name"] in proposed_values:
+                value = proposed_values[element["variable_name"]] / element["multiplicate_to_SI"]
+                getattr(self, element["input_name"]).setText(str(value).replace(".", ","))
+
+        self.show_message_to_user(
+            "Proposed {} elements and simulation step {} s (estimated error {:.3g} C)".format(
+                plan.N, plan.dt, plan.estimated_error))
+
     def add_data_file_choices(self, parent_layout) -> None:
         """
         Including the checkboxes for user to choose if to save data or not
@@ -383,7 +528,7 @@ class HeatTransferWindow(QMainWindow, Ui_MainWindow):  # type: ignore
 
     def add_algorithm_choice(self,
                              parent_layout,
-                             specified_algorithm: str = None) -> None:
+                             specified_algorithm: Optional[str] = None) -> None:
         """
         Including the radio buttons for user to choose the algorithm
 
@@ -658,13 +803,9 @@ class HeatTransferWindow(QMainWindow, Ui_MainWindow):  # type: ignore
 
         # Getting current material from GUI and it's peoperties from the service
         self.chosen_material = self.material_combo_box.currentText()
-        current_material_properties = self.material_service.materials_properties_dict[self.chosen_material]
-
         # Getting all other user input for the simulation
         parameters = self.get_numbers_from_the_user_input()
-        parameters["rho"] = current_material_properties["rho"]
-        parameters["cp"] = current_material_properties["cp"]
-        parameters["lmbd"] = current_material_properties["lmbd"]
+        parameters.update(self.get_material_parameters(self.chosen_material))
         parameters["experiment_data_path"] = self.current_data_file
 
         # Disabling the user from modifying inputs
@@ -686,17 +827,20 @@ class HeatTransferWindow(QMainWindow, Ui_MainWindow):  # type: ignore
             "queue": self.queue,
             "parameters": parameters,
             "save_results": self.save_data_checkbox.isChecked(),
+            "profile": self.profile_action.isChecked(),
         }
 
-        # Running the specific simulation
+        # Running the specific simulation in the warm worker processes
+        # Classic simulation can be taken from the cache of already finished
+        #   ones, as it is not waiting for any further user input at its end
         if self.get_current_algorithm() == "classic":
             print("classic")
-            worker = Worker(heat_transfer_simulation.simulate_from_gui,
-                            common_arguments_to_workers)
+            worker = Worker(self.worker_pool.run_from_gui,
+                            {**common_arguments_to_workers, "algorithm": "classic", "use_cache": True})
         elif self.get_current_algorithm() == "inverse":
             print("inverse")
-            worker = Worker(heat_transfer_simulation_inverse.simulate_from_gui,
-                            common_arguments_to_workers)
+            worker = Worker(self.worker_pool.run_from_gui,
+                            {**common_arguments_to_workers, "algorithm": "inverse"})
 
         # Opening some additional communication channels with the workers
         worker.signals.result.connect(self.process_output)
@@ -787,6 +931,9 @@ class HeatTransferWindow(QMainWindow, Ui_MainWindow):  # type: ignore
         """
 
         print(returned_object)
+        if "profile" in returned_object:
+            self.show_message_to_user("Profile saved into {}".format(
+                returned_object["profile"]["pstats"]))
         # TODO: create a function to change this error, and to colour it accordingly
         self.update_error_label(returned_object["error_value"])
 
@@ -893,6 +1040,9 @@ def resource_path(relative_path):
 
 
 if __name__ == "__main__":
+    # Worker processes must not start the GUI again in the bundled .exe
+    multiprocessing.freeze_support()
+
     # Necessary stuff for errors and exceptions to be thrown
     # Without this, the app just dies and says nothing
     sys._excepthook = sys.excepthook  # type: ignore
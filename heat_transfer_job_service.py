@@ -0,0 +1,609 @@
+"""
+This module is defining the local HTTP service, through which other
+    programs can submit the simulations and follow their progress
+
+The service is listening only on the local machine and needs nothing
+    from the internet. The simulations are run in the warm worker pool
+    (heat_transfer_worker_pool.py), at most one per worker process, and
+    the waiting ones are started according to their priority.
+Identical simulations (the same algorithm, parameters, experiment data
+    and code version) are not run twice - the submission of an already
+    known job returns its id, and the finished results are taken from
+    the results cache (heat_transfer_results_cache.py).
+
+Endpoints (all the data are JSON):
+    POST /jobs ... submitting the job
+        - {"algorithm": "classic", "parameters": {...}, "priority": 0}
+        - returns {"id": ..., "deduplicated": ...}
+    GET /jobs ... state of all the jobs
+    GET /jobs/<id> ... state and result of the job
+    GET /jobs/<id>/events?since=0&timeout=30 ... long-polling of the events
+        (progress, running/paused, finished), waiting for the new ones
+    GET /jobs/<id>/stream ... the same events as server-sent events
+    POST /jobs/<id>/<command> ... sending pause, continue or stop to the job
+
+The submissions must have the application/json content type and must not
+    come from the web pages of other origins (which the browsers are allowed
+    to send to the local machine). The experiment data can be only read from
+    the data directory of the service, and the output files are not
+    chosen by the clients.
+
+Usage:
+    python heat_transfer_job_service.py --port 50009 --workers 4
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import queue as queue_module
+import argparse
+import itertools
+import threading
+import ipaddress
+from typing import Optional
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from heat_transfer_worker_pool import WarmWorkerPool, SIMULATION_MODULES
+from heat_transfer_results_cache import SimulationResultsCache
+
+# Where the service is listening by default
+DEFAULT_ADDRESS = ("127.0.0.1", 50009)
+
+# States of the jobs, after which nothing more happens
+FINAL_STATES = ["finished", "failed", "stopped"]
+
+# Parameters, which would let the clients choose where the files are written
+FORBIDDEN_PARAMETERS = ["streaming_result_path"]
+
+
+class JobSubmissionError(Exception):
+    """
+    Used when the submitted job cannot be accepted
+    """
+
+
+class Job:
+    """
+    Class holding everything known about one submitted simulation
+    """
+
+    def __init__(self,
+                 job_id: str,
+                 algorithm: str,
+                 parameters: dict,
+                 priority: int,
+                 key: str) -> None:
+        """
+        Args:
+            job_id ... identifier of the job for the clients
+            algorithm ... which simulation to run (classic, inverse)
+            parameters ... all defined parameters of simulation
+            priority ... jobs with higher priority are started first
+            key ... identifier of the simulation in the results cache
+        """
+
+        self.job_id = job_id
+        self.algorithm = algorithm
+        self.parameters = parameters
+        self.priority = priority
+        self.key = key
+        self.state = "queued"
+        self.result = None
+        self.error = None
+        self.stop_requested = False
+        self.submit_time = time.time()
+        # Everything that happened with the job, for the clients following it
+        self.events: list = []
+        # Commands for the running simulation (pause, continue, stop)
+        self.commands: queue_module.Queue = queue_module.Queue()
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.job_id: {self.job_id},
+            self.algorithm: {self.algorithm},
+            self.priority: {self.priority},
+            self.state: {self.state},
+            """
+
+    def get_status(self) -> dict:
+        """
+        Summarizing the job for the clients
+        """
+
+        return {
+            "id": self.job_id,
+            "algorithm": self.algorithm,
+            "priority": self.priority,
+            "state": self.state,
+            "result": self.result,
+            "error": self.error,
+            "submit_time": self.submit_time,
+            "number_of_events": len(self.events),
+        }
+
+
+class JobProgress:
+    """
+    Class standing in for the plots of the GUI, turning what the simulation
+        reports into the events of the job
+    The simulated time is taken from the temperature plot, which is
+        plotted every callback_period of simulation time
+    NOTE: it is not the progress callback of the GUI on purpose - the inverse
+        simulation would be then waiting for the interactive smoothing
+        (and would not be taken from the cache)
+    """
+
+    def __init__(self, service, job: Job) -> None:
+        """
+        Args:
+            service ... service to which the job belongs
+            job ... job whose simulation is reporting
+        """
+
+        self.service = service
+        self.job = job
+
+    def plot(self, x_values=None, y_values=None,
+             x_experiment_values=None, y_experiment_values=None) -> None:
+        if not x_values or not x_experiment_values:
+            return
+        total_time = x_experiment_values[-1] - x_experiment_values[0]
+        simulated_time = x_values[-1] - x_experiment_values[0]
+        fraction = 1.0 if total_time <= 0 else min(1.0, simulated_time / total_time)
+        self.service._add_event(self.job, {"type": "progress", "value": round(fraction, 4)})
+
+
+class JobService:
+    """
+    Class holding the jobs, the queue of the waiting ones and the workers
+    """
+
+    def __init__(self,
+                 max_workers: Optional[int] = None,
+                 max_queued_jobs: int = 100,
+                 preload_paths: Optional[list] = None,
+                 results_cache: Optional[SimulationResultsCache] = None,
+                 data_directory: Optional[str] = None) -> None:
+        """
+        Args:
+            max_workers ... how many simulations to run at once
+                            (number of processor cores when not specified)
+            max_queued_jobs ... how many jobs can wait before new
+                                submissions are refused
+            preload_paths ... experiment data files to load in advance
+            results_cache ... identifying the identical simulations
+                (the workers are always using the default results cache)
+            data_directory ... only experiment data from this directory
+                               can be used (current directory by default)
+        """
+
+        self.pool = WarmWorkerPool(max_workers=max_workers, preload_paths=preload_paths)
+        self.data_directory = os.path.realpath(data_directory or os.getcwd())
+        self.max_queued_jobs = max_queued_jobs
+        self.results_cache = results_cache or SimulationResultsCache()
+
+        self.jobs: dict = {}
+        # The newest job for each simulation, to which the identical ones are led
+        self.jobs_by_key: dict = {}
+        # Waiting jobs ordered by (-priority, submission order)
+        self.waiting_jobs: queue_module.PriorityQueue = queue_module.PriorityQueue()
+        self.job_counter = itertools.count(1)
+        # Guarding the jobs and waking up the clients waiting for events
+        self.condition = threading.Condition()
+
+        # One dispatcher for each worker process, so that the pool
+        #   is never running more simulations than it has processes
+        self.dispatchers = [threading.Thread(target=self._dispatch, daemon=True)
+                            for _ in range(self.pool.max_workers)]
+        for dispatcher in self.dispatchers:
+            dispatcher.start()
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.pool: {self.pool},
+            self.max_queued_jobs: {self.max_queued_jobs},
+            self.jobs: {len(self.jobs)},
+            """
+
+    def submit(self, algorithm: str, parameters: dict, priority: int = 0) -> tuple:
+        """
+        Accepting the job, returning its id and whether it is
+            the same as an already submitted one
+
+        Args:
+            algorithm ... which simulation to run (classic, inverse)
+            parameters ... all defined parameters of simulation
+            priority ... jobs with higher priority are started first
+        """
+
+        if algorithm not in SIMULATION_MODULES:
+            raise JobSubmissionError("Unknown algorithm: {}".format(algorithm))
+        if not isinstance(parameters, dict) or "experiment_data_path" not in parameters:
+            raise JobSubmissionError("Parameters with experiment_data_path are needed")
+        parameters = self._check_paths(parameters)
+        try:
+            key = self.results_cache.get_key(algorithm=algorithm, parameters=parameters)
+        except (OSError, TypeError, ValueError) as e:
+            raise JobSubmissionError("Job cannot be identified: {}".format(e))
+
+        with self.condition:
+            # Stopped or failed jobs can be tried again
+            known_job = self.jobs.get(self.jobs_by_key.get(key))
+            if known_job is not None and known_job.state not in ["failed", "stopped"]:
+                return known_job.job_id, True
+
+            number_of_queued = sum(job.state == "queued" for job in self.jobs.values())
+            if number_of_queued >= self.max_queued_jobs:
+                raise JobSubmissionError("Too many jobs are waiting")
+
+            sequence = next(self.job_counter)
+            job = Job(job_id=str(sequence), algorithm=algorithm, parameters=parameters,
+                      priority=int(priority), key=key)
+            self.jobs[job.job_id] = job
+            self.jobs_by_key[key] = job.job_id
+            self._add_event(job, {"type": "state", "value": "queued"})
+            self.waiting_jobs.put((-job.priority, sequence, job.job_id))
+
+        return job.job_id, False
+
+    def send_command(self, job_id: str, command: str) -> None:
+        """
+        Passing the command to the job - the waiting job is only
+            taken out of the queue when stopped
+
+        Args:
+            job_id ... identifier of the job
+            command ... pause, continue or stop
+        """
+
+        if command not in ["pause", "continue", "stop"]:
+            raise JobSubmissionError("Unknown command: {}".format(command))
+
+        with self.condition:
+            job = self.jobs[job_id]
+            if job.state == "queued" and command == "stop":
+                job.state = "stopped"
+                self._add_event(job, {"type": "stopped", "result": None})
+            elif job.state == "running":
+                if command == "stop":
+                    job.stop_requested = True
+                else:
+                    self._add_event(job, {"type": "state",
+                                          "value": "paused" if command == "pause" else "running"})
+                job.commands.put(command)
+
+    def get_events(self, job_id: str, since: int = 0, timeout: float = 0.0) -> list:
+        """
+        Returning the events of the job from the given index, waiting
+            for them at most timeout seconds when there are none yet
+
+        Args:
+            job_id ... identifier of the job
+            since ... how many events the client has already seen
+            timeout ... how long to wait for the new events (in seconds)
+        """
+
+        with self.condition:
+            job = self.jobs[job_id]
+            self.condition.wait_for(
+                lambda: len(job.events) > since or job.state in FINAL_STATES,
+                timeout=timeout)
+            return job.events[since:]
+
+    def shutdown(self) -> None:
+        """
+        Stopping the dispatchers and the worker processes
+            (running simulations are finished first)
+        """
+
+        # Stop signals come before all the waiting jobs
+        for _ in self.dispatchers:
+            self.waiting_jobs.put((float("-inf"), 0, None))
+        for dispatcher in self.dispatchers:
+            dispatcher.join()
+        self.pool.shutdown()
+
+    def _check_paths(self, parameters: dict) -> dict:
+        """
+        Making sure the job is reading only the experiment data from
+            the data directory and is not choosing its output files,
+            returning the parameters with the full experiment data path
+
+        Args:
+            parameters ... all defined parameters of simulation
+        """
+
+        for parameter in FORBIDDEN_PARAMETERS:
+            if parameter in parameters:
+                raise JobSubmissionError("Parameter {} cannot be submitted".format(parameter))
+
+        data_path = parameters["experiment_data_path"]
+        if not isinstance(data_path, str):
+            raise JobSubmissionError("experiment_data_path must be a string")
+        data_path = os.path.realpath(os.path.join(self.data_directory, data_path))
+        if os.path.commonpath([data_path, self.data_directory]) != self.data_directory:
+            raise JobSubmissionError("Experiment data must be in {}".format(self.data_directory))
+
+        return {**parameters, "experiment_data_path": data_path}
+
+    def _add_event(self, job: Job, event: dict) -> None:
+        """
+        Recording the event of the job and waking up the waiting clients
+
+        Args:
+            job ... which job the event belongs to
+            event ... what has happened
+        """
+
+        with self.condition:
+            job.events.append({**event, "index": len(job.events), "time": time.time()})
+            self.condition.notify_all()
+
+    def _dispatch(self) -> None:
+        """
+        Taking the waiting jobs one by one and running them in the pool
+        """
+
+        while True:
+            _, _, job_id = self.waiting_jobs.get()
+            if job_id is None:
+                return
+
+            with self.condition:
+                job = self.jobs[job_id]
+                # Jobs stopped while waiting are just forgotten
+                if job.state != "queued":
+                    continue
+                job.state = "running"
+
+            progress = JobProgress(self, job)
+            try:
+                result = self.pool.run(job.algorithm, job.parameters,
+                                       temperature_plot=progress, heat_flux_plot=progress,
+                                       queue=job.commands, use_cache=True)
+            except Exception as e:
+                with self.condition:
+                    job.state = "failed"
+                    job.error = "{}: {}".format(type(e).__name__, e)
+                    self._add_event(job, {"type": "failed", "error": job.error})
+                continue
+
+            with self.condition:
+                job.state = "stopped" if job.stop_requested else "finished"
+                # Numpy numbers are not serializable by default
+                job.result = json.loads(json.dumps(result, default=float))
+                self._add_event(job, {"type": job.state, "result": job.result})
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """
+    Class translating the HTTP requests into the calls of the JobService
+    """
+
+    # Set by create_server()
+    service: JobService = None  # type: ignore
+
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        path_parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+
+        if path_parts == ["jobs"]:
+            with self.service.condition:
+                statuses = [job.get_status() for job in self.service.jobs.values()]
+            return self._send_json(200, statuses)
+
+        if len(path_parts) < 2 or path_parts[0] != "jobs" or path_parts[1] not in self.service.jobs:
+            return self._send_json(404, {"error": "Unknown job"})
+        job_id = path_parts[1]
+
+        if len(path_parts) == 2:
+            with self.service.condition:
+                status = self.service.jobs[job_id].get_status()
+            return self._send_json(200, status)
+        if path_parts[2:] == ["events"]:
+            try:
+                since = max(int(query.get("since", ["0"])[0]), 0)
+                timeout = float(query.get("timeout", ["30"])[0])
+                if not math.isfinite(timeout):
+                    raise ValueError("Timeout must be finite")
+                timeout = min(max(timeout, 0.0), 300.0)
+            except ValueError:
+                return self._send_json(400, {"error": "since and timeout must be numbers"})
+            return self._send_json(200, self.service.get_events(job_id, since, timeout))
+        if path_parts[2:] == ["stream"]:
+            return self._stream_events(job_id)
+
+        return self._send_json(404, {"error": "Unknown endpoint"})
+
+    def do_POST(self) -> None:
+        path_parts = [part for part in urlparse(self.path).path.split("/") if part]
+
+        # Browsers can send the "simple" cross-origin requests without asking,
+        #   but not with the JSON content type
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            return self._send_json(415, {"error": "Content-Type must be application/json"})
+        if not self._is_local_origin():
+            return self._send_json(403, {"error": "Requests from other origins are refused"})
+
+        try:
+            content_length = int(self.headers.get("Content-Length", 0))
+            content = json.loads(self.rfile.read(content_length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "Body must be JSON"})
+        if not isinstance(content, dict):
+            return self._send_json(400, {"error": "Body must be JSON object"})
+        parameters = content.get("parameters")
+        if not isinstance(parameters, dict):
+            return self._send_json(400, {"error": "Parameters must be JSON object"})
+
+        try:
+            if path_parts == ["jobs"]:
+                job_id, deduplicated = self.service.submit(
+                    algorithm=content.get("algorithm", "classic"),
+                    parameters=parameters,
+                    priority=content.get("priority", 0))
+                return self._send_json(202, {"id": job_id, "deduplicated": deduplicated})
+
+            if len(path_parts) == 3 and path_parts[0] == "jobs" and path_parts[1] in self.service.jobs:
+                self.service.send_command(path_parts[1], path_parts[2])
+                return self._send_json(200, {"id": path_parts[1], "command": path_parts[2]})
+        except JobSubmissionError as e:
+            return self._send_json(400, {"error": str(e)})
+
+        return self._send_json(404, {"error": "Unknown endpoint"})
+
+    def _stream_events(self, job_id: str) -> None:
+        """
+        Sending the events of the job as server-sent events,
+            until the job is over or the client disconnects
+
+        Args:
+            job_id ... identifier of the job
+        """
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        since = 0
+        while True:
+            events = self.service.get_events(job_id, since, timeout=15.0)
+            try:
+                if not events:
+                    # Comment keeping the connection alive
+                    self.wfile.write(b": waiting\n\n")
+                for event in events:
+                    self.wfile.write("id: {}\ndata: {}\n\n".format(
+                        event["index"], json.dumps(event)).encode("utf-8"))
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            since += len(events)
+
+            with self.service.condition:
+                job = self.service.jobs[job_id]
+                if job.state in FINAL_STATES and len(job.events) <= since:
+                    return
+
+    def _is_local_origin(self) -> bool:
+        """
+        Whether the request is not coming from the web page of other origin
+            (the requests of the other programs have no Origin at all)
+        Host is checked as well, to refuse the other domains pointing
+            to the local machine
+        """
+
+        for header in ["Origin", "Host"]:
+            value = self.headers.get(header)
+            if value is None:
+                continue
+            host = urlparse(value if "//" in value else "//" + value).hostname
+            if host == "localhost":
+                continue
+            try:
+                if not ipaddress.ip_address(host or "").is_loopback:
+                    return False
+            except ValueError:
+                return False
+        return True
+
+    def _send_json(self, status: int, content) -> None:
+        """
+        Sending the response with JSON content
+
+        Args:
+            status ... HTTP status code
+            content ... what to send
+        """
+
+        body = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        # Not flooding the console with every long-polling request
+        pass
+
+
+def create_server(service: JobService,
+                  address: tuple = DEFAULT_ADDRESS) -> ThreadingHTTPServer:
+    """
+    Creating the HTTP server of the service, which can listen
+        only on the local machine
+
+    Args:
+        service ... service handling the jobs
+        address ... where to listen (host, port)
+    """
+
+    host = "127.0.0.1" if address[0] == "localhost" else address[0]
+    if not ipaddress.ip_address(host).is_loopback:
+        raise ValueError("Service can listen only on the local machine, not on {}".format(host))
+
+    handler_class = type("ServiceJobRequestHandler", (JobRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, address[1]), handler_class)
+    server.daemon_threads = True
+
+    return server
+
+
+def main(arguments: Optional[list] = None) -> int:
+    """
+    Command line interface of the service
+
+    Args:
+        arguments ... command line arguments (sys.argv when not specified)
+    """
+
+    parser = argparse.ArgumentParser(description="Local HTTP service running simulations")
+    parser.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1],
+                        help="local port of the service")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="how many simulations to run at once (number of cores by default)")
+    parser.add_argument("--max-queued", type=int, default=100,
+                        help="how many jobs can wait before new submissions are refused")
+    parser.add_argument("--preload", nargs="*", default=[],
+                        help="experiment data files to load in advance")
+    parser.add_argument("--data-directory", default=None,
+                        help="directory of the experiment data (current directory by default)")
+    args = parser.parse_args(arguments)
+
+    service = JobService(max_workers=args.workers, max_queued_jobs=args.max_queued,
+                         preload_paths=args.preload, data_directory=args.data_directory)
+    server = create_server(service, address=(DEFAULT_ADDRESS[0], args.port))
+    print("Job service with {} workers listening on http://{}:{}".format(
+        service.pool.max_workers, *server.server_address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
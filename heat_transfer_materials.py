@@ -5,7 +5,7 @@ This module is responsible for getting and storing material data.
 import os
 import sys
 import csv
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 
 def resource_path(file_name):
@@ -44,6 +44,8 @@ class MaterialService:
 
     materials_name_list: List[str] = []
     materials_properties_dict: Dict[str, dict] = {}
+    # Temperature dependent properties of some materials (tables of them)
+    materials_temperature_tables: Dict[str, dict] = {}
 
     def __init__(self):
         # Defining file with default material data and getting data from there
@@ -68,6 +70,11 @@ class MaterialService:
         # Getting the list of all available materials
         self.materials_name_list = [key for key in self.materials_properties_dict]
 
+        # Temperature dependent properties are optional - only some
+        #   materials are having them
+        self.materials_temperature_tables = self.get_temperature_tables_from_csv_file(
+            file_name=resource_path("metals_properties_temperature.csv"))
+
     @staticmethod
     def get_materials_from_csv_file(file_name: str,
                                     throw_exception: bool = False) -> dict:
@@ -93,11 +100,15 @@ class MaterialService:
                 for row in csv_reader:
                     if row:
                         name = row[0]
-                        material_properties = {}
+                        material_properties: Dict[str, Optional[float]] = {}
 
                         material_properties["rho"] = float(row[2])
                         material_properties["cp"] = float(row[3])
                         material_properties["lmbd"] = float(row[4])
+                        # Melting temperature is stored in Kelvins (zero when
+                        #   not known), latent heat of fusion is optional
+                        material_properties["T_melt"] = float(row[1]) - 273.15 if float(row[1]) else None
+                        material_properties["latent_heat"] = float(row[5]) if len(row) > 5 and row[5] else None
 
                         materials_dictionary[name] = material_properties
         except FileNotFoundError:
@@ -109,6 +120,37 @@ class MaterialService:
 
         return materials_dictionary
 
+    @staticmethod
+    def get_temperature_tables_from_csv_file(file_name: str) -> dict:
+        """
+        Transfers the tables of temperature dependent material properties
+            from the CSV file (one row for each material and temperature)
+            into a python dictionary
+
+        Args:
+            file_name ... name of the file
+
+        Returns:
+            (dictionary) Dictionary with keys being material names and values
+                         being the lists of temperatures, cp and lmbd
+        """
+
+        tables: dict = {}
+        try:
+            with open(file_name, "r") as tables_file:
+                csv_reader = csv.reader(tables_file)
+                next(csv_reader, None)  # skip first line (headers)
+                for row in csv_reader:
+                    if row:
+                        table = tables.setdefault(row[0], {"temperatures": [], "cp_values": [], "lmbd_values": []})
+                        table["temperatures"].append(float(row[1]))
+                        table["cp_values"].append(float(row[2]))
+                        table["lmbd_values"].append(float(row[3]))
+        except FileNotFoundError:
+            print("File not found - {}".format(file_name))
+
+        return tables
+
     def save_custom_user_material(self, material_dict: dict) -> None:
         """
         Including custom user material into its dedicated file
@@ -119,7 +161,8 @@ class MaterialService:
         # When the custom user file already exists, append it
         # Otherwise create it from scratch
         # Being consistent with the default file, so including the
-        #   T_MELT column, and filling it with zero
+        #   T_MELT column, and filling it with zero (unknown), the same
+        #   as the L_FUSION column (left empty)
         if os.path.isfile(file_name):
             with open(file_name, "a") as custom_materials_file:
                 csv_writer = csv.writer(custom_materials_file)
@@ -130,13 +173,14 @@ class MaterialService:
                 element_row.append(material_dict["properties"]["rho"])
                 element_row.append(material_dict["properties"]["cp"])
                 element_row.append(material_dict["properties"]["lmbd"])
+                element_row.append("")
                 csv_writer.writerow(element_row)
         else:
             with open(file_name, "w") as custom_materials_file:
                 csv_writer = csv.writer(custom_materials_file)
 
-                headers = ["NAME", "T_MELT [C]", "RHO [kg/m3]",
-                           "C_P [J/(kg*K)]", "LAMBDA [W/(m*K)]"]
+                headers = ["NAME", "T_MELT [K]", "RHO [kg/m3]",
+                           "C_P [J/(kg*K)]", "LAMBDA [W/(m*K)]", "L_FUSION [J/kg]"]
                 csv_writer.writerow(headers)
 
                 element_row = []
@@ -145,4 +189,5 @@ class MaterialService:
                 element_row.append(material_dict["properties"]["rho"])
                 element_row.append(material_dict["properties"]["cp"])
                 element_row.append(material_dict["properties"]["lmbd"])
+                element_row.append("")
                 csv_writer.writerow(element_row)
@@ -0,0 +1,225 @@
+"""
+This module is responsible for caching the complete results of simulations
+
+Running the same simulation (same parameters, same experiment data and
+    same version of the numerical code) always gives the same result,
+    so it is enough to calculate it only once and store it on disk.
+
+The cache entries are identified by a hash (content-addressed), and
+    the whole cache has a limited size - when it gets too big, the least
+    recently used entries are being deleted.
+"""
+
+import os
+import glob
+import json
+import hashlib
+from typing import Optional
+import numpy as np  # type: ignore
+
+from experiment_data_handler import experiment_data_cache, file_hash_cache
+
+# Where the cache is being stored by default and how big can it get
+WORKING_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_CACHE_DIRECTORY = os.path.join(WORKING_DIRECTORY, "Simulation cache")
+DEFAULT_MAX_CACHE_SIZE = 200*1024*1024  # in bytes
+
+# Source files whose change can influence the simulation results
+CODE_VERSION_FILE_PATTERNS = [
+    "Numerical*.py",
+    "experiment_data_handler.py",
+    "interpolations.py",
+    "heat_transfer_simulation*.py",
+]
+
+# Parameters that are not influencing the results, only the way
+#   the simulation is communicating with the outside world
+PARAMETERS_NOT_AFFECTING_RESULTS = ["callback_period"]
+
+# Code version does not change while the program is running,
+#   so it is enough to determine it once
+_code_version: Optional[str] = None
+
+
+def get_code_version() -> str:
+    """
+    Determining the hash of all the source files that are taking part
+        in the calculation, so that any change in them will invalidate
+        all the previous cache entries
+    """
+
+    global _code_version
+
+    if _code_version is None:
+        code_hash = hashlib.sha1()
+        for pattern in CODE_VERSION_FILE_PATTERNS:
+            for file_name in sorted(glob.glob(os.path.join(WORKING_DIRECTORY, pattern))):
+                with open(file_name, "rb") as source_file:
+                    code_hash.update(source_file.read())
+        _code_version = code_hash.hexdigest()
+
+    return _code_version
+
+
+class SimulationResultsCache:
+    """
+    Class storing and retrieving the results of whole simulations
+    """
+
+    def __init__(self,
+                 cache_directory: str = DEFAULT_CACHE_DIRECTORY,
+                 max_size: int = DEFAULT_MAX_CACHE_SIZE) -> None:
+        """
+        Args:
+            cache_directory ... where to store the cache entries
+            max_size ... maximum size of all the entries together in bytes
+        """
+
+        self.cache_directory = cache_directory
+        self.max_size = max_size
+
+    def get_key(self, algorithm: str, parameters: dict) -> str:
+        """
+        Determining the unique identifier of the simulation - combining
+            the algorithm, the parameters, the content of the experiment
+            data file and the version of the code
+
+        Args:
+            algorithm ... which algorithm is being run (classic, inverse)
+            parameters ... all defined parameters of simulation
+        """
+
+        relevant_parameters = {key: value for key, value in parameters.items()
+                               if key not in PARAMETERS_NOT_AFFECTING_RESULTS}
+        # The path itself is not important, only the data inside the file
+        #   (hashed only when the file changed since the last time)
+        data_path = relevant_parameters.pop("experiment_data_path")
+
+        key_content = {
+            "algorithm": algorithm,
+            "parameters": relevant_parameters,
+            "experiment_data": file_hash_cache.get(data_path),
+            "code_version": get_code_version(),
+        }
+
+        # Numpy numbers (coming from np.linspace etc.) are not serializable
+        #   by default, so we are turning them into python numbers
+        serialized = json.dumps(key_content, sort_keys=True,
+                                default=lambda value: value.item())
+        return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+    def load(self, key: str) -> Optional[dict]:
+        """
+        Returning the cached results, or None when they are not available
+
+        Args:
+            key ... identifier of the simulation
+        """
+
+        file_name = self._get_file_name(key)
+        try:
+            with np.load(file_name) as cached_data:
+                result = {
+                    "error_value": float(cached_data["error_value"]),
+                    "time": cached_data["time"],
+                    "temperature": cached_data["temperature"],
+                    "heat_flux": cached_data["heat_flux"],
+                }
+        except (OSError, KeyError, ValueError):
+            return None
+
+        # Marking the entry as recently used, not to be evicted soon
+        try:
+            os.utime(file_name)
+        except OSError:
+            pass
+
+        return result
+
+    def save(self, key: str, Sim) -> None:
+        """
+        Storing the results of a finished simulation
+
+        Args:
+            key ... identifier of the simulation
+            Sim ... whole simulation object
+        """
+
+        if not os.path.isdir(self.cache_directory):
+            os.makedirs(self.cache_directory)
+
+        # Saving into a temporary file first and renaming it afterwards,
+        #   so that no other process can read an incomplete entry
+        file_name = self._get_file_name(key)
+        temporary_file_name = "{}.{}.tmp".format(file_name, os.getpid())
+        with open(temporary_file_name, "wb") as cache_file:
+            np.savez(cache_file,
+                     error_value=Sim.error_norm,
+                     time=np.asarray(Sim.t),
+                     temperature=np.asarray(Sim.T_x0),
+                     heat_flux=np.asarray(Sim.HeatFlux))
+        os.replace(temporary_file_name, file_name)
+
+        self._evict_least_recently_used()
+
+    def _get_file_name(self, key: str) -> str:
+        """
+        Determining the file where the entry with specified key is stored
+
+        Args:
+            key ... identifier of the simulation
+        """
+
+        return os.path.join(self.cache_directory, "{}.npz".format(key))
+
+    def _evict_least_recently_used(self) -> None:
+        """
+        Deleting the least recently used entries until the whole cache
+            fits into the maximum size
+        """
+
+        entries = []
+        for file_name in glob.glob(os.path.join(self.cache_directory, "*.npz")):
+            try:
+                file_stats = os.stat(file_name)
+            except OSError:
+                continue
+            entries.append((file_stats.st_mtime, file_stats.st_size, file_name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, file_name in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(file_name)
+            except OSError:
+                continue
+            total_size -= size
+
+
+def plot_cached_result(result: dict,
+                       experiment_data_path: str,
+                       temperature_plot,
+                       heat_flux_plot) -> None:
+    """
+    Showing the cached results on the plots the same way as the
+        simulation itself would do it at its end
+
+    Args:
+        result ... cached results of the simulation
+        experiment_data_path ... from where the experiment data should be taken
+        temperature_plot ... reference to temperature plot
+        heat_flux_plot ... reference to heat flux plot
+    """
+
+    Exp_data = experiment_data_cache.get(experiment_data_path)
+
+    temperature_plot.plot(x_values=result["time"],
+                          y_values=result["temperature"],
+                          x_experiment_values=Exp_data.t_data,
+                          y_experiment_values=Exp_data.T_data)
+
+    heat_flux_plot.plot(x_values=result["time"],
+                        y_values=result["heat_flux"],
+                        x_experiment_values=Exp_data.t_data,
+                        y_experiment_values=Exp_data.q_data)
@@ -4,9 +4,88 @@ It can be run separately or from the GUI, in which case
     it will be updating the plot.
 """
 
+from typing import Optional
 from NumericalInverse import InverseSimulation
-from experiment_data_handler import Material
-from heat_transfer_simulation_utilities import SimulationController
+from NumericalInverseSegmented import SegmentedInverseSimulation
+from experiment_data_handler import Layer, create_material
+from NumericalOperators import Mesh
+from heat_transfer_simulation_utilities import SimulationController, write_results_file
+from simulation_timing import PhaseTimer
+from simulation_profiling import SimulationProfiler, get_run_id
+from heat_transfer_results_cache import SimulationResultsCache
+
+
+# Simulation object from the last run, kept only when it should be reused
+_last_simulation = None
+
+
+def get_simulation_arguments(parameters: dict) -> dict:
+    """
+    Translates the parameters of simulation into the arguments
+        of the simulation object
+
+    Args:
+        parameters ... all defined parameters of simulation
+    """
+
+    return {
+        "length": parameters["object_length"],
+        # Constant properties, unless they are temperature dependent or melting
+        "material": create_material(parameters),
+        "N": parameters["number_of_elements"],
+        "theta": parameters["theta"],
+        "robin_alpha": parameters["robin_alpha"],
+        "dt": parameters["dt"],
+        "x0": parameters["place_of_interest"],
+        "window_span": parameters["window_span"],
+        "init_q_adjustment": parameters["init_q_adjustment"],
+        "adjusting_value": parameters["adjusting_value"],
+        "tolerance": parameters["tolerance"],
+        "experiment_data_path": parameters["experiment_data_path"],
+        # Uniform mesh of linear elements, unless it should be graded
+        #   or refined around x0, or use quadratic elements
+        "mesh": Mesh(grading=parameters.get("mesh_grading", 1.0),
+                     x0_refinement=parameters.get("x0_refinement", 1.0),
+                     element_order=parameters.get("element_order", 1)),
+        # Homogeneous object, unless its layers are specified
+        #   (each by its thickness, rho, cp, lmbd and contact_resistance)
+        "layers": [Layer(**layer) for layer in parameters.get("layers", [])] or None,
+        # Only convection on the far side, unless its emissivity is specified
+        "emissivity": parameters.get("emissivity", 0.0),
+    }
+
+
+def _get_simulation(parameters: dict,
+                    reuse_simulation: bool = False) -> InverseSimulation:
+    """
+    Creates a new simulation object, or reconfigures the one from the
+        previous run, when it should be reused
+
+    Args:
+        parameters ... all defined parameters of simulation
+        reuse_simulation ... whether to reuse the simulation object from
+            the previous call
+    """
+
+    global _last_simulation
+
+    simulation_arguments = get_simulation_arguments(parameters)
+
+    # Long experiments can be divided into time segments solved in parallel
+    if parameters.get("parallel_time_segments"):
+        return SegmentedInverseSimulation(time_segments=parameters["parallel_time_segments"],
+                                          **simulation_arguments)
+
+    if not reuse_simulation:
+        _last_simulation = None
+        return InverseSimulation(**simulation_arguments)
+
+    if _last_simulation is None:
+        _last_simulation = InverseSimulation(**simulation_arguments)
+    else:
+        _last_simulation.reconfigure(**simulation_arguments)
+
+    return _last_simulation
 
 
 def simulate_from_gui(parameters_from_gui: dict,
@@ -29,7 +108,12 @@ def create_and_run_simulation(parameters,
                               temperature_plot=None,
                               progress_callback=None,
                               queue=None,
-                              save_results: bool = False) -> dict:
+                              save_results: bool = False,
+                              use_cache: bool = False,
+                              reuse_simulation: bool = False,
+                              results_path: Optional[str] = None,
+                              collect_timing: bool = False,
+                              profile: bool = False) -> dict:
     """
     Creates a new simulation object, passes it into the controller
         and makes sure the simulation will finish
@@ -41,21 +125,36 @@ def create_and_run_simulation(parameters,
         progress_callback ... reference of progress callback
         queue ... reference of the shared queue
         save_results ... whether to save results at the end or not
+        use_cache ... whether to reuse results of identical finished simulation
+            - must be turned off when the simulation time is being measured
+        reuse_simulation ... whether to reuse the simulation object from
+            the previous call, preparing again only the changed parts of it
+        results_path ... where to write the complete results (CSV file)
+            - they are not written when not specified
+        collect_timing ... whether to measure the phases of the simulation
+            - the result then contains their timing (see simulation_timing.py)
+        profile ... whether to profile the simulation (see simulation_profiling.py)
+            - the result then contains the paths to the profile files
     """
 
-    my_material = Material(parameters["rho"], parameters["cp"], parameters["lmbd"])
-    Sim = InverseSimulation(length=parameters["object_length"],
-                            material=my_material,
-                            N=parameters["number_of_elements"],
-                            theta=parameters["theta"],
-                            robin_alpha=parameters["robin_alpha"],
-                            dt=parameters["dt"],
-                            x0=parameters["place_of_interest"],
-                            window_span=parameters["window_span"],
-                            init_q_adjustment=parameters["init_q_adjustment"],
-                            adjusting_value=parameters["adjusting_value"],
-                            tolerance=parameters["tolerance"],
-                            experiment_data_path=parameters["experiment_data_path"])
+    # Results are not taken from the cache when they should be saved,
+    #   because the files are being created by the simulation itself
+    # Also not when profiling, as the simulation must really run
+    # Also not when communicating with GUI, because the user is then
+    #   smoothing the result interactively after the simulation
+    results_cache = None
+    if use_cache and not save_results and not profile and progress_callback is None:
+        results_cache = SimulationResultsCache()
+        cache_key = results_cache.get_key(algorithm="inverse", parameters=parameters)
+        cached_result = results_cache.load(cache_key)
+        if cached_result is not None:
+            if results_path is not None:
+                write_results_file(results_path, cached_result["time"],
+                                   cached_result["temperature"], cached_result["heat_flux"])
+            return {"error_value": cached_result["error_value"]}
+
+    Sim = _get_simulation(parameters=parameters,
+                          reuse_simulation=reuse_simulation)
 
     sim_controller = SimulationController(Sim=Sim,
                                           parameters=parameters,
@@ -63,9 +162,23 @@ def create_and_run_simulation(parameters,
                                           temperature_plot=temperature_plot,
                                           heat_flux_plot=heat_flux_plot,
                                           queue=queue,
-                                          save_results=save_results)
+                                          save_results=save_results,
+                                          timer=PhaseTimer() if collect_timing else None)
+
+    if profile:
+        with SimulationProfiler(run_id=get_run_id("inverse")) as profiler:
+            result = sim_controller.complete_simulation()
+        result["profile"] = profiler.summary()
+    else:
+        result = sim_controller.complete_simulation()
+
+    # Storing only the results of simulations that were not stopped
+    if results_cache is not None and Sim.simulation_has_finished:
+        results_cache.save(cache_key, Sim)
+
+    if results_path is not None:
+        write_results_file(results_path, Sim.t, Sim.T_x0, Sim.HeatFlux)
 
-    result = sim_controller.complete_simulation()
     return result
 
 
@@ -0,0 +1,137 @@
+"""
+This module is serving for running the simulations following
+    a running experiment (see NumericalLive.py).
+It can be run separately or from the GUI, in which case
+    it will be updating the plot.
+
+The data are taken either from the CSV file that is still being written
+    (parameters["experiment_data_path"]), or from the local socket, when
+    its address is specified (parameters["live_socket_address"] = "host:port").
+"""
+
+from typing import Type
+from NumericalLive import LiveSimulation, LiveInverseSimulation
+from NumericalInverseOnline import LiveOnlineInverseSimulation
+from experiment_data_live import CSVTailSource, SocketSource
+from heat_transfer_simulation_utilities import SimulationController
+import heat_transfer_simulation as classic_sim
+import heat_transfer_simulation_inverse as inverse_sim
+
+
+def get_data_source(parameters: dict):
+    """
+    Connecting to the source of the experiment data
+
+    Args:
+        parameters ... all defined parameters of simulation
+    """
+
+    # After how many seconds without new data the experiment is finished
+    idle_timeout = parameters.get("live_idle_timeout")
+
+    socket_address = parameters.get("live_socket_address")
+    if socket_address:
+        host, port = socket_address.rsplit(":", 1)
+        return SocketSource(host=host, port=int(port), idle_timeout=idle_timeout)
+
+    return CSVTailSource(csv_file_path=parameters["experiment_data_path"],
+                         idle_timeout=idle_timeout)
+
+
+def get_online_arguments(parameters: dict) -> dict:
+    """
+    Translates the parameters of the online inverse simulation into
+        the arguments of the simulation object (all are optional)
+
+    Args:
+        parameters ... all defined parameters of simulation
+    """
+
+    online_arguments = {}
+    for parameter_name, argument_name in [("online_lag", "lag"),
+                                          ("online_revision_span", "revision_span"),
+                                          ("online_regularization", "regularization")]:
+        if parameters.get(parameter_name) is not None:
+            online_arguments[argument_name] = parameters[parameter_name]
+
+    return online_arguments
+
+
+def create_and_run_simulation(parameters: dict,
+                              algorithm: str = "classic",
+                              heat_flux_plot=None,
+                              temperature_plot=None,
+                              progress_callback=None,
+                              queue=None,
+                              save_results: bool = False) -> dict:
+    """
+    Creates a new live simulation object, passes it into the controller
+        and makes sure the simulation will finish
+    The controller is running until the data source gets closed - the
+        simulation is meanwhile waiting for new data in its steps, so that
+        it can still be paused or stopped from the GUI
+
+    Args:
+        parameters ... all defined parameters of simulation
+        algorithm ... which simulation to run (classic, inverse, online_inverse)
+        heat_flux_plot ... reference of heat flux plot
+        temperature_plot ... reference of temperature plot
+        progress_callback ... reference of progress callback
+        queue ... reference of the shared queue
+        save_results ... whether to save results at the end or not
+    """
+
+    # Data path is not needed, the data are coming from the source
+    simulation_class: Type[LiveSimulation]
+    if algorithm == "inverse":
+        simulation_arguments = inverse_sim.get_simulation_arguments(parameters)
+        simulation_class = LiveInverseSimulation
+    elif algorithm == "online_inverse":
+        simulation_arguments = {
+            **classic_sim.get_simulation_arguments(parameters),
+            **get_online_arguments(parameters),
+        }
+        simulation_class = LiveOnlineInverseSimulation
+    else:
+        simulation_arguments = classic_sim.get_simulation_arguments(parameters)
+        simulation_class = LiveSimulation
+    del simulation_arguments["experiment_data_path"]
+
+    Sim = simulation_class(data_source=get_data_source(parameters),
+                           **simulation_arguments)
+
+    sim_controller = SimulationController(Sim=Sim,
+                                          parameters=parameters,
+                                          progress_callback=progress_callback,
+                                          temperature_plot=temperature_plot,
+                                          heat_flux_plot=heat_flux_plot,
+                                          queue=queue,
+                                          save_results=save_results)
+
+    result = sim_controller.complete_simulation()
+    Sim.Exp_data.close()
+
+    result["latency"] = Sim.latency_statistics()
+    if isinstance(Sim, LiveOnlineInverseSimulation):
+        result["online"] = Sim.online_statistics()
+
+    return result
+
+
+if __name__ == '__main__':
+    parameters = {
+        "rho": 7850,
+        "cp": 520,
+        "lmbd": 50,
+        "dt": 1,
+        "object_length": 0.01,
+        "place_of_interest": 0.0045,
+        "number_of_elements": 100,
+        "callback_period": 500,
+        "robin_alpha": 13.5,
+        "theta": 0.5,
+        "experiment_data_path": "DATA.csv",
+        "live_idle_timeout": 5,
+    }
+
+    create_and_run_simulation(parameters)
@@ -5,14 +5,22 @@ It can be easily imported and used for any simulation (Sim) that
     is supporting the public API as defined here:
     - Sim.current_t ... storing the current simulation time
     - Sim.simulation_has_finished ... boolean if simulation is over or not
+        (simulations of a running experiment are not finished while
+        waiting for new data - their evaluate_one_step() is waiting instead)
     - Sim.error_norm ... determining the simulation error
     - Sim.plot() ... updating the results on the plots
     - Sim.evaluate_one_step() ... moving one step further in the simulation
     - Sim.after_simulation_action() ... what should happen after the simulation
     - Sim.save_results() ... custom method for saving results
+
+The SimulationController is blocking until the simulation finishes, the
+    AsyncSimulationController is doing the same inside an asyncio event loop.
 """
 
+import csv
 import time
+import asyncio
+from typing import Optional
 
 
 class Callback:
@@ -123,7 +131,8 @@ class SimulationController:
                  queue=None,
                  temperature_plot=None,
                  heat_flux_plot=None,
-                 save_results: bool = False):
+                 save_results: bool = False,
+                 timer=None):
         """
         Args:
             Sim ... whole simulation object
@@ -133,6 +142,8 @@ class SimulationController:
             queue ... reference of the shared queue
             progress_callback ... reference of progress callback
             save_results ... whether to save results at the end or not
+            timer ... measuring the phases of the simulation (PhaseTimer)
+                - nothing is measured when not specified
         """
 
         self.Sim = Sim
@@ -146,38 +157,217 @@ class SimulationController:
         self.temperature_plot = temperature_plot
         self.heat_flux_plot = heat_flux_plot
         self.queue = queue
+        self.timer = timer
 
     def complete_simulation(self) -> dict:
         """
         Running all the simulation steps, if not stopped
         """
 
-        # Calling the evaluating function as long as the simulation has not finished
-        while not self.Sim.simulation_has_finished:
-            # Processing the callback and getting the simulation state at the same time
-            # Then acting accordingly to the current state
-            simulation_state = self.MyCallBack(self.Sim)
-            if simulation_state == "running":
-                # Calling the function that is determining next step
-                self.Sim.evaluate_one_step()
-            elif simulation_state == "paused":
-                # Sleeping for some little time before checking again, to save CPU
-                time.sleep(0.1)
-            elif simulation_state == "stopped":
-                # Breaking out of the loop - finishing simulation
-                print("stopping")
-                break
-
-        # Calling callback at the very end, to update the plot with complete results
-        self.MyCallBack(self.Sim, force_update=True)
-
-        # Invoking whatever action should happen after simulation finishes
-        # Passing whole self object, so Simulation has access to all
-        #   connections here and can communicate with GUI
-        self.Sim.after_simulation_action(self)
+        if self.timer is not None:
+            self.timer.attach(self.Sim)
+            self.MyCallBack = self.timer.timed("callback", self.MyCallBack)
+
+        try:
+            # Calling the evaluating function as long as the simulation has not finished
+            while not self.Sim.simulation_has_finished:
+                # Processing the callback and getting the simulation state at the same time
+                # Then acting accordingly to the current state
+                simulation_state = self.MyCallBack(self.Sim)
+                if simulation_state == "running":
+                    # Calling the function that is determining next step
+                    self.Sim.evaluate_one_step()
+                elif simulation_state == "paused":
+                    # Sleeping for some little time before checking again, to save CPU
+                    time.sleep(0.1)
+                elif simulation_state == "stopped":
+                    # Breaking out of the loop - finishing simulation
+                    print("stopping")
+                    break
+
+            # Calling callback at the very end, to update the plot with complete results
+            self.MyCallBack(self.Sim, force_update=True)
+
+            # Invoking whatever action should happen after simulation finishes
+            # Passing whole self object, so Simulation has access to all
+            #   connections here and can communicate with GUI
+            self.Sim.after_simulation_action(self)
+
+            # If wanted to, save the results by a custom function
+            if self.save_results:
+                self.Sim.save_results()
+        finally:
+            # Simulation object can be reused, so it must not stay timed,
+            #   not even when the simulation failed
+            if self.timer is not None:
+                self.timer.detach(self.Sim)
+
+        result = {"error_value": self.Sim.error_norm}
+        if self.timer is not None:
+            result["timing"] = self.timer.summary()
+
+        return result
+
+
+class AsyncSimulationController:
+    """
+    Holding variables and defining methods for the simulation that is
+        being run from an asyncio event loop
+
+    The simulation steps are computed in chunks in an executor (thread pool),
+        so the event loop stays responsive and can run many simulations at once.
+    The progress is available as an async iterator - the next chunk is not
+        computed before the previous update is consumed (back-pressure).
+    Cancelling the task running the simulation stops it after the current step.
+
+    Usage:
+        controller = AsyncSimulationController(Sim=Sim, parameters=parameters)
+        async for update in controller.run():
+            print(update["progress"])
+        print(controller.result)
+    """
+
+    def __init__(self,
+                 Sim,
+                 parameters: Optional[dict] = None,
+                 steps_per_chunk: int = 100,
+                 executor=None,
+                 limiter: Optional[asyncio.Semaphore] = None,
+                 save_results: bool = False) -> None:
+        """
+        Args:
+            Sim ... whole simulation object
+            parameters ... all defined parameters of simulation
+            steps_per_chunk ... how many steps to compute between updates
+            executor ... where to compute the chunks (concurrent.futures executor)
+                - default executor of the event loop when not specified
+            limiter ... semaphore shared by more controllers, limiting
+                        how many chunks are being computed at once
+            save_results ... whether to save results at the end or not
+        """
+
+        self.Sim = Sim
+        self.parameters = parameters or {}
+        self.steps_per_chunk = steps_per_chunk
+        self.executor = executor
+        self.limiter = limiter
+        self.save_results = save_results
+        # Nothing to communicate with - Sim.after_simulation_action()
+        #   is not waiting for any input from the GUI
+        self.progress_callback = None
+        self.temperature_plot = None
+        self.heat_flux_plot = None
+        self.queue = None
+
+        self.result: dict = None  # type: ignore
+        # Set when the task is cancelled, checked in every step
+        self._cancelled = False
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
 
-        # If wanted to, save the results by a custom function
+        return f"""
+            self.Sim: {self.Sim},
+            self.steps_per_chunk: {self.steps_per_chunk},
+            self.executor: {self.executor},
+            self.limiter: {self.limiter},
+            """
+
+    async def run(self):
+        """
+        Running all the simulation steps, yielding the progress after
+            each chunk of them - the last update contains also the result
+        """
+
+        loop = asyncio.get_running_loop()
+        try:
+            while not self.Sim.simulation_has_finished:
+                if self.limiter is not None:
+                    async with self.limiter:
+                        await loop.run_in_executor(self.executor, self._evaluate_chunk)
+                else:
+                    await loop.run_in_executor(self.executor, self._evaluate_chunk)
+                yield self._get_update()
+
+            await loop.run_in_executor(self.executor, self._finish_simulation)
+        except asyncio.CancelledError:
+            # The step being computed in the executor cannot be interrupted,
+            #   but no other step will follow it
+            self._cancelled = True
+            raise
+
+        yield {**self._get_update(), **self.result}
+
+    async def complete_simulation(self) -> dict:
+        """
+        Running the whole simulation without following its progress,
+            returning its result
+        """
+
+        async for _ in self.run():
+            pass
+
+        return self.result
+
+    def _evaluate_chunk(self) -> None:
+        """
+        Computing one chunk of the simulation steps (in the executor)
+        """
+
+        for _ in range(self.steps_per_chunk):
+            if self._cancelled or self.Sim.simulation_has_finished:
+                return
+            self.Sim.evaluate_one_step()
+
+    def _finish_simulation(self) -> None:
+        """
+        Invoking the actions after the simulation (in the executor)
+        """
+
+        self.Sim.after_simulation_action(self)
         if self.save_results:
             self.Sim.save_results()
 
-        return {"error_value": self.Sim.error_norm}
+        self.result = {"error_value": self.Sim.error_norm}
+
+    def _get_update(self) -> dict:
+        """
+        Describing how far the simulation is
+        """
+
+        max_step_idx = getattr(self.Sim, "max_step_idx", 0)
+        current_step_idx = getattr(self.Sim, "current_step_idx", 0)
+        progress = 1.0 if self.Sim.simulation_has_finished or not max_step_idx \
+            else min(1.0, current_step_idx / max_step_idx)
+
+        return {
+            "current_t": float(self.Sim.current_t),
+            "progress": progress,
+            "finished": self.result is not None,
+        }
+
+
+def write_results_file(file_path: str,
+                       time_data,
+                       temperature_data,
+                       heat_flux_data) -> None:
+    """
+    Writing the complete results of a simulation into a CSV file
+
+    Args:
+        file_path ... where to write the results
+        time_data ... simulation time points
+        temperature_data ... temperatures at the place of interest
+        heat_flux_data ... heat flux in the time points
+    """
+
+    with open(file_path, "w", newline="") as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(["Time [s]", "Temperature [C]", "Heat flux [W]"])
+
+        for row in zip(time_data, temperature_data, heat_flux_data):
+            csv_writer.writerow([float(value) for value in row])
@@ -0,0 +1,500 @@
+"""
+This module is verifying the forward simulation against the closed-form
+    (analytical) solutions, to know not only how fast, but also how
+    accurate each discretization is
+
+Available solutions:
+    - slab - constant heat flux on the left side of the slab, convection
+      into the constant ambient temperature on the right side
+      (Fourier series of the eigenfunctions)
+    - semi_infinite - constant heat flux into the semi-infinite body
+      (the object is long enough for the heat not to reach its end)
+
+The simulation is run over the grid of the numbers of elements, time steps
+    and thetas, and for each of them is recorded:
+    - the error at the place of interest (maximum over the whole time)
+    - the error in all the nodes at the end of the simulation
+    - the runtime of the time stepping (median of the repetitions)
+From the errors at the end are determined the observed convergence orders
+    in space (when refining the mesh) and in time (when refining the time
+    step) - the order is clean only where the other error is negligible
+    (the row with the finest time step, the column with the most elements).
+The cheapest discretization meeting the tolerance at the place of interest
+    is then reported.
+
+Usage:
+    python heat_transfer_verification.py --solution slab --tolerance 0.01
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import itertools
+from typing import Optional
+
+import numpy as np  # type: ignore
+from scipy.optimize import brentq  # type: ignore
+from scipy.special import erfc  # type: ignore
+
+from NumericalForward import Simulation
+from NumericalOperators import Mesh
+from experiment_data_handler import Material
+from heat_transfer_benchmarks import measure
+
+# Grids over which the simulation is verified by default
+DEFAULT_N_VALUES = [5, 10, 20, 40]
+DEFAULT_DT_VALUES = [1.0, 0.5, 0.25, 0.125]
+DEFAULT_THETA_VALUES = [0.5, 1.0]
+
+
+class AnalyticalSolution:
+    """
+    Base class of the closed-form solutions - the object starts
+        at uniform temperature equal to the ambient one, and from the time
+        zero a constant heat flux is entering it on the left side
+    """
+
+    name = "analytical"
+
+    def __init__(self,
+                 material: Material,
+                 length: float,
+                 robin_alpha: float,
+                 heat_flux: float,
+                 T_initial: float,
+                 duration: float,
+                 x0: float) -> None:
+        """
+        Args:
+            material ... object containing material properties
+            length ... how long is the object
+            robin_alpha ... coefficient of heat convection on the right side
+            heat_flux ... constant heat flux entering the left side
+            T_initial ... initial (and ambient) temperature
+            duration ... how long is the simulated time
+            x0 ... where is the place of our interest in the object
+        """
+
+        self.material = material
+        self.length = length
+        self.robin_alpha = robin_alpha
+        self.heat_flux = heat_flux
+        self.T_initial = T_initial
+        self.duration = duration
+        self.x0 = x0
+        # Thermal diffusivity
+        self.kappa = material.lmbd / (material.rho * material.cp)
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.name: {self.name},
+            self.length: {self.length},
+            self.robin_alpha: {self.robin_alpha},
+            self.heat_flux: {self.heat_flux},
+            self.T_initial: {self.T_initial},
+            self.duration: {self.duration},
+            self.x0: {self.x0},
+            """
+
+    def temperature(self, x, t: float):
+        """
+        Exact temperature in the place(s) x at the time t
+
+        Args:
+            x ... position or array of positions
+            t ... time
+        """
+
+        if t <= 0:
+            return self.T_initial + 0 * np.asarray(x, dtype=float)
+        return self.T_initial + self._temperature_rise(np.asarray(x, dtype=float), t)
+
+    def _temperature_rise(self, x, t: float):
+        """
+        How much the temperature rose in the places x at the time t > 0
+        """
+
+        raise NotImplementedError
+
+    def write_data_file(self, file_path: str, sample_period: float = 1.0) -> None:
+        """
+        Writing the experiment data file describing the problem - the boundary
+            conditions, and the exact temperature in the place of interest
+
+        Args:
+            file_path ... where to write the data
+            sample_period ... time between the rows of the file
+        """
+
+        t = np.arange(0, self.duration + sample_period / 2, sample_period)
+        temperature = [float(self.temperature(self.x0, time_point)) for time_point in t]
+        data = np.column_stack([t, temperature,
+                                np.full(len(t), self.heat_flux),
+                                np.full(len(t), self.T_initial)])
+        np.savetxt(file_path, data, delimiter=",", fmt="%.12g", comments="",
+                   header="Time,Temperature,HeatFlux,T_amb")
+
+
+class ConvectiveSlabSolution(AnalyticalSolution):
+    """
+    Slab heated by the constant flux on the left side and cooled by the
+        convection on the right side
+
+    The rise of temperature is the steady state minus the decaying transient:
+        theta(x, t) = q/alpha + q*(L-x)/lmbd - sum(C_n*exp(-kappa*beta_n^2*t)*cos(beta_n*x))
+        where beta_n*tan(beta_n*L) = alpha/lmbd
+    """
+
+    name = "slab"
+
+    def __init__(self,
+                 material: Material,
+                 length: float = 0.01,
+                 robin_alpha: float = 13.5,
+                 heat_flux: float = 2000.0,
+                 T_initial: float = 20.0,
+                 duration: float = 120.0,
+                 x0: float = 0.0045,
+                 number_of_terms: int = 200) -> None:
+        """
+        Args:
+            number_of_terms ... how many terms of the series to sum
+            (the rest is the same as in AnalyticalSolution)
+        """
+
+        super().__init__(material=material, length=length, robin_alpha=robin_alpha,
+                         heat_flux=heat_flux, T_initial=T_initial, duration=duration, x0=x0)
+
+        # Eigenvalues - the roots of z*sin(z) = Bi*cos(z) (z = beta*L),
+        #   there is exactly one in each interval (n*pi, n*pi + pi/2)
+        biot = robin_alpha * length / material.lmbd
+        roots = [brentq(lambda z: z * np.sin(z) - biot * np.cos(z),
+                        n * np.pi + 1e-12, n * np.pi + np.pi / 2)
+                 for n in range(number_of_terms)]
+        self.betas = np.array(roots) / length
+
+        # Coefficients of the steady state expanded into the eigenfunctions
+        a = heat_flux / robin_alpha
+        b = heat_flux / material.lmbd
+        beta_L = self.betas * length
+        numerator = a * np.sin(beta_L) / self.betas + b * (1 - np.cos(beta_L)) / self.betas**2
+        denominator = length / 2 + np.sin(2 * beta_L) / (4 * self.betas)
+        self.coefficients = numerator / denominator
+
+    def _temperature_rise(self, x, t: float):
+        steady_state = self.heat_flux / self.robin_alpha + self.heat_flux * (self.length - x) / self.material.lmbd
+        decays = self.coefficients * np.exp(-self.kappa * self.betas**2 * t)
+        transient = np.cos(np.multiply.outer(x, self.betas)).dot(decays)
+        return steady_state - transient
+
+
+class SemiInfiniteSolution(AnalyticalSolution):
+    """
+    Semi-infinite body heated by the constant flux on its surface
+        theta(x, t) = 2*q/lmbd*sqrt(kappa*t/pi)*exp(-x^2/(4*kappa*t))
+                      - q*x/lmbd*erfc(x/(2*sqrt(kappa*t)))
+
+    The simulated object is so long, that the heat does not reach its end
+        (its temperature rises by less than 1e-8 of the surface one),
+        and it is insulated there
+    """
+
+    name = "semi_infinite"
+
+    def __init__(self,
+                 material: Material,
+                 heat_flux: float = 2000.0,
+                 T_initial: float = 20.0,
+                 duration: float = 60.0,
+                 x0: float = 0.0045) -> None:
+        """
+        Args:
+            (the same as in AnalyticalSolution, the length is determined
+             from the duration, and there is no convection)
+        """
+
+        kappa = material.lmbd / (material.rho * material.cp)
+        length = 8 * np.sqrt(kappa * duration)
+        super().__init__(material=material, length=length, robin_alpha=0.0,
+                         heat_flux=heat_flux, T_initial=T_initial, duration=duration, x0=x0)
+
+    def _temperature_rise(self, x, t: float):
+        diffusion_length = np.sqrt(self.kappa * t)
+        return (2 * self.heat_flux / self.material.lmbd * diffusion_length / np.sqrt(np.pi)
+                * np.exp(-x**2 / (4 * diffusion_length**2))
+                - self.heat_flux * x / self.material.lmbd * erfc(x / (2 * diffusion_length)))
+
+
+# Solutions available from the command line, by their names
+SOLUTIONS = {
+    ConvectiveSlabSolution.name: ConvectiveSlabSolution,
+    SemiInfiniteSolution.name: SemiInfiniteSolution,
+}
+
+
+def get_errors(Sim: Simulation, solution: AnalyticalSolution) -> dict:
+    """
+    Comparing the finished simulation with the exact solution
+
+    Args:
+        Sim ... simulation that was run until its end
+        solution ... exact solution of the same problem
+    """
+
+    exact_probe = np.array([solution.temperature(solution.x0, time_point)
+                            for time_point in Sim.t[:Sim.max_step_idx + 1]])
+    exact_final = solution.temperature(Sim.x, Sim.t[Sim.max_step_idx])
+
+    return {
+        "probe_error": float(np.max(np.abs(np.asarray(Sim.T_x0) - exact_probe))),
+        "final_error": float(np.max(np.abs(Sim.T - exact_final))),
+    }
+
+
+def verify(solution: AnalyticalSolution,
+           N_values: Optional[list] = None,
+           dt_values: Optional[list] = None,
+           theta_values: Optional[list] = None,
+           repetitions: int = 3,
+           mesh: Optional[Mesh] = None) -> list:
+    """
+    Running the simulation for all the combinations of the parameters,
+        returning the errors and runtimes of all of them
+
+    Args:
+        solution ... exact solution to compare with
+        N_values ... numbers of elements
+        dt_values ... time steps (should be dividing the duration)
+        theta_values ... thetas
+        repetitions ... how many times to measure each runtime
+        mesh ... distribution of the nodes (uniform when not specified)
+    """
+
+    N_values = N_values or DEFAULT_N_VALUES
+    dt_values = dt_values or DEFAULT_DT_VALUES
+    theta_values = theta_values or DEFAULT_THETA_VALUES
+
+    data_directory = tempfile.mkdtemp()
+    try:
+        data_path = os.path.join(data_directory, "{}.csv".format(solution.name))
+        solution.write_data_file(data_path)
+
+        Sim = None
+        results = []
+        for N, dt, theta in itertools.product(N_values, dt_values, theta_values):
+            # Creating the simulation only once, and then changing just
+            #   the discretization (operators are cached anyway)
+            if Sim is None:
+                Sim = Simulation(N=N, dt=dt, theta=theta,
+                                 robin_alpha=solution.robin_alpha, x0=solution.x0,
+                                 length=solution.length, material=solution.material,
+                                 experiment_data_path=data_path, mesh=mesh)
+            else:
+                Sim.reconfigure(N=N, dt=dt, theta=theta)
+
+            def run_simulation():
+                Sim.reset()
+                while not Sim.simulation_has_finished:
+                    Sim.evaluate_one_step()
+
+            samples = measure(run_simulation, warmup=0, repetitions=repetitions)
+            results.append({
+                "N": N,
+                "dt": dt,
+                "theta": theta,
+                "steps": Sim.max_step_idx,
+                "runtime": float(np.median(samples)),
+                **get_errors(Sim, solution),
+            })
+    finally:
+        shutil.rmtree(data_directory, ignore_errors=True)
+
+    return results
+
+
+def get_convergence_orders(results: list,
+                           parameter: str,
+                           error_key: str = "final_error") -> list:
+    """
+    Determining the observed orders of convergence when refining one
+        parameter (N or dt) and keeping the others the same
+        order = log(error_1/error_2) / log(h_1/h_2)
+        where h is the size of the element or the time step
+
+    Args:
+        results ... output of verify()
+        parameter ... which parameter is being refined (N or dt)
+        error_key ... which error to use
+    """
+
+    other_parameters = [name for name in ["N", "dt", "theta"] if name != parameter]
+    groups: dict = {}
+    for result in results:
+        fixed = tuple(result[name] for name in other_parameters)
+        groups.setdefault(fixed, []).append(result)
+
+    sequences = []
+    for fixed, group in groups.items():
+        # Going from the coarsest to the finest
+        if parameter == "N":
+            group.sort(key=lambda result: result["N"])
+            sizes = [1 / result["N"] for result in group]
+        else:
+            group.sort(key=lambda result: -result["dt"])
+            sizes = [result["dt"] for result in group]
+        errors = [result[error_key] for result in group]
+
+        orders = []
+        for idx in range(len(group) - 1):
+            if errors[idx] > 0 and errors[idx + 1] > 0 and sizes[idx] != sizes[idx + 1]:
+                orders.append(float(np.log(errors[idx] / errors[idx + 1])
+                                    / np.log(sizes[idx] / sizes[idx + 1])))
+            else:
+                orders.append(float("nan"))
+
+        sequences.append({
+            "fixed": dict(zip(other_parameters, fixed)),
+            "values": [result[parameter] for result in group],
+            "errors": errors,
+            "orders": orders,
+        })
+
+    return sequences
+
+
+def find_cheapest(results: list,
+                  tolerance: float,
+                  error_key: str = "probe_error") -> Optional[dict]:
+    """
+    Finding the fastest discretization whose error is within the tolerance
+        (None when none of them is accurate enough)
+
+    Args:
+        results ... output of verify()
+        tolerance ... maximal allowed error (in degrees)
+        error_key ... which error to use
+    """
+
+    accurate = [result for result in results if result[error_key] <= tolerance]
+    if not accurate:
+        return None
+
+    return min(accurate, key=lambda result: result["runtime"])
+
+
+def get_pareto_front(results: list, error_key: str = "probe_error") -> list:
+    """
+    Choosing the discretizations that are not beaten by any other
+        in both the error and the runtime - the only ones worth using
+
+    Args:
+        results ... output of verify()
+        error_key ... which error to use
+    """
+
+    front: list = []
+    for result in sorted(results, key=lambda result: (result["runtime"], result[error_key])):
+        if not front or result[error_key] < front[-1][error_key]:
+            front.append(result)
+
+    return front
+
+
+def format_results(results: list, error_key: str = "probe_error") -> str:
+    """
+    Describing all the results as a table, from the fastest one
+
+    Args:
+        results ... output of verify()
+        error_key ... by which error to mark the pareto front
+    """
+
+    front = get_pareto_front(results, error_key)
+    lines = ["{:>6} {:>8} {:>6} {:>12} {:>12} {:>12}".format(
+        "N", "dt", "theta", "probe_error", "final_error", "runtime [ms]")]
+    for result in sorted(results, key=lambda result: result["runtime"]):
+        lines.append("{:>6} {:>8g} {:>6g} {:>12.3e} {:>12.3e} {:>12.3f}{}".format(
+            result["N"], result["dt"], result["theta"], result["probe_error"],
+            result["final_error"], 1000 * result["runtime"],
+            "  *" if result in front else ""))
+
+    return "\n".join(lines)
+
+
+def main(arguments: Optional[list] = None) -> int:
+    """
+    Command line interface of the verification
+    Returns the exit code - 1 when no discretization meets the tolerance
+
+    Args:
+        arguments ... command line arguments (sys.argv when not specified)
+    """
+
+    parser = argparse.ArgumentParser(description="Verification of the simulation against analytical solutions")
+    parser.add_argument("--solution", choices=sorted(SOLUTIONS), default=ConvectiveSlabSolution.name,
+                        help="which analytical solution to compare with")
+    parser.add_argument("--N", type=int, nargs="+", default=DEFAULT_N_VALUES,
+                        help="numbers of elements")
+    parser.add_argument("--dt", type=float, nargs="+", default=DEFAULT_DT_VALUES,
+                        help="time steps")
+    parser.add_argument("--theta", type=float, nargs="+", default=DEFAULT_THETA_VALUES,
+                        help="thetas")
+    parser.add_argument("--grading", type=float, default=1.0,
+                        help="how many times is the last element bigger than the first one")
+    parser.add_argument("--x0-refinement", type=float, default=1.0,
+                        help="how many times smaller are the elements around the place of interest")
+    parser.add_argument("--element-order", type=int, choices=[1, 2], default=1,
+                        help="linear (1) or quadratic (2) finite elements")
+    parser.add_argument("--repetitions", type=int, default=3,
+                        help="how many times to measure each runtime")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="maximal allowed error at the place of interest (in degrees)")
+    parser.add_argument("--output", default=None,
+                        help="JSON file where to store all the results")
+    args = parser.parse_args(arguments)
+
+    solution = SOLUTIONS[args.solution](material=Material(7850, 520, 50))
+    results = verify(solution, N_values=args.N, dt_values=args.dt,
+                     theta_values=args.theta, repetitions=args.repetitions,
+                     mesh=Mesh(grading=args.grading, x0_refinement=args.x0_refinement,
+                               element_order=args.element_order))
+
+    print(format_results(results))
+    print("(* marks the discretizations with the best accuracy for their cost)")
+
+    orders = {parameter: get_convergence_orders(results, parameter)
+              for parameter in ["N", "dt"]}
+    for parameter, sequences in orders.items():
+        print("\nObserved orders of convergence when refining {}:".format(parameter))
+        for sequence in sequences:
+            print("  {}: {}".format(sequence["fixed"],
+                                    ", ".join("{:.2f}".format(order) for order in sequence["orders"])))
+
+    cheapest = find_cheapest(results, args.tolerance)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"solution": solution.name, "tolerance": args.tolerance,
+                       "results": results, "orders": orders, "cheapest": cheapest},
+                      output_file, indent=4)
+
+    if cheapest is None:
+        print("\nNo discretization meets the tolerance of {}".format(args.tolerance))
+        return 1
+
+    print("\nCheapest discretization meeting the tolerance of {}: N={}, dt={}, theta={}".format(
+        args.tolerance, cheapest["N"], cheapest["dt"], cheapest["theta"]))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,538 @@
+"""
+This module is defining the pool of long-lived worker processes,
+    to which the GUI and the command line are submitting the simulations
+
+The worker processes are started only once, with all the numerical
+    modules already imported. They are also keeping in memory the recently
+    used experiment data (experiment_data_cache), the assembled operators
+    (operator_cache) and the last simulation object, which is only
+    reconfigured for the next similar simulation. Therefore all but the
+    first simulations start computing almost immediately.
+
+The plots, progress callback and the command queue of the GUI cannot be
+    sent to other processes, so their messages are being forwarded
+    through the queues of a multiprocessing manager.
+
+The pool can also run as a local server, so that more command-line calls
+    can share the same warm workers:
+    - python heat_transfer_worker_pool.py serve
+    - python heat_transfer_worker_pool.py run parameters.json
+The clients are running code in the server (the messages are pickled),
+    so only the clients knowing its secret key can connect. The key is
+    random for each server, and is handed to the clients through a file
+    readable only by the user who started the server.
+"""
+
+import os
+import sys
+import json
+import time
+import queue as queue_module
+import argparse
+import importlib
+import threading
+import multiprocessing
+from typing import Optional
+from multiprocessing.managers import BaseManager, SyncManager
+from concurrent.futures import ProcessPoolExecutor
+
+# NOTE: the numerical modules (and numpy/scipy) are imported only in the
+#   worker processes, so that the command line client connecting to the
+#   pool server is starting quickly
+
+# Modules running the simulation for each of the algorithms
+SIMULATION_MODULES = {
+    "classic": "heat_transfer_simulation",
+    "inverse": "heat_transfer_simulation_inverse",
+}
+
+# Where the pool server is listening - only on the local machine
+DEFAULT_ADDRESS = ("127.0.0.1", 50008)
+# How long is the random secret key of the server (in bytes)
+AUTHKEY_LENGTH = 32
+
+
+class RemotePlot:
+    """
+    Class standing in for a plot in the worker process, sending all
+        the plotted data to the process owning the real plot
+    """
+
+    def __init__(self, channel, plot_name: str) -> None:
+        """
+        Args:
+            channel ... queue leading to the process with the plots
+            plot_name ... which plot it stands for
+        """
+
+        self.channel = channel
+        self.plot_name = plot_name
+
+    def plot(self, x_values=None, y_values=None,
+             x_experiment_values=None, y_experiment_values=None) -> None:
+        # Sending copies, as the simulation is changing the arrays later
+        values = [None if value is None else [float(item) for item in value]
+                  for value in [x_values, y_values, x_experiment_values, y_experiment_values]]
+        self.channel.put(("plot", self.plot_name, values))
+
+
+class RemoteProgress:
+    """
+    Class standing in for the progress callback in the worker process
+    The progress is emitted in every simulation step, which would be too
+        much for the queue, so the same value is sent only once in a while
+    """
+
+    def __init__(self, channel, min_period: float = 0.1) -> None:
+        """
+        Args:
+            channel ... queue leading to the process with the callback
+            min_period ... how often to send the same value (in seconds)
+        """
+
+        self.channel = channel
+        self.min_period = min_period
+        self.last_value: Optional[int] = None
+        self.last_sent = 0.0
+
+    def emit(self, value: int) -> None:
+        now = time.time()
+        if value != self.last_value or now - self.last_sent > self.min_period:
+            self.channel.put(("progress", value))
+            self.last_value = value
+            self.last_sent = now
+
+
+class RemoteCommands:
+    """
+    Class standing in for the command queue in the worker process
+    The queue is checked in every simulation step, which would be too slow
+        with the queue in other process, so it is checked only once in a while
+    """
+
+    def __init__(self, commands, min_period: float = 0.05) -> None:
+        """
+        Args:
+            commands ... queue with commands from the other process
+            min_period ... how often to check the queue (in seconds)
+        """
+
+        self.commands = commands
+        self.min_period = min_period
+        self.last_check = 0.0
+        self.received: list = []
+
+    def empty(self) -> bool:
+        now = time.time()
+        if not self.received and now - self.last_check > self.min_period:
+            self.last_check = now
+            while not self.commands.empty():
+                self.received.append(self.commands.get_nowait())
+
+        return not self.received
+
+    def get_nowait(self):
+        if self.empty():
+            raise queue_module.Empty
+        return self.received.pop(0)
+
+
+def run_job(algorithm: str,
+            parameters: dict,
+            options: Optional[dict] = None,
+            channel=None,
+            commands=None,
+            forward_progress: bool = True) -> dict:
+    """
+    Running one simulation in the worker process
+    Is a module-level function, so that it can be run in other processes
+
+    Args:
+        algorithm ... which simulation to run (classic, inverse)
+        parameters ... all defined parameters of simulation
+        options ... other arguments of create_and_run_simulation()
+        channel ... where to send the plots and progress (None when not needed)
+        commands ... from where to receive commands (pause, stop, smoothing)
+        forward_progress ... whether to send also the progress through the channel
+            - the inverse simulation is waiting for the interactive smoothing
+              only when there is somebody receiving the progress
+    """
+
+    # When the worker took the job (comparable between the processes)
+    start_wall_time = time.time()
+
+    if algorithm not in SIMULATION_MODULES:
+        raise ValueError("Unknown algorithm: {}".format(algorithm))
+
+    # Simulation object is kept in the worker, so that the next similar
+    #   simulation is only reconfigured
+    options = {"reuse_simulation": True, **(options or {})}
+    if channel is not None:
+        options["temperature_plot"] = RemotePlot(channel, "temperature_plot")
+        options["heat_flux_plot"] = RemotePlot(channel, "heat_flux_plot")
+        if forward_progress:
+            options["progress_callback"] = RemoteProgress(channel)
+    if commands is not None:
+        commands = RemoteCommands(commands)
+
+    simulation_module = importlib.import_module(SIMULATION_MODULES[algorithm])
+    start_time = time.perf_counter()
+    result = simulation_module.create_and_run_simulation(
+        parameters=parameters, queue=commands, **options)
+
+    # Time spent by the simulation itself, without waiting in the pool
+    return {**result, "computation_time": time.perf_counter() - start_time,
+            "start_time": start_wall_time}
+
+
+def _initialize_worker(preload_paths: list) -> None:
+    """
+    Preparing the worker process - importing all the numerical modules
+        and loading the experiment data
+
+    Args:
+        preload_paths ... experiment data files to load in advance
+    """
+
+    for module_name in SIMULATION_MODULES.values():
+        importlib.import_module(module_name)
+
+    from experiment_data_handler import experiment_data_cache
+    for path in preload_paths:
+        try:
+            experiment_data_cache.get(path)
+        except Exception as e:
+            print("Experiment data could not be preloaded: {}".format(e))
+
+
+def _get_process_id() -> int:
+    """
+    Trivial job forcing the worker process to start
+    """
+
+    return os.getpid()
+
+
+class WarmWorkerPool:
+    """
+    Class holding the long-lived worker processes
+    """
+
+    def __init__(self,
+                 max_workers: Optional[int] = None,
+                 preload_paths: Optional[list] = None) -> None:
+        """
+        Args:
+            max_workers ... how many processes to run
+                            (number of processor cores when not specified)
+            preload_paths ... experiment data files to load in advance
+        """
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.preload_paths = preload_paths or []
+        self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                            initializer=_initialize_worker,
+                                            initargs=(self.preload_paths,))
+        # Created only when the progress is being forwarded - simulations
+        #   can be run from more threads at once, so it is behind the lock
+        self._manager: Optional[SyncManager] = None
+        self._manager_lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.max_workers: {self.max_workers},
+            self.preload_paths: {self.preload_paths},
+            """
+
+    def warm_up(self) -> list:
+        """
+        Starting all the worker processes in advance, returning their ids
+        """
+
+        futures = [self.executor.submit(_get_process_id) for _ in range(self.max_workers)]
+        return [future.result() for future in futures]
+
+    def submit(self, algorithm: str, parameters: dict, **options):
+        """
+        Submitting the simulation without any plots or communication,
+            returning the future with its result
+
+        Args:
+            algorithm ... which simulation to run (classic, inverse)
+            parameters ... all defined parameters of simulation
+            options ... other arguments of create_and_run_simulation()
+        """
+
+        return self.executor.submit(run_job, algorithm, parameters, options)
+
+    def run(self,
+            algorithm: str,
+            parameters: dict,
+            temperature_plot=None,
+            heat_flux_plot=None,
+            progress_callback=None,
+            queue=None,
+            **options) -> dict:
+        """
+        Running the simulation in a worker process and waiting for it,
+            while forwarding the plots, progress and commands
+
+        Args:
+            algorithm ... which simulation to run (classic, inverse)
+            parameters ... all defined parameters of simulation
+            heat_flux_plot ... reference of heat flux plot
+            temperature_plot ... reference of temperature plot
+            progress_callback ... reference of progress callback
+            queue ... reference of the shared queue
+            options ... other arguments of create_and_run_simulation()
+        """
+
+        if temperature_plot is None and progress_callback is None and queue is None:
+            return self.submit(algorithm, parameters, **options).result()
+
+        with self._manager_lock:
+            if self._manager is None:
+                self._manager = multiprocessing.Manager()
+        channel = self._manager.Queue()
+        commands = self._manager.Queue()
+        plots = {"temperature_plot": temperature_plot, "heat_flux_plot": heat_flux_plot}
+
+        future = self.executor.submit(run_job, algorithm, parameters, options, channel, commands,
+                                      progress_callback is not None)
+        while True:
+            # Forwarding the commands from the GUI
+            while queue is not None and not queue.empty():
+                commands.put(queue.get_nowait())
+
+            try:
+                message = channel.get(timeout=0.05)
+            except queue_module.Empty:
+                # Checking the end only when all the messages were processed
+                if future.done():
+                    break
+                continue
+
+            if message[0] == "plot" and plots[message[1]] is not None:
+                plots[message[1]].plot(*message[2])
+            elif message[0] == "progress" and progress_callback is not None:
+                progress_callback.emit(message[1])
+
+        return future.result()
+
+    def run_from_gui(self,
+                     parameters_from_gui: dict,
+                     progress_callback) -> dict:
+        """
+        Starts the whole simulation with the inputs from GUI
+
+        Args:
+            parameters_from_gui ... parameters for simulation defined in GUI
+                - including the algorithm and all the references to plots,
+                  queues and callbacks
+            progress_callback ... reference of progress callback
+        """
+
+        return self.run(progress_callback=progress_callback, **parameters_from_gui)
+
+    def shutdown(self) -> None:
+        """
+        Stopping all the worker processes
+        """
+
+        self.executor.shutdown()
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+
+# Pool shared by everything in this process, created when first needed
+_worker_pool = None
+
+
+def get_worker_pool() -> WarmWorkerPool:
+    """
+    Returning the pool shared by everything in this process
+    """
+
+    global _worker_pool
+
+    if _worker_pool is None:
+        _worker_pool = WarmWorkerPool()
+
+    return _worker_pool
+
+
+class WorkerPoolServer(BaseManager):
+    """
+    Manager sharing the pool with other processes through a local socket
+    """
+
+
+class WorkerPoolClient(BaseManager):
+    """
+    Manager connecting to the pool shared by the WorkerPoolServer
+    """
+
+
+WorkerPoolClient.register("get_worker_pool")
+
+
+def get_authkey_path(port: int) -> str:
+    """
+    Determining the file with the secret key of the server listening
+        on the given port - in the runtime directory of the user
+        (or in the user's home, when there is none)
+
+    Args:
+        port ... on which port the server is listening
+    """
+
+    directory = os.environ.get("XDG_RUNTIME_DIR") or \
+        os.path.join(os.path.expanduser("~"), ".config", "heat_transfer")
+    return os.path.join(directory, "worker_pool-{}.key".format(port))
+
+
+def create_authkey_file(port: int) -> bytes:
+    """
+    Generating the random secret key for the server, and saving it
+        into the file only the current user can read
+
+    Args:
+        port ... on which port the server will be listening
+    """
+
+    authkey = os.urandom(AUTHKEY_LENGTH)
+    authkey_path = get_authkey_path(port)
+    os.makedirs(os.path.dirname(authkey_path), mode=0o700, exist_ok=True)
+
+    # Creating the file already with the restricted permissions (and
+    #   restricting them also when the file was left by an older server)
+    file_descriptor = os.open(authkey_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(file_descriptor, "wb") as authkey_file:
+        if hasattr(os, "fchmod"):
+            os.fchmod(authkey_file.fileno(), 0o600)
+        authkey_file.write(authkey)
+
+    return authkey
+
+
+def read_authkey_file(port: int) -> bytes:
+    """
+    Getting the secret key of the server listening on the given port
+
+    Args:
+        port ... on which port the server is listening
+    """
+
+    try:
+        with open(get_authkey_path(port), "rb") as authkey_file:
+            return authkey_file.read()
+    except FileNotFoundError:
+        raise ConnectionError("No worker pool server of this user is listening on port {}".format(port))
+
+
+def serve_worker_pool(address: tuple = DEFAULT_ADDRESS,
+                      authkey: Optional[bytes] = None,
+                      max_workers: Optional[int] = None,
+                      preload_paths: Optional[list] = None) -> None:
+    """
+    Running the pool as a local server, until it is interrupted
+
+    Args:
+        address ... where to listen (host, port)
+        authkey ... secret the clients must know (random one, saved
+                    in the file for the clients, when not specified)
+        max_workers ... how many processes to run
+        preload_paths ... experiment data files to load in advance
+    """
+
+    authkey_path = None
+    if authkey is None:
+        authkey = create_authkey_file(address[1])
+        authkey_path = get_authkey_path(address[1])
+
+    pool = WarmWorkerPool(max_workers=max_workers, preload_paths=preload_paths)
+    pool.warm_up()
+
+    WorkerPoolServer.register("get_worker_pool", callable=lambda: pool)
+    server = WorkerPoolServer(address=address, authkey=authkey).get_server()
+    print("Worker pool with {} processes listening on {}:{}".format(
+        pool.max_workers, *address))
+    try:
+        server.serve_forever()
+    finally:
+        pool.shutdown()
+        if authkey_path is not None and os.path.exists(authkey_path):
+            os.remove(authkey_path)
+
+
+def connect_to_worker_pool(address: tuple = DEFAULT_ADDRESS,
+                           authkey: Optional[bytes] = None):
+    """
+    Connecting to the pool running as a local server, returning its proxy
+        (only simulations without plots can be run through it)
+
+    Args:
+        address ... where the server is listening (host, port)
+        authkey ... secret shared with the server (read from the file
+                    of the server, when not specified)
+    """
+
+    if authkey is None:
+        authkey = read_authkey_file(address[1])
+
+    client = WorkerPoolClient(address=address, authkey=authkey)
+    client.connect()
+    # Method is registered on the class only at runtime
+    return client.get_worker_pool()  # type: ignore
+
+
+def main(arguments: Optional[list] = None) -> int:
+    """
+    Command line interface of the pool
+
+    Args:
+        arguments ... command line arguments (sys.argv when not specified)
+    """
+
+    parser = argparse.ArgumentParser(description="Pool of warm simulation workers")
+    parser.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1],
+                        help="local port of the pool server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="run the pool server")
+    serve_parser.add_argument("--workers", type=int, default=None,
+                              help="number of worker processes")
+    serve_parser.add_argument("--preload", nargs="*", default=[],
+                              help="experiment data files to load in advance")
+
+    run_parser = subparsers.add_parser("run", help="run one simulation in the pool server")
+    run_parser.add_argument("parameters_file", help="JSON file with the simulation parameters")
+    run_parser.add_argument("--algorithm", default="classic", choices=sorted(SIMULATION_MODULES))
+    run_parser.add_argument("--profile", action="store_true",
+                            help="profile the simulation (cProfile and flame-graph stacks)")
+
+    args = parser.parse_args(arguments)
+    address = (DEFAULT_ADDRESS[0], args.port)
+
+    if args.command == "serve":
+        serve_worker_pool(address=address, max_workers=args.workers,
+                          preload_paths=args.preload)
+        return 0
+
+    with open(args.parameters_file) as parameters_file:
+        parameters = json.load(parameters_file)
+    pool = connect_to_worker_pool(address=address)
+    result = pool.run(args.algorithm, parameters, profile=args.profile)
+    print(json.dumps(result))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,8 +2,13 @@
 This module is serving as a helper for a very quick linear interpolation,
     that is always happening at the one point, which is specified
     at the initialisation, and is not changed.
+The nodes can be placed arbitrarily (only sorted in increasing order).
+For the quadratic finite elements, the interpolation is quadratic
+    over the three nodes of the element, so that it is consistent
+    with the solution and does not spoil its accuracy.
 """
 
+from bisect import bisect_left
 from typing import List, Union
 
 
@@ -20,12 +25,12 @@ class PredefinedInterp:
         """
 
         # Searching for the index whose value is less than the x0 value,
-        #   but the further index is already bigger than the x0 value
-        idx = 0
-        while x[idx] < x0:
-            idx += 1
+        #   but the further index is already bigger (or equal) than the x0 value
+        # Points at the edges (or outside of the nodes) are using
+        #   the first or the last element
+        idx = bisect_left(x, x0) - 1
 
-        return idx - 1
+        return min(max(idx, 0), len(x) - 2)
 
 
 class PredefinedInterpForFloat(PredefinedInterp):
@@ -72,16 +77,92 @@ class PredefinedInterpForList(PredefinedInterp):
         return [y[self.indexes[i]]+((y[self.indexes[i]+1] - y[self.indexes[i]])*self.x_diff_ratios[i]) for i in range(self.n)]
 
 
-def predefined_interp_class_factory(x0: Union[float, list], x: list):
+class PredefinedQuadraticInterp:
+    """
+    Base class for interpolation inside the quadratic elements (each
+        element having three nodes - the edges and the middle)
+    """
+
+    @staticmethod
+    def get_weights(x0: float, x: list):
+        """
+        Finding out the first node of the element containing x0 value
+            and the weights of all three nodes of that element
+            (Lagrange polynomials evaluated in x0)
+        """
+
+        # Elements are starting at every second node, only the doubled
+        #   nodes (on the contact of two layers) are shifting them by one
+        first_nodes = []
+        node_idx = 0
+        while node_idx < len(x) - 1:
+            if x[node_idx+1] == x[node_idx]:
+                node_idx += 1
+                continue
+            first_nodes.append(node_idx)
+            node_idx += 2
+        element_idx = PredefinedInterp.find_interp_index(x0, [x[i] for i in first_nodes] + [x[-1]])
+        idx = first_nodes[element_idx]
+        x_left, x_middle, x_right = x[idx], x[idx+1], x[idx+2]
+
+        weights = [
+            (x0-x_middle)*(x0-x_right)/((x_left-x_middle)*(x_left-x_right)),
+            (x0-x_left)*(x0-x_right)/((x_middle-x_left)*(x_middle-x_right)),
+            (x0-x_left)*(x0-x_middle)/((x_right-x_left)*(x_right-x_middle)),
+        ]
+
+        return idx, weights
+
+
+class PredefinedQuadraticInterpForFloat(PredefinedQuadraticInterp):
+    """
+    Class set to interpolate only one float value from quadratic elements
+    """
+
+    def __init__(self, x0: float, x: list):
+        """
+        Initialising all the internal variables
+        """
+
+        self.index, (self.w0, self.w1, self.w2) = self.get_weights(x0, x)
+
+    def __call__(self, y: list) -> float:
+        return self.w0*y[self.index] + self.w1*y[self.index+1] + self.w2*y[self.index+2]
+
+
+class PredefinedQuadraticInterpForList(PredefinedQuadraticInterp):
+    """
+    Class set to interpolate the whole list of multiple float values
+        from quadratic elements
+    """
+
+    def __init__(self, x0: list, x: list):
+        """
+        Initialising all the internal variables
+        """
+
+        self.indexes_and_weights = [self.get_weights(x0_point, x) for x0_point in x0]
+
+    def __call__(self, y: list) -> List[float]:
+        return [weights[0]*y[idx] + weights[1]*y[idx+1] + weights[2]*y[idx+2]
+                for idx, weights in self.indexes_and_weights]
+
+
+def predefined_interp_class_factory(x0: Union[float, list], x: list, element_order: int = 1):
     """
     According to the value(s) we want to interpolate in, returning the
         right object for interpolating that specific data type (float or list)
+        and that order of elements (linear or quadratic)
 
     Utilizing the factory design pattern
     """
 
     try:
         iter(x0)  # type: ignore
+        if element_order == 2:
+            return PredefinedQuadraticInterpForList(x0, x)  # type: ignore
         return PredefinedInterpForList(x0, x)  # type: ignore
     except TypeError:
+        if element_order == 2:
+            return PredefinedQuadraticInterpForFloat(x0, x)  # type: ignore
         return PredefinedInterpForFloat(x0, x)  # type: ignore
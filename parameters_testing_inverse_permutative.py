@@ -16,7 +16,7 @@ import numpy as np  # type: ignore
 from heat_transfer_simulation_inverse import create_and_run_simulation
 
 
-def process_results(file_name, parameters_dict, error, time):
+def process_results(file_name, parameters_dict, error, time, cpu_time):
     """
     Saves the current result into a defined CSV file
     """
@@ -31,6 +31,7 @@ def process_results(file_name, parameters_dict, error, time):
 
         row_to_write.append(error)
         row_to_write.append(time)
+        row_to_write.append(cpu_time)
 
         csv_writer.writerow(row_to_write)
 
@@ -67,14 +68,21 @@ def run_simulation_with_parameters(simulation_func: Callable,
     for param, value in parameters_dict.items():
         parameters[param] = value
 
+    # Measuring also the CPU time, which is not affected by other processes
     start_time = time.perf_counter()
+    start_cpu_time = time.process_time()
 
-    result = simulation_func(parameters=parameters)
+    # Reusing the simulation object from the previous run, so that only
+    #   the parts affected by the changed parameters are prepared again
+    result = simulation_func(parameters=parameters,
+                             use_cache=False,
+                             reuse_simulation=True)
 
+    cpu_time_diff = round(time.process_time() - start_cpu_time, 3)
     end_time = time.perf_counter()
     time_diff = round(end_time - start_time, 3)
 
-    process_results(file_name, parameters_dict, result["error_value"], time_diff)
+    process_results(file_name, parameters_dict, result["error_value"], time_diff, cpu_time_diff)
 
 
 def aggregate_all_tests(simulation_func: Callable,
@@ -98,6 +106,7 @@ def aggregate_all_tests(simulation_func: Callable,
         headers = param_names[:]
         headers.append("error")
         headers.append("time")
+        headers.append("cpu_time")
         csv_writer.writerow(headers)
 
     all_permutations = list(itertools.product(*all_variable_param_values))
@@ -2,18 +2,26 @@
 This module provides common functionality for the parameters testing
 """
 
+import io
 import json
 import time
 import os
+import contextlib
 from collections import defaultdict
 from typing import Callable, Dict, Any
 import matplotlib.pyplot as plt  # type: ignore
 
+from NumericalOperators import operator_cache
+from heat_transfer_results_cache import get_code_version
+from simulation_timing import get_robust_statistics, get_machine_description, get_system_load
 
-def _get_average_values_from_results(results: dict) -> dict:
+
+def _get_statistics_from_results(results: dict) -> dict:
     """
-    Is averaging values from multiple simulations, to account for the fact
-        that CPU can have different speed at different times
+    Is aggregating values from multiple simulations - the times are
+        described by their median and interquartile range (after rejecting
+        the outliers), as the CPU can have different speed at different times
+        and the timing has a long tail, which would spoil the average
     In order to avoid problems with converting to json later, we are
         stringifying all the keys
 
@@ -21,24 +29,12 @@ def _get_average_values_from_results(results: dict) -> dict:
     {
         "number_of_elements": [
             {
-                "10": {
-                    "time": 0.553,
-                    "error": 0.557
-                },
-                "30": {
-                    "time": 0.647,
-                    "error": 0.464
-                }
+                "10": {"time": 0.553, "cpu_time": 0.550, "error": 0.557},
+                "30": {"time": 0.647, "cpu_time": 0.640, "error": 0.464}
             },
             {
-                "10": {
-                    "time": 0.521,
-                    "error": 0.557
-                },
-                "30": {
-                    "time": 0.786,
-                    "error": 0.464
-                }
+                "10": {"time": 0.521, "cpu_time": 0.519, "error": 0.557},
+                "30": {"time": 0.786, "cpu_time": 0.650, "error": 0.464}
             }
         ]
     }
@@ -49,47 +45,43 @@ def _get_average_values_from_results(results: dict) -> dict:
         "number_of_elements": {
             "10": {
                 "time": 0.537,
-                "error": 0.557
+                "error": 0.557,
+                "wall_time": {"median": 0.537, "q1": ..., "q3": ..., "iqr": ...,
+                              "count": 2, "rejected_outliers": 0, "samples": [...]},
+                "cpu_time": {...}
             },
-            "30": {
-                "time": 0.717,
-                "error": 0.464
-            }
+            "30": {...}
         }
     }
     """
 
-    averages: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
-
-    # Filling the averages with the empty data, to be filled later
-    for parameter, simulation_list in results.items():
-        simulation_values = simulation_list[0].keys()
-        for value in simulation_values:
-            value = str(value)
-            averages[parameter][value] = {"time": [], "error": []}
+    measurements: Dict[str, Dict[str, Dict[str, list]]] = defaultdict(dict)
 
-    # Filling the averages with all the available data
+    # Collecting all the measurements of each parameter value
     for parameter, simulation_list in results.items():
         for simulation in simulation_list:
             for simulation_value, simulation_result in simulation.items():
                 simulation_value = str(simulation_value)
-                sim_time = simulation_result["time"]
-                sim_error = simulation_result["error"]
-                averages[parameter][simulation_value]["time"].append(sim_time)
-                averages[parameter][simulation_value]["error"].append(sim_error)
-
-    print(80*"*")
-    print(averages)
-
-    # Aggregating all the values into one average ones
-    for parameter, values_dict in averages.items():
-        for value, key_dict in values_dict.items():
-            value = str(value)
-            for key, list_of_measurements in key_dict.items():
-                average_value = round(sum(list_of_measurements) / len(list_of_measurements), 3)
-                averages[parameter][value][key] = average_value
+                value_measurements = measurements[parameter].setdefault(
+                    simulation_value, {"time": [], "cpu_time": [], "error": []})
+                for key in value_measurements:
+                    value_measurements[key].append(simulation_result[key])
+
+    statistics: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+    for parameter, values_dict in measurements.items():
+        for value, value_measurements in values_dict.items():
+            wall_time = get_robust_statistics(value_measurements["time"])
+            cpu_time = get_robust_statistics(value_measurements["cpu_time"])
+            statistics[parameter][value] = {
+                # Median is kept under the old name, for the plots
+                "time": round(wall_time["median"], 3),
+                # Error is not depending on the CPU speed
+                "error": round(sum(value_measurements["error"]) / len(value_measurements["error"]), 3),
+                "wall_time": wall_time,
+                "cpu_time": cpu_time,
+            }
 
-    return averages
+    return statistics
 
 
 def _show_data_in_jpg(data: dict,
@@ -152,15 +144,27 @@ def _run_simulation(simulation_func: Callable,
         error of the simulation
     """
 
+    # Wall time is including the waiting for other processes, CPU time
+    #   only the computation of this process - when they differ much,
+    #   the machine was busy
     start_time = time.perf_counter()
+    start_cpu_time = time.process_time()
 
-    result = simulation_func(parameters=parameters)
+    # Never taking the results from cache, we want to measure the real time
+    # Reusing the simulation object from the previous run, so that only
+    #   the parts affected by the changed parameter are prepared again
+    # The simulation is printing its results, which is not wanted here
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = simulation_func(parameters=parameters,
+                                 use_cache=False,
+                                 reuse_simulation=True)
 
-    end_time = time.perf_counter()
-    time_diff = round(end_time - start_time, 3)
+    cpu_time_diff = time.process_time() - start_cpu_time
+    time_diff = time.perf_counter() - start_time
 
     return {
         "time": time_diff,
+        "cpu_time": cpu_time_diff,
         "error": result["error_value"]
     }
 
@@ -205,20 +209,42 @@ def _run_multiple_simulations(simulation_func: Callable,
         results[value] = result
         print(result)
 
-        # Sleeping some time to "cool off"
-        time.sleep(0.1)
-
     return results
 
 
 def aggregate_all_tests(simulation_func: Callable,
                         testing_scenarios: list,
                         no_of_repetitions: int = 1,
-                        description: str = "classic"):
+                        description: str = "classic",
+                        no_of_warmup_runs: int = 1) -> str:
     """
-    Running all the testing scenarios specified number of times
+    Running all the testing scenarios specified number of times,
+        returning the file name with the results
+
+    The first runs are not measured (warm-up) - they are loading the data,
+        filling the caches and letting the CPU reach its working frequency.
+    The repetitions are interleaved (all the scenarios, then again all
+        the scenarios ...), so that any slow period of the machine affects
+        all the values equally and not only some of them.
     """
 
+    # Warming up, without storing anything
+    for _ in range(no_of_warmup_runs):
+        for scenario in testing_scenarios:
+            _run_multiple_simulations(simulation_func=simulation_func,
+                                      parameter=scenario["parameter"],
+                                      values=scenario["values"])
+
+    metadata = {
+        "timestamp": int(time.time()),
+        "description": description,
+        "no_of_repetitions": no_of_repetitions,
+        "no_of_warmup_runs": no_of_warmup_runs,
+        "code_version": get_code_version(),
+        "machine": get_machine_description(),
+        "load_before": get_system_load(),
+    }
+
     results: Dict[str, list] = defaultdict(list)
 
     # Running the tests multiple times, to account for variable CPU speed
@@ -232,10 +258,11 @@ def aggregate_all_tests(simulation_func: Callable,
 
             results[parameter].append(result)
 
-            # Sleeping some time to "cool off"
-            time.sleep(0.5)
+    metadata["load_after"] = get_system_load()
+    statistics = _get_statistics_from_results(results)
 
-    averages = _get_average_values_from_results(results)
+    # Showing how many simulations could reuse already assembled matrices
+    print("Operator cache statistics: {}".format(operator_cache.info()))
 
     # Saving the results to a json file
     now = int(time.time())
@@ -246,7 +273,9 @@ def aggregate_all_tests(simulation_func: Callable,
     file_name = "{}/{}-{}rep-{}.json".format(directory_for_results, now,
                                              no_of_repetitions, description)
     with open(file_name, 'w') as outfile:
-        json.dump(averages, outfile, indent=4)
+        json.dump({"metadata": metadata, "results": statistics}, outfile, indent=4)
 
     # Saving the data to a graph
-    _show_data_in_jpg(data=averages, file_name=file_name, description=description)
+    _show_data_in_jpg(data=statistics, file_name=file_name, description=description)
+
+    return file_name
@@ -24,7 +24,8 @@ def get_data(file_name: str) -> dict:
 
     with open(file_name, "r") as json_file:
         content = json.load(json_file)
-    return content
+    # Newer files are also containing the metadata of the measurement
+    return content.get("results", content)
 
 
 def show_data(data: dict):
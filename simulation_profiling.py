@@ -0,0 +1,143 @@
+"""
+This module is profiling the whole simulation runs, without the need
+    to decorate any function by @profile (as for the line_profiler
+    outputs in the Profilings directory)
+
+Two profiles are captured at once:
+    - deterministic (cProfile) - saved as .pstats file, which can be
+      explored by "python -m pstats file.pstats" or snakeviz
+    - statistical - the call stack of the simulation is sampled in regular
+      intervals and the samples are saved in the collapsed-stack format
+      ("outer;inner;innermost count" per line), which can be rendered
+      as a flame graph (flamegraph.pl, speedscope.app, inferno)
+Both files are named after the id of the run.
+
+Usage:
+    with SimulationProfiler(run_id="Classic-1600000000") as profiler:
+        ... run the simulation ...
+    print(profiler.summary())
+"""
+
+import os
+import sys
+import time
+import cProfile
+import threading
+from collections import Counter
+from typing import Optional
+
+# Where the profiles are stored by default
+WORKING_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_PROFILE_DIRECTORY = os.path.join(WORKING_DIRECTORY, "Profilings")
+
+
+def get_run_id(algorithm: str) -> str:
+    """
+    Creating the identifier of the run, unique also when more runs
+        are started at the same time in more processes
+
+    Args:
+        algorithm ... which simulation is being run (classic, inverse)
+    """
+
+    return "{}-{}-{}".format(algorithm.capitalize(), int(time.time()), os.getpid())
+
+
+class SimulationProfiler:
+    """
+    Class capturing the profiles of the code run inside its context
+        (only the thread that entered the context is being profiled)
+    """
+
+    def __init__(self,
+                 run_id: str,
+                 profile_directory: str = DEFAULT_PROFILE_DIRECTORY,
+                 sample_interval: float = 0.001) -> None:
+        """
+        Args:
+            run_id ... identifier of the run, naming the profile files
+            profile_directory ... where to store the profile files
+            sample_interval ... how often to sample the call stack (in seconds)
+        """
+
+        self.run_id = run_id
+        self.profile_directory = profile_directory
+        self.sample_interval = sample_interval
+        self.pstats_path = os.path.join(profile_directory, "{}.pstats".format(run_id))
+        self.collapsed_path = os.path.join(profile_directory, "{}.collapsed".format(run_id))
+
+        self.samples: Counter = Counter()
+        self._profile = cProfile.Profile()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop_sampling = threading.Event()
+        self._thread_id = threading.get_ident()
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.run_id: {self.run_id},
+            self.profile_directory: {self.profile_directory},
+            self.sample_interval: {self.sample_interval},
+            """
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._stop_sampling.clear()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._profile.disable()
+        self._stop_sampling.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.save()
+
+    def _sample(self) -> None:
+        """
+        Recording the call stack of the profiled thread until stopped
+            (is running in its own thread)
+        """
+
+        while not self._stop_sampling.wait(self.sample_interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename),
+                                                 code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                # Outermost function is the first in the collapsed stack
+                self.samples[";".join(reversed(stack))] += 1
+
+    def save(self) -> None:
+        """
+        Writing both the profiles into their files
+        """
+
+        os.makedirs(self.profile_directory, exist_ok=True)
+        self._profile.dump_stats(self.pstats_path)
+
+        with open(self.collapsed_path, "w") as collapsed_file:
+            for stack, count in sorted(self.samples.items()):
+                collapsed_file.write("{} {}\n".format(stack, count))
+
+    def summary(self) -> dict:
+        """
+        Describing where the profiles are stored
+        """
+
+        return {
+            "run_id": self.run_id,
+            "pstats": self.pstats_path,
+            "collapsed": self.collapsed_path,
+            "number_of_samples": sum(self.samples.values()),
+        }
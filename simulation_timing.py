@@ -0,0 +1,287 @@
+"""
+This module is measuring how much time the simulation spends in its
+    individual phases (assembly of the equation, linear solve, probe
+    interpolation, error evaluation, checkpoints, callbacks and plotting)
+
+The timing is turned off by default and then it costs nothing - the
+    PhaseTimer is replacing the methods of one simulation object by their
+    timed versions only when attached to it, and is restoring them back
+    when detached. The measured durations are aggregated into counts,
+    sums and histograms, which can be exported as JSON.
+
+Usage:
+    timer = PhaseTimer()
+    timer.attach(Sim)
+    ... run the simulation ...
+    timer.detach(Sim)
+    timer.save("timing.json")
+
+It also offers the robust statistics of the repeated measurements and
+    the description of the machine, so that the measurements done at
+    different times or on different machines are not compared blindly.
+"""
+
+import os
+import json
+import math
+import time
+import platform
+from typing import Optional
+
+import numpy as np  # type: ignore
+
+# Phases of the simulation and the methods in which they happen
+#   - only the methods the simulation really has are timed
+#   - the phases can be nested (step contains the assembly, the solve ...)
+SIMULATION_PHASES = {
+    "step": ["evaluate_one_step"],
+    "rhs_assembly": ["_assemble_rhs"],
+    "linear_solve": ["_solve_system"],
+    "probe_interpolation": ["_interpolate_probe"],
+    "error_evaluation": ["_evaluate_window_error_norm", "_calculate_final_error"],
+    "checkpoint": ["_make_checkpoint"],
+    "revert": ["_revert_to_checkpoint"],
+    "plotting": ["plot"],
+}
+
+# Upper bounds of the histogram buckets in seconds (1 us, 2 us, 4 us ... ~ 17 s),
+#   everything longer is in the last bucket
+HISTOGRAM_BOUNDS = [1e-6 * 2**i for i in range(25)]
+
+
+class PhaseStatistics:
+    """
+    Class aggregating the durations of one phase
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.count: {self.count},
+            self.total: {self.total},
+            self.minimum: {self.minimum},
+            self.maximum: {self.maximum},
+            """
+
+    def add(self, duration: float) -> None:
+        """
+        Including one measured duration
+
+        Args:
+            duration ... how long the phase took (in seconds)
+        """
+
+        self.count += 1
+        self.total += duration
+        if duration < self.minimum:
+            self.minimum = duration
+        if duration > self.maximum:
+            self.maximum = duration
+
+        # Buckets are doubling, so the index is given by the logarithm
+        bucket_idx = 0 if duration <= HISTOGRAM_BOUNDS[0] \
+            else math.ceil(math.log2(duration / HISTOGRAM_BOUNDS[0]))
+        self.histogram[min(bucket_idx, len(HISTOGRAM_BOUNDS))] += 1
+
+    def to_dict(self) -> dict:
+        """
+        Summarizing the phase (durations in milliseconds)
+        """
+
+        return {
+            "count": self.count,
+            "total_ms": 1000 * self.total,
+            "mean_ms": 1000 * self.total / self.count if self.count else 0.0,
+            "min_ms": 1000 * self.minimum if self.count else 0.0,
+            "max_ms": 1000 * self.maximum,
+            # Only the non-empty buckets, identified by their upper bound
+            "histogram": {"{:g}us".format(1e6 * bound) if idx < len(HISTOGRAM_BOUNDS) else "longer": count
+                          for idx, (bound, count) in enumerate(zip(HISTOGRAM_BOUNDS + [math.inf], self.histogram))
+                          if count},
+        }
+
+
+class PhaseTimer:
+    """
+    Class measuring the phases of the simulation
+    """
+
+    def __init__(self, phases: Optional[dict] = None) -> None:
+        """
+        Args:
+            phases ... which methods belong to which phase
+                       (SIMULATION_PHASES when not specified)
+        """
+
+        self.phases = phases or SIMULATION_PHASES
+        self.statistics: dict = {}
+        # Total time between attaching and detaching
+        self.wall_time = 0.0
+        self._attach_time: Optional[float] = None
+
+    def __repr__(self) -> str:
+        """
+        Defining what should be displayed when we print the
+            object of this class.
+        Very useful for debugging purposes.
+        """
+
+        return f"""
+            self.phases: {self.phases},
+            self.statistics: {self.statistics},
+            """
+
+    def timed(self, phase: str, function):
+        """
+        Returning the version of the function measuring its duration
+
+        Args:
+            phase ... to which phase the duration belongs
+            function ... function to be measured
+        """
+
+        phase_statistics = self.statistics.setdefault(phase, PhaseStatistics())
+        perf_counter = time.perf_counter
+
+        def timed_function(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                phase_statistics.add(perf_counter() - start)
+
+        timed_function.__wrapped__ = function  # type: ignore
+        return timed_function
+
+    def attach(self, obj) -> None:
+        """
+        Starting to measure the phases of the object (simulation
+            or callback), by shadowing its methods with the timed ones
+
+        Args:
+            obj ... object whose methods should be measured
+        """
+
+        if self._attach_time is None:
+            self._attach_time = time.perf_counter()
+
+        for phase, method_names in self.phases.items():
+            for method_name in method_names:
+                # Not timing what is already timed or what does not exist
+                if method_name in vars(obj) or not hasattr(obj, method_name):
+                    continue
+                setattr(obj, method_name, self.timed(phase, getattr(obj, method_name)))
+
+    def detach(self, obj) -> None:
+        """
+        Stopping the measurement - the object has its original methods again
+
+        Args:
+            obj ... object whose methods were measured
+        """
+
+        if self._attach_time is not None:
+            self.wall_time += time.perf_counter() - self._attach_time
+            self._attach_time = None
+
+        for method_names in self.phases.values():
+            for method_name in method_names:
+                method = vars(obj).get(method_name)
+                if hasattr(method, "__wrapped__"):
+                    delattr(obj, method_name)
+
+    def summary(self) -> dict:
+        """
+        Summarizing all the phases
+        """
+
+        return {
+            "wall_time_ms": 1000 * self.wall_time,
+            "phases": {phase: phase_statistics.to_dict()
+                       for phase, phase_statistics in self.statistics.items()
+                       if phase_statistics.count},
+        }
+
+    def save(self, file_path: str) -> None:
+        """
+        Exporting the summary into a JSON file
+
+        Args:
+            file_path ... where to write the summary
+        """
+
+        with open(file_path, "w") as json_file:
+            json.dump(self.summary(), json_file, indent=4)
+
+
+def get_robust_statistics(samples: list, outlier_factor: float = 1.5) -> dict:
+    """
+    Describing the repeated measurements by their median and interquartile
+        range, after rejecting the outliers (Tukey's fences - the values
+        further than outlier_factor*IQR from the quartiles)
+    Timing is having a long tail (other processes, garbage collection ...),
+        which would spoil the mean, but not the median
+
+    Args:
+        samples ... measured values
+        outlier_factor ... how far from the quartiles the outliers start
+    """
+
+    values = np.asarray(samples, dtype=float)
+    q1, q3 = np.percentile(values, [25, 75])
+    iqr = q3 - q1
+    kept = values[(values >= q1 - outlier_factor*iqr) & (values <= q3 + outlier_factor*iqr)]
+
+    q1, median, q3 = np.percentile(kept, [25, 50, 75])
+    return {
+        "median": float(median),
+        "q1": float(q1),
+        "q3": float(q3),
+        "iqr": float(q3 - q1),
+        "count": int(len(kept)),
+        "rejected_outliers": int(len(values) - len(kept)),
+        "samples": [float(value) for value in values],
+    }
+
+
+def get_machine_description() -> dict:
+    """
+    Describing the machine, as only the measurements from the same
+        machine can be compared
+    """
+
+    return {
+        "node": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def get_system_load() -> dict:
+    """
+    Describing how busy the machine is right now (the average number
+        of running processes in the last 1, 5 and 15 minutes)
+    """
+
+    try:
+        load_1, load_5, load_15 = os.getloadavg()
+    except (AttributeError, OSError):
+        # Not available on Windows
+        return {}
+
+    return {"load_1min": load_1, "load_5min": load_5, "load_15min": load_15}
@@ -5,12 +5,45 @@ This unittesting module wants to make sure we accidentally
 """
 
 import unittest
+import asyncio
 import os
 import subprocess
 import sys
+import tempfile
+import time
+import signal
+import multiprocessing
+import socket
+import json
+import pstats
+import threading
+import urllib.error
+import urllib.request
+import numpy as np  # type: ignore
 
 import heat_transfer_simulation as classic_sim
 import heat_transfer_simulation_inverse as inverse_sim
+from heat_transfer_results_cache import SimulationResultsCache
+from heat_transfer_simulation_utilities import AsyncSimulationController, SimulationController
+from NumericalForward import Simulation
+from NumericalInverse import InverseSimulation
+from NumericalOperators import OperatorCache, Mesh, get_nodal_volumes
+from interpolations import predefined_interp_class_factory
+from NumericalLive import LiveSimulation
+from NumericalParareal import PararealSimulation
+from NumericalInverseOnline import OnlineInverseSimulation, LiveOnlineInverseSimulation
+from experiment_data_live import CSVTailSource, SocketSource, LiveExperimentalData
+from experiment_data_handler import ExperimentalData, ExperimentDataCannotBeParsedError, Material, Layer, \
+    TemperatureDependentMaterial, PhaseChangeMaterial, FileHashCache, get_file_hash, create_material
+from heat_transfer_worker_pool import WarmWorkerPool, connect_to_worker_pool, get_authkey_path
+import heat_transfer_batch
+import heat_transfer_benchmarks
+import heat_transfer_verification
+import heat_transfer_discretization
+from heat_transfer_discretization import plan_discretization
+from heat_transfer_job_service import JobService, create_server
+from simulation_timing import PhaseTimer, get_robust_statistics
+from heat_transfer_materials import MaterialService
 
 
 class TestClassicSimulation(unittest.TestCase):
@@ -78,6 +111,1526 @@ class TestInverseSimulation(unittest.TestCase):
         self.assertTrue(result["error_value"] < threshold_error_value)
 
 
+class TestSimulationResultsCache(unittest.TestCase):
+    def test_cache_hit(self):
+        """
+        Storing the results of a simulation into the cache and making sure
+            the same results are returned for the same parameters, and
+            none are returned for different parameters
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 50,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        with tempfile.TemporaryDirectory() as cache_directory:
+            results_cache = SimulationResultsCache(cache_directory=cache_directory)
+            cache_key = results_cache.get_key(algorithm="classic", parameters=parameters)
+            self.assertIsNone(results_cache.load(cache_key))
+
+            Sim = classic_sim.Simulation(length=parameters["object_length"],
+                                         material=Material(7850, 520, 50),
+                                         N=parameters["number_of_elements"],
+                                         theta=parameters["theta"],
+                                         robin_alpha=parameters["robin_alpha"],
+                                         dt=parameters["dt"],
+                                         x0=parameters["place_of_interest"],
+                                         experiment_data_path=parameters["experiment_data_path"])
+            while not Sim.simulation_has_finished:
+                Sim.evaluate_one_step()
+            Sim.after_simulation_action()
+            results_cache.save(cache_key, Sim)
+
+            cached_result = results_cache.load(cache_key)
+            self.assertEqual(cached_result["error_value"], Sim.error_norm)
+            self.assertEqual(list(cached_result["temperature"]), list(Sim.T_x0))
+
+            # Callback period is not changing the result, but dt is
+            self.assertEqual(cache_key, results_cache.get_key(
+                algorithm="classic", parameters={**parameters, "callback_period": 10}))
+            self.assertNotEqual(cache_key, results_cache.get_key(
+                algorithm="classic", parameters={**parameters, "dt": 10}))
+
+
+class TestOperatorCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        """
+        Making sure the same operators are reused for the same parameters,
+            and new ones are assembled only when something changes
+        """
+
+        cache = OperatorCache(max_size=2)
+        arguments = {"N": 10, "dt": 1, "theta": 0.5, "robin_alpha": 13.5,
+                     "length": 0.01, "rho": 7850, "cp": 520, "lmbd": 50}
+
+        operators = cache.get(**arguments)
+        self.assertIs(operators, cache.get(**arguments))
+        self.assertIsNot(operators, cache.get(**{**arguments, "dt": 2}))
+        self.assertEqual(cache.info()["hits"], 1)
+        self.assertEqual(cache.info()["misses"], 2)
+
+        # The least recently used operators should be forgotten
+        cache.get(**{**arguments, "theta": 1.0})
+        self.assertEqual(cache.info()["size"], 2)
+        self.assertIsNot(operators, cache.get(**arguments))
+
+
+class TestSimulationRerun(unittest.TestCase):
+    def test_rerun_equals_new_simulation(self):
+        """
+        Rerunning the simulation with some changed parameters must give
+            the same result as creating a completely new simulation
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 20,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "window_span": 3,
+            "tolerance": 1e-05,
+            "init_q_adjustment": 20,
+            "adjusting_value": -0.7,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        Prob = inverse_sim._get_simulation(parameters)
+        first_result = Prob.rerun()
+        self.assertEqual(first_result, Prob.rerun())
+
+        changed_parameters = {**parameters, "dt": 30, "number_of_elements": 15, "window_span": 2}
+        rerun_result = Prob.rerun(**inverse_sim.get_simulation_arguments(changed_parameters))
+        new_result = inverse_sim._get_simulation(changed_parameters).rerun()
+        self.assertEqual(rerun_result, new_result)
+        self.assertNotEqual(rerun_result, first_result)
+
+
+class TestExperimentalData(unittest.TestCase):
+    def test_binary_cache(self):
+        """
+        Making sure the data loaded from the binary sidecar are the same
+            as the ones parsed from CSV, and that the sidecar is not used
+            when the file changes
+        """
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "data.csv")
+            with open(file_path, "w") as csv_file:
+                csv_file.write("Time,Temperature,T_amb,Other\n0,20,19,5\n1,21,19\n2,23,19\n")
+
+            parsed_data = ExperimentalData(file_path)
+            self.assertTrue(os.path.isfile(file_path + ".cache.npy"))
+            self.assertIsInstance(parsed_data.t_data, np.memmap)
+            cached_data = ExperimentalData(file_path)
+            self.assertEqual(list(cached_data.T_data), [20, 21, 23])
+            self.assertEqual(list(cached_data.q_data), [0, 0, 0])
+            self.assertEqual(list(parsed_data.t_data), list(cached_data.t_data))
+
+            with open(file_path, "a") as csv_file:
+                csv_file.write("3,24,19\n")
+            self.assertEqual(list(ExperimentalData(file_path).T_data), [20, 21, 23, 24])
+
+            # Hash of the same file is taken from the sidecar, not computed again
+            description_path = file_path + ".cache.json"
+            with open(description_path) as description_file:
+                description = json.load(description_file)
+            self.assertEqual(description["hash"], get_file_hash(file_path))
+            with open(description_path, "w") as description_file:
+                json.dump({**description, "hash": "remembered"}, description_file)
+            self.assertEqual(FileHashCache().get(file_path), "remembered")
+            os.utime(file_path, ns=(description["mtime"] + 10**9, description["mtime"] + 10**9))
+            self.assertEqual(FileHashCache().get(file_path), get_file_hash(file_path))
+
+            # Parsing in chunks is the same as at once
+            class ExperimentalDataInSmallChunks(ExperimentalData):
+                PARSING_CHUNK_SIZE = 3
+
+            with open(file_path, "w") as csv_file:
+                csv_file.write("Time,Temperature,HeatFlux,T_amb\n")
+                csv_file.write("\n".join("{},{},{},19".format(i, 20 + i, i % 3) for i in range(10)))
+                csv_file.write("\n\n# comment\n10,30,1,19\n")
+            chunked_data = ExperimentalDataInSmallChunks(file_path)
+            self.assertIsInstance(chunked_data.t_data, np.memmap)
+            in_memory_data = ExperimentalData(file_path, use_binary_cache=False)
+            for quantity in ["t_data", "T_data", "q_data", "T_amb_data"]:
+                self.assertEqual(list(getattr(chunked_data, quantity)), list(getattr(in_memory_data, quantity)))
+            self.assertEqual(len(chunked_data.t_data), 11)
+
+            # Validation of the columns is happening even with binary data
+            with open(file_path, "w") as csv_file:
+                csv_file.write("Time,Temperature,HeatFlux\n0,20,1\n")
+            with self.assertRaises(ExperimentDataCannotBeParsedError):
+                ExperimentalData(file_path)
+
+
+class TestStreamingSimulation(unittest.TestCase):
+    def test_same_as_classic(self):
+        """
+        Simulating in chunks must give exactly the same results as
+            having all the data in memory
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        Sim = classic_sim._get_simulation(parameters)
+        Sim.rerun()
+
+        with tempfile.TemporaryDirectory() as directory:
+            result_file_path = os.path.join(directory, "result.npy")
+            StreamingSim = classic_sim.StreamingSimulation(
+                chunk_size=50, result_file_path=result_file_path,
+                **classic_sim.get_simulation_arguments(parameters))
+            StreamingSim.rerun()
+
+            self.assertEqual(Sim.error_norm, StreamingSim.error_norm)
+            self.assertEqual(list(Sim.T_x0), list(StreamingSim.T_x0))
+            del StreamingSim
+
+    def test_result_files(self):
+        """
+        Temporary result files must be unique and deleted when closed,
+            the specified ones must be kept
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 50,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 10,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        simulations = [classic_sim.StreamingSimulation(chunk_size=50,
+                                                       **classic_sim.get_simulation_arguments(parameters))
+                       for _ in range(2)]
+        self.assertNotEqual(simulations[0].result_file_path, simulations[1].result_file_path)
+        for StreamingSim in simulations:
+            StreamingSim.rerun()
+            StreamingSim.close()
+            self.assertFalse(os.path.exists(StreamingSim.result_file_path))
+
+        with tempfile.TemporaryDirectory() as directory:
+            result_file_path = os.path.join(directory, "result.npy")
+            result = classic_sim.create_and_run_simulation({**parameters, "streaming_chunk_size": 50,
+                                                            "streaming_result_path": result_file_path})
+            T_x0 = np.load(result_file_path)
+            self.assertEqual(len(T_x0), len(simulations[0].t))
+            self.assertGreater(result["error_value"], 0)
+
+
+class TestLiveSimulation(unittest.TestCase):
+    def test_same_as_classic(self):
+        """
+        Simulating the data as they are being written must give the same
+            results as simulating the finished experiment
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        Sim = classic_sim._get_simulation(parameters)
+        Sim.rerun()
+
+        with open("DATA.csv") as csv_file:
+            lines = csv_file.readlines()
+        half = len(lines) // 2
+
+        with tempfile.TemporaryDirectory() as directory:
+            data_path = os.path.join(directory, "live.csv")
+            with open(data_path, "w") as data_file:
+                data_file.writelines(lines[:half])
+
+            simulation_arguments = classic_sim.get_simulation_arguments(parameters)
+            del simulation_arguments["experiment_data_path"]
+            data_source = CSVTailSource(data_path, idle_timeout=0.2)
+            LiveSim = LiveSimulation(data_source=data_source, wait_timeout=0.01,
+                                     **simulation_arguments)
+
+            # Catching up with the first half, then the experiment continues
+            while LiveSim.current_step_idx < LiveSim.max_step_idx:
+                LiveSim.evaluate_one_step()
+            self.assertFalse(LiveSim.simulation_has_finished)
+
+            with open(data_path, "a") as data_file:
+                data_file.writelines(lines[half:])
+            while not LiveSim.simulation_has_finished:
+                LiveSim.evaluate_one_step()
+            LiveSim.after_simulation_action()
+            data_source.close()
+
+        self.assertEqual(Sim.error_norm, LiveSim.error_norm)
+        self.assertEqual(list(Sim.T_x0), list(LiveSim.T_x0))
+        self.assertEqual(LiveSim.latency_statistics()["count"], len(lines) - 1)
+
+
+    def test_socket_keeps_data_before_reset(self):
+        """
+        Data received before the connection broke must not be lost,
+            and the base class must not be usable without the reader
+        """
+
+        class BrokenConnection:
+            def __init__(self, chunks):
+                self.chunks = list(chunks)
+
+            def recv(self, size):
+                if self.chunks:
+                    return self.chunks.pop(0)
+                raise ConnectionResetError("Connection reset by peer")
+
+            def close(self):
+                pass
+
+        with socket.socket() as server:
+            server.bind(("127.0.0.1", 0))
+            server.listen(1)
+            data_source = SocketSource(port=server.getsockname()[1])
+            data_source._socket.close()
+
+        data_source._socket = BrokenConnection([b"Time,Temperature,HeatFlux,T_amb\n0,20,1,20\n",
+                                                b"1,21,2,20\n2,22,3,20"])
+        self.assertEqual(data_source.poll(), 3)
+        self.assertTrue(data_source.closed)
+        self.assertEqual(list(data_source.T_data), [20, 21, 22])
+
+        with self.assertRaises(TypeError):
+            LiveExperimentalData()  # type: ignore
+
+
+class TestOnlineInverseSimulation(unittest.TestCase):
+    def test_live_same_as_file(self):
+        """
+        Online estimation must give the same heat fluxes regardless of
+            whether the data are arriving or are all available, and every
+            step must be timed
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        Sim = OnlineInverseSimulation(lag=5, **classic_sim.get_simulation_arguments(parameters))
+        Sim.rerun()
+
+        simulation_arguments = classic_sim.get_simulation_arguments(parameters)
+        del simulation_arguments["experiment_data_path"]
+        data_source = CSVTailSource("DATA.csv", idle_timeout=0.1)
+        LiveSim = LiveOnlineInverseSimulation(data_source=data_source, wait_timeout=0.01,
+                                              lag=5, **simulation_arguments)
+        while not LiveSim.simulation_has_finished:
+            LiveSim.evaluate_one_step()
+        LiveSim.after_simulation_action()
+        data_source.close()
+
+        self.assertEqual(list(Sim.HeatFlux), list(LiveSim.HeatFlux))
+        self.assertEqual(len(Sim.emitted_heat_flux), len(Sim.t))
+        self.assertEqual(len(Sim.step_durations), Sim.max_step_idx)
+        self.assertLess(Sim.error_norm, 150)
+        self.assertEqual(LiveSim.online_statistics()["emission_delay_ms"]["count"], len(Sim.t))
+
+
+class TestPararealSimulation(unittest.TestCase):
+    def test_same_as_classic(self):
+        """
+        Time-parallel simulation must converge to the sequential results
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        Sim = classic_sim._get_simulation(parameters)
+        Sim.rerun()
+
+        ParallelSim = classic_sim._get_simulation({**parameters, "parallel_time_slices": 3})
+        ParallelSim.rerun()
+
+        self.assertEqual(Sim.error_norm, ParallelSim.error_norm)
+        self.assertLessEqual(ParallelSim.number_of_iterations, 3)
+        for sequential_value, parallel_value in zip(Sim.T_x0, ParallelSim.T_x0):
+            self.assertAlmostEqual(sequential_value, parallel_value, places=5)
+
+    def test_only_linear_model(self):
+        """
+        Simulations relying on the constant matrices must refuse the nonlinear
+            material and radiation, also when they are reconfigured to them
+        """
+
+        melting_material = PhaseChangeMaterial(7850, 520, 50, melting_temperature=25, latent_heat=8010)
+        for simulation_class in [PararealSimulation, OnlineInverseSimulation]:
+            with self.assertRaises(ValueError):
+                simulation_class(N=10, dt=50, theta=0.5, robin_alpha=13.5, x0=0.0045,
+                                 length=0.01, material=melting_material)
+
+            Sim = simulation_class(N=10, dt=50, theta=0.5, robin_alpha=13.5, x0=0.0045,
+                                   length=0.01, material=Material(7850, 520, 50))
+            with self.assertRaises(ValueError):
+                Sim.reconfigure(material=melting_material)
+            with self.assertRaises(ValueError):
+                Sim.reconfigure(material=Material(7850, 520, 50), emissivity=0.8)
+
+
+class TestSegmentedInverseSimulation(unittest.TestCase):
+    def test_error_close_to_sequential(self):
+        """
+        Solving the segments in parallel must give almost the same error
+            as solving the whole experiment at once
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 15,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "window_span": 3,
+            "tolerance": 1e-05,
+            "init_q_adjustment": 20,
+            "adjusting_value": -0.7,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        Sim = inverse_sim._get_simulation(parameters)
+        Sim.rerun()
+
+        SegmentedSim = inverse_sim._get_simulation({**parameters, "parallel_time_segments": 4})
+        SegmentedSim.rerun()
+
+        self.assertEqual(len(SegmentedSim.HeatFlux), len(Sim.HeatFlux))
+        self.assertAlmostEqual(SegmentedSim.error_norm, Sim.error_norm,
+                               delta=0.05*Sim.error_norm)
+
+    def test_temperature_dependent_segments(self):
+        """
+        Segments must be solved with the temperature dependent properties,
+            not with the constant ones
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 15,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "window_span": 3,
+            "tolerance": 1e-05,
+            "init_q_adjustment": 20,
+            "adjusting_value": -0.7,
+            "experiment_data_path": "DATA.csv",
+            "temperature_table": {"temperatures": [0, 20, 40, 60],
+                                  "cp_values": [400, 500, 700, 800],
+                                  "lmbd_values": [70, 50, 40, 35]},
+        }
+
+        Sim = inverse_sim._get_simulation(parameters)
+        Sim.rerun()
+
+        SegmentedSim = inverse_sim._get_simulation({**parameters, "parallel_time_segments": 4})
+        SegmentedSim.rerun()
+        LinearSegmentedSim = inverse_sim._get_simulation({**parameters, "parallel_time_segments": 4,
+                                                          "temperature_table": None})
+        LinearSegmentedSim.rerun()
+
+        difference = np.max(np.abs(SegmentedSim.HeatFlux - Sim.HeatFlux))
+        linear_difference = np.max(np.abs(LinearSegmentedSim.HeatFlux - Sim.HeatFlux))
+        self.assertLess(difference, 0.1*linear_difference)
+
+
+class TestWarmWorkerPool(unittest.TestCase):
+    def test_same_as_direct_run(self):
+        """
+        Simulations run in the worker processes must give the same results,
+            also when their plots and progress are being forwarded
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        class PlotMock:
+            def __init__(self):
+                self.number_of_plots = 0
+
+            def plot(self, *args, **kwargs):
+                self.number_of_plots += 1
+
+        expected_result = classic_sim.create_and_run_simulation(parameters)
+
+        pool = WarmWorkerPool(max_workers=1, preload_paths=["DATA.csv"])
+        try:
+            self.assertEqual(len(pool.warm_up()), 1)
+            # Second run is reusing the simulation object in the worker
+            for _ in range(2):
+                result = pool.run("classic", parameters)
+                self.assertEqual(result["error_value"], expected_result["error_value"])
+
+            temperature_plot = PlotMock()
+            result = pool.run("classic", parameters, temperature_plot=temperature_plot,
+                              heat_flux_plot=PlotMock())
+            self.assertEqual(result["error_value"], expected_result["error_value"])
+            self.assertGreater(temperature_plot.number_of_plots, 0)
+        finally:
+            pool.shutdown()
+
+
+    def test_server_with_secret_key(self):
+        """
+        Server must be reachable only with its random key, which is readable
+            only by the user who started it
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": os.path.abspath("DATA.csv")
+        }
+
+        with socket.socket() as free_socket:
+            free_socket.bind(("127.0.0.1", 0))
+            port = free_socket.getsockname()[1]
+
+        with tempfile.TemporaryDirectory() as directory:
+            environment = {**os.environ, "XDG_RUNTIME_DIR": directory}
+            server = subprocess.Popen([sys.executable, "heat_transfer_worker_pool.py",
+                                       "--port", str(port), "serve", "--workers", "1"],
+                                      env=environment)
+            old_runtime_directory = os.environ.get("XDG_RUNTIME_DIR")
+            os.environ["XDG_RUNTIME_DIR"] = directory
+            try:
+                authkey_path = get_authkey_path(port)
+                for _ in range(300):
+                    if os.path.exists(authkey_path) and os.path.getsize(authkey_path):
+                        break
+                    time.sleep(0.1)
+                self.assertEqual(os.stat(authkey_path).st_mode & 0o777, 0o600)
+
+                for _ in range(100):
+                    try:
+                        pool = connect_to_worker_pool(address=("127.0.0.1", port))
+                        break
+                    except ConnectionRefusedError:
+                        time.sleep(0.1)
+                with self.assertRaises(multiprocessing.AuthenticationError):
+                    connect_to_worker_pool(address=("127.0.0.1", port), authkey=b"heat-transfer-worker-pool")
+                result = pool.run("classic", parameters)
+                self.assertEqual(result["error_value"],
+                                 classic_sim.create_and_run_simulation(parameters)["error_value"])
+            finally:
+                if old_runtime_directory is None:
+                    del os.environ["XDG_RUNTIME_DIR"]
+                else:
+                    os.environ["XDG_RUNTIME_DIR"] = old_runtime_directory
+                server.send_signal(signal.SIGINT)
+                server.wait(timeout=30)
+
+            # Key is not left behind
+            self.assertFalse(os.path.exists(authkey_path))
+
+
+class TestBatchProcessing(unittest.TestCase):
+    def test_results_and_exit_code(self):
+        """
+        All the jobs must be run and their results written, and the failure
+            of any of them must be visible in the exit code
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 10,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 10,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "window_span": 2,
+            "tolerance": 1e-05,
+            "q_init": 0,
+            "init_q_adjustment": 20,
+            "adjusting_value": -0.7,
+            "experiment_data_path": os.path.abspath("DATA.csv")
+        }
+        jobs = {
+            "forward": {"algorithm": "classic", "parameters": parameters},
+            "inverse": {"algorithm": "inverse", "parameters": parameters},
+            "missing-data": {"algorithm": "classic",
+                             "parameters": {**parameters, "experiment_data_path": "MISSING.csv"}},
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            jobs_directory = os.path.join(directory, "jobs")
+            output_directory = os.path.join(directory, "results")
+            os.makedirs(jobs_directory)
+            for name, job in jobs.items():
+                with open(os.path.join(jobs_directory, name + ".json"), "w") as job_file:
+                    json.dump(job, job_file)
+
+            exit_code = heat_transfer_batch.main([jobs_directory, "--output-dir", output_directory,
+                                                  "--workers", "2"])
+            self.assertEqual(exit_code, 1)
+
+            expected_result = classic_sim.create_and_run_simulation(parameters)
+            with open(os.path.join(output_directory, "forward.json")) as job_file:
+                summary = json.load(job_file)
+            self.assertEqual(summary["status"], "finished")
+            self.assertEqual(summary["error_value"], expected_result["error_value"])
+            self.assertGreaterEqual(summary["wall_time"], summary["computation_time"])
+            self.assertGreaterEqual(summary["queue_wait"], 0)
+            self.assertTrue(os.path.isfile(os.path.join(output_directory, "inverse.csv")))
+            with open(os.path.join(output_directory, "missing-data.json")) as job_file:
+                self.assertEqual(json.load(job_file)["status"], "failed")
+
+            # Without the failing job everything is fine
+            os.remove(os.path.join(jobs_directory, "missing-data.json"))
+            exit_code = heat_transfer_batch.main([jobs_directory, "--output-dir", output_directory])
+            self.assertEqual(exit_code, 0)
+
+    def test_job_names_stay_in_output_directory(self):
+        """
+        Job names leading outside the output directory must be rejected
+        """
+
+        job = {"name": "valid-name", "parameters": {"experiment_data_path": "DATA.csv"}}
+        self.assertEqual(heat_transfer_batch.load_job(job, ".", "job")["name"], "valid-name")
+        for name in ["../../outside", "sub/name", "sub\\name", "..", ""]:
+            with self.assertRaises(heat_transfer_batch.JobFileError):
+                heat_transfer_batch.load_job({**job, "name": name}, ".", "job")
+
+
+class TestJobService(unittest.TestCase):
+    def test_submit_and_follow(self):
+        """
+        Submitted job must be followed until it finishes with the same result
+            as the direct run, and the identical job must not be run again
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 100,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": os.path.abspath("DATA.csv")
+        }
+
+        expected_result = classic_sim.create_and_run_simulation(parameters)
+
+        service = JobService(max_workers=1)
+        server = create_server(service, address=("127.0.0.1", 0))
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        url = "http://127.0.0.1:{}".format(server.server_address[1])
+
+        def post(path, content):
+            request = urllib.request.Request(url + path, data=json.dumps(content).encode("utf-8"),
+                                             headers={"Content-Type": "application/json"},
+                                             method="POST")
+            with urllib.request.urlopen(request) as response:
+                return json.load(response)
+
+        try:
+            submitted = post("/jobs", {"algorithm": "classic", "parameters": parameters})
+            resubmitted = post("/jobs", {"algorithm": "classic", "parameters": parameters})
+            self.assertFalse(submitted["deduplicated"])
+            self.assertEqual(resubmitted, {"id": submitted["id"], "deduplicated": True})
+
+            # Long-polling the events until the job is over
+            events: list = []
+            while not events or events[-1]["type"] not in ["finished", "failed", "stopped"]:
+                events_url = "{}/jobs/{}/events?since={}&timeout=10".format(
+                    url, submitted["id"], len(events))
+                with urllib.request.urlopen(events_url) as response:
+                    events.extend(json.load(response))
+
+            self.assertEqual(events[-1]["type"], "finished")
+            self.assertEqual(events[-1]["result"]["error_value"], expected_result["error_value"])
+            self.assertIn("progress", [event["type"] for event in events])
+
+            with self.assertRaises(urllib.error.HTTPError):
+                post("/jobs", {"algorithm": "unknown", "parameters": parameters})
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.shutdown()
+
+    def test_inverse_job_finishes(self):
+        """
+        Inverse job must not wait for the interactive smoothing
+            and must finish with the same result as the direct run
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 15,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "window_span": 3,
+            "tolerance": 1e-05,
+            "init_q_adjustment": 20,
+            "adjusting_value": -0.7,
+            "experiment_data_path": os.path.abspath("DATA.csv")
+        }
+
+        expected_result = inverse_sim.create_and_run_simulation(parameters)
+
+        service = JobService(max_workers=1)
+        try:
+            job_id, _ = service.submit("inverse", parameters)
+            events: list = []
+            while not events or events[-1]["type"] not in ["finished", "failed", "stopped"]:
+                new_events = service.get_events(job_id, since=len(events), timeout=60)
+                self.assertTrue(new_events, "Inverse job is not progressing")
+                events.extend(new_events)
+
+            self.assertEqual(events[-1]["type"], "finished")
+            self.assertEqual(events[-1]["result"]["error_value"], expected_result["error_value"])
+            self.assertNotIn("paused", [event.get("value") for event in events])
+        finally:
+            service.shutdown()
+
+    def test_stream_of_job_stopped_in_queue(self):
+        """
+        Stream of the job stopped before it started must end
+            with its stopped event
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 100,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": os.path.abspath("DATA.csv")
+        }
+
+        service = JobService(max_workers=1)
+        server = create_server(service, address=("127.0.0.1", 0))
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        url = "http://127.0.0.1:{}".format(server.server_address[1])
+
+        try:
+            # Dispatcher cannot start the job without the lock
+            with service.condition:
+                job_id, _ = service.submit("classic", parameters)
+                service.send_command(job_id, "stop")
+
+            lines = []
+            deadline = time.time() + 10
+            with urllib.request.urlopen("{}/jobs/{}/stream".format(url, job_id), timeout=10) as response:
+                for line in response:
+                    lines.append(line)
+                    self.assertLess(time.time(), deadline, "Stream of the stopped job is not ending")
+
+            events = [json.loads(line[len(b"data: "):]) for line in lines if line.startswith(b"data: ")]
+            self.assertEqual([event["type"] for event in events], ["state", "stopped"])
+            self.assertNotIn(b": waiting\n", lines)
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.shutdown()
+
+    def test_refuses_unsafe_requests(self):
+        """
+        Service must refuse the requests, which the web pages can send,
+            and the jobs reading or writing files outside its directories
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 100,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        service = JobService(max_workers=1, data_directory=os.getcwd())
+        server = create_server(service, address=("127.0.0.1", 0))
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        url = "http://127.0.0.1:{}".format(server.server_address[1])
+
+        def get_status(path, content=None, headers=None):
+            data = None if content is None else json.dumps(content).encode("utf-8")
+            request = urllib.request.Request(url + path, data=data, headers=headers or {})
+            try:
+                with urllib.request.urlopen(request) as response:
+                    return response.status
+            except urllib.error.HTTPError as e:
+                return e.code
+
+        json_headers = {"Content-Type": "application/json"}
+        try:
+            job = {"algorithm": "classic", "parameters": parameters}
+            self.assertEqual(get_status("/jobs", job, {"Content-Type": "text/plain"}), 415)
+            self.assertEqual(get_status("/jobs", job, {**json_headers, "Origin": "http://example.com"}), 403)
+            for changed_parameters in [{"streaming_result_path": os.path.abspath("tests.py")},
+                                       {"experiment_data_path": "/etc/passwd"},
+                                       {"experiment_data_path": "../DATA.csv"}]:
+                job = {"algorithm": "classic", "parameters": {**parameters, **changed_parameters}}
+                self.assertEqual(get_status("/jobs", job, json_headers), 400)
+            self.assertEqual(service.jobs, {})
+
+            job = {"algorithm": "classic", "parameters": parameters}
+            self.assertEqual(get_status("/jobs", job, {**json_headers, "Origin": url}), 202)
+            self.assertEqual(get_status("/jobs/1/events?since=x"), 400)
+            self.assertEqual(get_status("/jobs/1/events?timeout=nan"), 400)
+            self.assertEqual(get_status("/jobs/1/events?timeout=0&since=1"), 200)
+        finally:
+            server.shutdown()
+            server.server_close()
+            service.shutdown()
+
+    def test_only_local_address(self):
+        """
+        Service must not be reachable from other machines
+        """
+
+        with self.assertRaises(ValueError):
+            create_server(service=None, address=("0.0.0.0", 0))
+
+
+class TestAsyncSimulationController(unittest.TestCase):
+    def test_concurrent_and_cancelled(self):
+        """
+        More simulations run from one event loop must give the same results
+            as the blocking ones, and cancelled simulation must stop
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        expected_result = classic_sim.create_and_run_simulation(parameters)
+
+        async def follow(controller):
+            updates = [update async for update in controller.run()]
+            return updates
+
+        async def run_all():
+            controllers = [AsyncSimulationController(
+                Sim=Simulation(**classic_sim.get_simulation_arguments(parameters)),
+                steps_per_chunk=50) for _ in range(3)]
+            all_updates = await asyncio.gather(*[follow(controller) for controller in controllers])
+
+            # Cancelling the simulation after its first update
+            cancelled_controller = AsyncSimulationController(
+                Sim=Simulation(**classic_sim.get_simulation_arguments(parameters)),
+                steps_per_chunk=10)
+            task = asyncio.ensure_future(cancelled_controller.complete_simulation())
+            while cancelled_controller.Sim.current_step_idx == 0:
+                await asyncio.sleep(0.001)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            return controllers, all_updates, cancelled_controller
+
+        controllers, all_updates, cancelled_controller = asyncio.run(run_all())
+
+        for controller, updates in zip(controllers, all_updates):
+            self.assertEqual(controller.result["error_value"], expected_result["error_value"])
+            self.assertGreater(len(updates), 2)
+            self.assertTrue(updates[-1]["finished"])
+            self.assertEqual(updates[-1]["progress"], 1.0)
+
+        self.assertIsNone(cancelled_controller.result)
+        self.assertFalse(cancelled_controller.Sim.simulation_has_finished)
+
+
+class TestPhaseTimer(unittest.TestCase):
+    def test_timing_collected(self):
+        """
+        Timing of the phases must not change the results, each step
+            must be counted, and the simulation must not stay timed
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 5,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 20,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        expected_result = classic_sim.create_and_run_simulation(parameters)
+        result = classic_sim.create_and_run_simulation(parameters, collect_timing=True,
+                                                       reuse_simulation=True)
+        self.assertEqual(result["error_value"], expected_result["error_value"])
+
+        phases = result["timing"]["phases"]
+        number_of_steps = classic_sim._last_simulation.max_step_idx
+        for phase in ["step", "rhs_assembly", "linear_solve", "probe_interpolation"]:
+            self.assertEqual(phases[phase]["count"], number_of_steps)
+            self.assertEqual(sum(phases[phase]["histogram"].values()), number_of_steps)
+        self.assertEqual(phases["error_evaluation"]["count"], 1)
+        self.assertIn("callback", phases)
+
+        self.assertNotIn("evaluate_one_step", vars(classic_sim._last_simulation))
+
+    def test_detached_after_failure(self):
+        """
+        Simulation must not stay timed, when it fails during the run
+        """
+
+        class FailingProgress:
+            def emit(self, value):
+                raise RuntimeError("Progress cannot be shown")
+
+        Sim = Simulation(N=10, dt=50, theta=0.5, robin_alpha=13.5, x0=0.0045,
+                         length=0.01, material=Material(7850, 520, 50))
+        controller = SimulationController(Sim=Sim, parameters={"callback_period": 500},
+                                          progress_callback=FailingProgress(), timer=PhaseTimer())
+        with self.assertRaises(RuntimeError):
+            controller.complete_simulation()
+        self.assertNotIn("evaluate_one_step", vars(Sim))
+
+    def test_robust_statistics(self):
+        """
+        Outlier must be rejected and not influence the median and IQR
+        """
+
+        statistics = get_robust_statistics([1.0, 1.1, 1.2, 1.3, 1.4, 9.0])
+        self.assertEqual(statistics["rejected_outliers"], 1)
+        self.assertEqual(statistics["count"], 5)
+        self.assertAlmostEqual(statistics["median"], 1.2)
+        self.assertAlmostEqual(statistics["iqr"], 0.2)
+
+
+class TestSimulationProfiler(unittest.TestCase):
+    def test_profile_files(self):
+        """
+        Profiled simulation must give the same result and write both
+            the cProfile statistics and the collapsed stacks
+        """
+
+        parameters = {
+            "rho": 7850,
+            "cp": 520,
+            "lmbd": 50,
+            "dt": 1,
+            "object_length": 0.01,
+            "place_of_interest": 0.0045,
+            "number_of_elements": 100,
+            "callback_period": 500,
+            "robin_alpha": 13.5,
+            "theta": 0.5,
+            "experiment_data_path": "DATA.csv"
+        }
+
+        expected_result = classic_sim.create_and_run_simulation(parameters)
+        result = classic_sim.create_and_run_simulation(parameters, profile=True)
+        profile = result["profile"]
+        try:
+            self.assertEqual(result["error_value"], expected_result["error_value"])
+
+            statistics = pstats.Stats(profile["pstats"])
+            profiled_functions = [function_name for _, _, function_name in statistics.stats]
+            self.assertIn("evaluate_one_step", profiled_functions)
+
+            self.assertGreater(profile["number_of_samples"], 0)
+            with open(profile["collapsed"]) as collapsed_file:
+                lines = collapsed_file.read().splitlines()
+            self.assertTrue(any("evaluate_one_step" in line for line in lines))
+            self.assertEqual(sum(int(line.rsplit(" ", 1)[1]) for line in lines),
+                             profile["number_of_samples"])
+        finally:
+            os.remove(profile["pstats"])
+            os.remove(profile["collapsed"])
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_slowdown_detection(self):
+        """
+        Only the significant and big enough slowdown must be reported
+        """
+
+        random_generator = np.random.RandomState(0)
+        baseline = list(1.0 + 0.02*random_generator.rand(10))
+        similar = list(1.0 + 0.02*random_generator.rand(10))
+        slower = list(1.2 + 0.02*random_generator.rand(10))
+
+        self.assertFalse(heat_transfer_benchmarks.compare_with_baseline(baseline, similar)["slower"])
+        self.assertTrue(heat_transfer_benchmarks.compare_with_baseline(baseline, slower)["slower"])
+
+        statistics = heat_transfer_benchmarks.get_statistics(baseline)
+        self.assertLess(statistics["ci_low"], statistics["mean"])
+        self.assertGreater(statistics["ci_high"], statistics["mean"])
+
+    def test_history(self):
+        """
+        Second run must be compared with the first one stored in the history
+        """
+
+        with tempfile.TemporaryDirectory() as directory:
+            data_path = os.path.join(directory, "synthetic.csv")
+            heat_transfer_benchmarks.create_synthetic_data(data_path, 500)
+            history_path = os.path.join(directory, "history.json")
+
+            cases = [case for case in heat_transfer_benchmarks.get_benchmark_cases({"synthetic": data_path})
+                     if case.name.startswith("forward[N=20,theta=0.5")]
+            self.assertEqual(len(cases), 1)
+
+            for _ in range(2):
+                run = heat_transfer_benchmarks.run_benchmarks(cases, history_path=history_path,
+                                                              repetitions=3)
+
+            result = run["results"][cases[0].name]
+            self.assertEqual(result["operations"], 499)
+            self.assertIn("comparison", result)
+            self.assertEqual(len(heat_transfer_benchmarks.load_history(history_path)), 2)
+
+
+class TestVerification(unittest.TestCase):
+    def test_convergence_against_analytical_solution(self):
+        """
+        Crank-Nicolson with a fine time step must converge with the second
+            order in space towards the analytical solution
+        """
+
+        solution = heat_transfer_verification.ConvectiveSlabSolution(Material(7850, 520, 50))
+        results = heat_transfer_verification.verify(solution, N_values=[4, 8, 16],
+                                                    dt_values=[0.125], theta_values=[0.5],
+                                                    repetitions=1)
+
+        sequence, = heat_transfer_verification.get_convergence_orders(results, "N")
+        for order in sequence["orders"]:
+            self.assertAlmostEqual(order, 2.0, delta=0.1)
+
+        cheapest = heat_transfer_verification.find_cheapest(results, tolerance=1.0)
+        self.assertIn(cheapest, heat_transfer_verification.get_pareto_front(results))
+        self.assertIsNone(heat_transfer_verification.find_cheapest(results, tolerance=0.0))
+
+
+class TestGradedMesh(unittest.TestCase):
+    def test_interpolation_on_arbitrary_nodes(self):
+        """
+        Probe interpolation must be exact for linear data on any nodes,
+            including the edges of the object
+        """
+
+        x = [0.0, 0.1, 0.15, 0.4, 1.0]
+        y = [2*value + 1 for value in x]
+        for x0 in [0.0, 0.12, 0.15, 0.7, 1.0]:
+            interpolator = predefined_interp_class_factory(x0, x)
+            self.assertAlmostEqual(interpolator(y), 2*x0 + 1)
+
+    def test_graded_mesh_is_more_accurate(self):
+        """
+        Mesh graded towards the heated side must reach better accuracy
+            with half of the elements of the uniform one
+        """
+
+        material = Material(7850, 520, 50)
+        solution = heat_transfer_verification.SemiInfiniteSolution(material)
+        uniform_result, = heat_transfer_verification.verify(
+            solution, N_values=[32], dt_values=[0.25], theta_values=[0.5], repetitions=1)
+        graded_result, = heat_transfer_verification.verify(
+            solution, N_values=[16], dt_values=[0.25], theta_values=[0.5], repetitions=1,
+            mesh=Mesh(grading=10))
+
+        self.assertLess(graded_result["probe_error"], uniform_result["probe_error"])
+
+        x = Mesh(grading=10, x0_refinement=3).create_nodes(16, solution.length, solution.x0)
+        self.assertEqual(x[0], 0)
+        self.assertEqual(x[-1], solution.length)
+        self.assertIn(solution.x0, x)
+        self.assertTrue(np.all(np.diff(x) > 0))
+
+
+class TestQuadraticElements(unittest.TestCase):
+    def test_quadratic_interpolation(self):
+        """
+        Probe interpolation of quadratic elements must be exact
+            for quadratic data
+        """
+
+        x = Mesh(grading=3, element_order=2).create_nodes(4, 1.0, 0.5)
+        self.assertEqual(len(x), 9)
+        y = [3*value**2 - value + 1 for value in x]
+        for x0 in [0.0, 0.3, 0.5, 1.0]:
+            interpolator = predefined_interp_class_factory(x0, x, element_order=2)
+            self.assertAlmostEqual(interpolator(y), 3*x0**2 - x0 + 1)
+        interpolator = predefined_interp_class_factory([0.3, 0.5], x, element_order=2)
+        np.testing.assert_allclose(interpolator(y), [3*0.3**2 - 0.3 + 1, 3*0.5**2 - 0.5 + 1])
+
+    def test_quadratic_elements_are_more_accurate(self):
+        """
+        Quadratic elements must reach better accuracy than the linear
+            ones with the same number of nodes
+        """
+
+        material = Material(7850, 520, 50)
+        solution = heat_transfer_verification.ConvectiveSlabSolution(material, duration=60)
+        linear_result, = heat_transfer_verification.verify(
+            solution, N_values=[8], dt_values=[0.05], theta_values=[0.5], repetitions=1)
+        quadratic_result, = heat_transfer_verification.verify(
+            solution, N_values=[4], dt_values=[0.05], theta_values=[0.5], repetitions=1,
+            mesh=Mesh(element_order=2))
+
+        self.assertLess(quadratic_result["final_error"], linear_result["final_error"] / 10)
+
+
+class TestLayeredObject(unittest.TestCase):
+    def setUp(self):
+        # Constant heat flux and ambient temperature, long enough
+        #   to reach the steady state
+        self.directory = tempfile.TemporaryDirectory()
+        self.data_path = os.path.join(self.directory.name, "constant.csv")
+        t = np.arange(0, 20001.0, 10)
+        np.savetxt(self.data_path, np.column_stack([t, 20 + 0*t, 2000 + 0*t, 20 + 0*t]),
+                   delimiter=",", comments="", header="Time,Temperature,HeatFlux,T_amb")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_steady_state_with_contact_resistance(self):
+        """
+        Temperatures in the steady state must be dropping linearly in each
+            layer and jumping on their contact, as given by the resistances
+        """
+
+        layers = [Layer(0.002, 2000, 800, 1.0, contact_resistance=1e-3),
+                  Layer(0.008, 7850, 520, 50)]
+        for element_order in [1, 2]:
+            Sim = Simulation(N=10, dt=10, theta=1.0, robin_alpha=100, x0=0.001, length=0.01,
+                             material=layers[0], experiment_data_path=self.data_path,
+                             layers=layers, mesh=Mesh(grading=3, element_order=element_order))
+            while not Sim.simulation_has_finished:
+                Sim.evaluate_one_step()
+
+            T_contact = 20 + 2000/100 + 2000*0.008/50 + 2000*1e-3
+            self.assertAlmostEqual(Sim.T_x0[-1], T_contact + 2000*0.001/1.0, places=6)
+            self.assertAlmostEqual(Sim.T[0], T_contact + 2000*0.002/1.0, places=6)
+
+    def test_same_layers_are_homogeneous(self):
+        """
+        Object composed of layers of the same material without any contact
+            resistance must behave exactly as the homogeneous one
+        """
+
+        material = Material(7850, 520, 50)
+        arguments = {"N": 10, "dt": 10, "theta": 0.5, "robin_alpha": 13.5, "x0": 0.0045,
+                     "length": 0.01, "material": material, "experiment_data_path": self.data_path}
+        homogeneous = Simulation(**arguments)
+        layered = Simulation(**arguments, layers=[Layer(0.004, 7850, 520, 50), Layer(0.006, 7850, 520, 50)])
+        for Sim in [homogeneous, layered]:
+            while not Sim.simulation_has_finished:
+                Sim.evaluate_one_step()
+
+        np.testing.assert_allclose(layered.T_x0, homogeneous.T_x0)
+
+
+class TestTemperatureDependentProperties(unittest.TestCase):
+    def run_simulation(self, material, property_tolerance=None):
+        Sim = Simulation(N=20, dt=5, theta=0.5, robin_alpha=13.5, x0=0.0045,
+                         length=0.01, material=material)
+        if property_tolerance is not None:
+            Sim.operators.property_tolerance = property_tolerance
+            Sim.MAX_NONLINEAR_ITERATIONS = 50
+            Sim.reset()
+        while not Sim.simulation_has_finished:
+            Sim.evaluate_one_step()
+        return Sim
+
+    def test_constant_table_is_linear(self):
+        """
+        Table with the same properties in all temperatures must give
+            the same result as the constant properties
+        """
+
+        linear = self.run_simulation(Material(7850, 520, 50))
+        table = self.run_simulation(TemperatureDependentMaterial(7850, [0, 1000], [520, 520], [50, 50]))
+
+        np.testing.assert_allclose(table.T_x0, linear.T_x0, atol=1e-8)
+        self.assertEqual(table.operators.assembly_count, 1)
+
+    def test_lagged_properties_are_close_to_converged(self):
+        """
+        Matrices assembled only when the properties change noticeably must
+            give almost the same result as assembling them in each iteration
+        """
+
+        material = TemperatureDependentMaterial(7850, [0, 20, 40, 60], [400, 500, 700, 800], [70, 50, 40, 35])
+        lagged = self.run_simulation(material)
+        converged = self.run_simulation(material, property_tolerance=1e-9)
+        linear = self.run_simulation(Material(7850, material.cp, material.lmbd))
+
+        self.assertLess(lagged.operators.assembly_count, lagged.max_step_idx / 2)
+        difference = np.max(np.abs(np.array(lagged.T_x0) - converged.T_x0))
+        self.assertLess(difference, 0.1 * np.max(np.abs(np.array(linear.T_x0) - converged.T_x0)))
+
+
+    def test_revert_restores_properties(self):
+        """
+        Inverse simulation returning to its checkpoint must also return
+            to the properties of the checkpoint, not to keep the ones
+            of the rejected heat flux
+        """
+
+        material = TemperatureDependentMaterial(7850, [0, 20, 40, 60], [400, 500, 700, 800], [70, 50, 40, 35])
+        Sim = InverseSimulation(N=20, dt=5, theta=0.5, robin_alpha=13.5, x0=0.0045, length=0.01,
+                                material=material, window_span=3, tolerance=1e-5,
+                                init_q_adjustment=20, adjusting_value=-0.7)
+        Sim._make_checkpoint()
+        Simulation.evaluate_one_step(Sim)
+        expected_T = Sim.T.copy()
+        Sim._revert_to_checkpoint()
+
+        # Trying very different heat flux, which changes the properties
+        assembly_count = Sim.operators.assembly_count
+        Sim.HeatFlux[:10] = 5e4
+        for _ in range(5):
+            Simulation.evaluate_one_step(Sim)
+        self.assertGreater(Sim.operators.assembly_count, assembly_count)
+        Sim._revert_to_checkpoint()
+        Sim.HeatFlux[:10] = 0
+
+        Simulation.evaluate_one_step(Sim)
+        np.testing.assert_allclose(Sim.T, expected_T, rtol=0, atol=1e-12)
+
+
+class TestPhaseChange(unittest.TestCase):
+    def run_simulation(self, material, robin_alpha=13.5):
+        Sim = Simulation(N=40, dt=5, theta=0.5, robin_alpha=robin_alpha, x0=0.0045,
+                         length=0.01, material=material)
+        energies = [self.get_energy(Sim)]
+        while not Sim.simulation_has_finished:
+            Sim.evaluate_one_step()
+            energies.append(self.get_energy(Sim))
+        return Sim, np.array(energies)
+
+    @staticmethod
+    def get_energy(Sim):
+        volumes = get_nodal_volumes(Sim.mesh, Sim.N, Sim.length, Sim.x0)
+        energy = np.sum(volumes*Sim.material.rho*Sim.material.cp*Sim.T)
+        if Sim.material.is_phase_change:
+            energy += np.sum(volumes*Sim.material.get_latent_enthalpy(Sim.T))
+        return energy
+
+    def test_energy_is_conserved(self):
+        """
+        Without the convection the change of the heat (sensible and latent)
+            must be equal to the heat supplied by the flux
+        """
+
+        material = PhaseChangeMaterial(5910, 371, 40, melting_temperature=25, latent_heat=8010)
+        Sim, energies = self.run_simulation(material, robin_alpha=0)
+
+        # Part of the object must have melted (and solidified again)
+        self.assertGreater(np.max(Sim.T_x0), material.melting_temperature + material.melting_range)
+        supplied = np.cumsum(Sim.dt*(Sim.theta*Sim.HeatFlux[1:] + (1-Sim.theta)*Sim.HeatFlux[:-1]))
+        np.testing.assert_allclose(energies[1:] - energies[0], supplied, rtol=1e-5, atol=1e-5*np.max(supplied))
+
+    def test_melting_slows_down_heating(self):
+        """
+        Latent heat consumed by the melting must keep the temperatures
+            lower than without the phase change
+        """
+
+        material = PhaseChangeMaterial(5910, 371, 40, melting_temperature=29.76, latent_heat=80100)
+        melting, _ = self.run_simulation(material)
+        linear, _ = self.run_simulation(Material(5910, 371, 40))
+
+        self.assertLess(np.max(melting.T_x0), np.max(linear.T_x0) - 1)
+        # Below the melting temperature both are the same
+        below_melting = np.array(linear.T_x0) < material.melting_temperature - 1
+        first_melting_idx = np.argmin(below_melting)
+        np.testing.assert_allclose(np.array(melting.T_x0)[:first_melting_idx // 2],
+                                   np.array(linear.T_x0)[:first_melting_idx // 2], atol=1e-8)
+
+    def test_reused_simulation_follows_phase_change(self):
+        """
+        Reconfiguring the simulation to (another) melting material must
+            give the same results as the new simulation
+        """
+
+        Sim, _ = self.run_simulation(Material(5910, 371, 40))
+        for melting_temperature in [29.76, 30]:
+            material = PhaseChangeMaterial(5910, 371, 40, melting_temperature=melting_temperature,
+                                           latent_heat=80100)
+            Sim.rerun(material=material)
+            fresh, _ = self.run_simulation(material)
+            np.testing.assert_allclose(Sim.T_x0, fresh.T_x0, atol=1e-10)
+
+    def test_not_together_with_temperature_table(self):
+        """
+        Material cannot be both melting and temperature dependent
+        """
+
+        parameters = {
+            "rho": 5910, "cp": 371, "lmbd": 40,
+            "phase_change": {"melting_temperature": 29.76, "latent_heat": 80100},
+            "temperature_table": {"temperatures": [0, 100], "cp_values": [371, 400], "lmbd_values": [40, 30]},
+        }
+        with self.assertRaises(ValueError):
+            create_material(parameters)
+        self.assertTrue(create_material({**parameters, "temperature_table": None}).is_phase_change)
+
+    def test_melting_temperature_is_in_celsius(self):
+        """
+        Melting temperatures are saved in kelvins, but used in degrees
+        """
+
+        iron = MaterialService().materials_properties_dict["Iron"]
+        self.assertAlmostEqual(iron["T_melt"], 1811 - 273.15)
+
+
+class TestRadiationBoundary(unittest.TestCase):
+    def run_simulation(self, emissivity, theta=0.5):
+        Sim = Simulation(N=20, dt=1, theta=theta, robin_alpha=13.5, x0=0.0045,
+                         length=0.01, material=Material(7850, 520, 50),
+                         emissivity=emissivity)
+        volumes = get_nodal_volumes(Sim.mesh, Sim.N, Sim.length, Sim.x0)
+        heat = [np.sum(volumes*Sim.rho*Sim.cp*Sim.T)]
+        T_surface = [Sim.T[-1]]
+        while not Sim.simulation_has_finished:
+            Sim.evaluate_one_step()
+            heat.append(np.sum(volumes*Sim.rho*Sim.cp*Sim.T))
+            T_surface.append(Sim.T[-1])
+        return Sim, np.array(heat), np.array(T_surface)
+
+    def test_energy_is_conserved(self):
+        """
+        Change of the heat must be equal to the heat supplied by the flux
+            minus the heat convected and radiated from the far side
+        """
+
+        for theta in [0.5, 1.0]:
+            Sim, heat, T_surface = self.run_simulation(emissivity=0.8, theta=theta)
+
+            heat_loss = Sim.robin_alpha*(T_surface - Sim.T_amb) + \
+                np.array([Sim._get_radiation(T, T_amb)[0] for T, T_amb in zip(T_surface, Sim.T_amb)])
+            heat_balance = Sim.HeatFlux - heat_loss
+            supplied = np.cumsum(Sim.dt*(theta*heat_balance[1:] + (1-theta)*heat_balance[:-1]))
+            np.testing.assert_allclose(heat[1:] - heat[0], supplied, atol=1e-6*np.max(np.abs(supplied)))
+
+    def test_radiation_is_cooling(self):
+        """
+        Radiating object must stay colder than the only convecting one,
+            and without emissivity it must be the same
+        """
+
+        radiating, _, _ = self.run_simulation(emissivity=0.8)
+        convecting, _, _ = self.run_simulation(emissivity=0.0)
+        self.assertLess(np.max(radiating.T_x0), np.max(convecting.T_x0))
+
+        Sim = Simulation(N=20, dt=1, theta=0.5, robin_alpha=13.5, x0=0.0045,
+                         length=0.01, material=Material(7850, 520, 50))
+        while not Sim.simulation_has_finished:
+            Sim.evaluate_one_step()
+        np.testing.assert_allclose(Sim.T_x0, convecting.T_x0)
+
+
+class TestDiscretizationPlanner(unittest.TestCase):
+    def test_proposal_meets_target_error(self):
+        """
+        Simulation with the proposed discretization must be within
+            the target error of the analytical solution
+        """
+
+        material = Material(7850, 520, 50)
+        solution = heat_transfer_verification.ConvectiveSlabSolution(material)
+        with tempfile.TemporaryDirectory() as directory:
+            data_path = os.path.join(directory, "slab.csv")
+            solution.write_data_file(data_path)
+
+            target_error = 0.01
+            plan = plan_discretization(material=material, length=solution.length,
+                                       x0=solution.x0, robin_alpha=solution.robin_alpha,
+                                       theta=0.5, experiment_data_path=data_path,
+                                       target_error=target_error)
+            self.assertLessEqual(plan.estimated_error, target_error)
+
+            Sim = Simulation(N=plan.N, dt=plan.dt, theta=0.5, robin_alpha=solution.robin_alpha,
+                             x0=solution.x0, length=solution.length, material=material,
+                             experiment_data_path=data_path)
+            while not Sim.simulation_has_finished:
+                Sim.evaluate_one_step()
+
+            errors = heat_transfer_verification.get_errors(Sim, solution)
+            self.assertLessEqual(errors["probe_error"], target_error)
+
+    def test_proposal_holds_for_whole_experiment(self):
+        """
+        Proposal must be within the target error during the whole
+            experiment, not only at its beginning
+        """
+
+        material = Material(7850, 520, 50)
+        target_error = 0.01
+        plan = plan_discretization(material=material, length=0.01, x0=0.0045, robin_alpha=13.5,
+                                   theta=0.5, experiment_data_path="DATA.csv",
+                                   target_error=target_error)
+        self.assertLessEqual(plan.checked_error, target_error)
+
+        def run_simulation(N, dt):
+            Sim = Simulation(N=N, dt=dt, theta=0.5, robin_alpha=13.5, x0=0.0045,
+                             length=0.01, material=material)
+            while not Sim.simulation_has_finished:
+                Sim.evaluate_one_step()
+            return Sim.t, np.array(Sim.T_x0)
+
+        reference_t, reference_T_x0 = run_simulation(N=200, dt=0.5)
+        t, T_x0 = run_simulation(N=plan.N, dt=plan.dt)
+        self.assertLessEqual(np.max(np.abs(T_x0 - np.interp(t, reference_t, reference_T_x0))), target_error)
+
+    def test_pilot_of_late_data(self):
+        """
+        Pilot must end at the wanted time of the data, also when
+            the data are not starting at zero
+        """
+
+        data = np.loadtxt("DATA.csv", delimiter=",", skiprows=1, usecols=range(4))
+        data[:, 0] += 1000
+        with tempfile.TemporaryDirectory() as directory:
+            data_path = os.path.join(directory, "late.csv")
+            np.savetxt(data_path, data, delimiter=",", fmt="%.6g", comments="",
+                       header="Time,Temperature,HeatFlux,T_amb")
+
+            Sim = Simulation(N=10, dt=1, theta=0.5, robin_alpha=13.5, x0=0.0045, length=0.01,
+                             material=Material(7850, 520, 50), experiment_data_path=data_path)
+            pilot_end = data[0, 0] + 200
+            times, T_x0 = heat_transfer_discretization._run_pilot(Sim, pilot_end, N=20, dt=2)
+
+        self.assertEqual(len(times), len(T_x0))
+        self.assertGreaterEqual(times[-1], pilot_end)
+        self.assertLess(times[-1], pilot_end + 2)
+
+
 class TestMypyAnalysis(unittest.TestCase):
     def test_mypy(self):
         """
@@ -110,6 +1663,11 @@ class TestMypyAnalysis(unittest.TestCase):
         #   the main file to be analysed in case of heat_transfer_gui
         files_to_analyse = [
             "heat_transfer_gui.py",
+            "heat_transfer_batch.py",
+            "heat_transfer_job_service.py",
+            "heat_transfer_simulation_live.py",
+            "heat_transfer_benchmarks.py",
+            "heat_transfer_verification.py",
             "parameters_testing_classic.py",
             "parameters_testing_inverse.py",
             "parameters_testing_utilities.py",
@@ -123,7 +1681,7 @@ class TestMypyAnalysis(unittest.TestCase):
             # Running the mypy analysis through the command line
             # NOTE: turns out in python3.6 and below the capture_output
             #   argument is unknown, and therefore it fails here
-            if float(sys.version[:3]) < 3.7:
+            if sys.version_info < (3, 7):
                 print("These tests cannot be run, as python3.7 or higher is required")
                 continue
 